@@ -1,12 +1,16 @@
 # app.py (Versio 8.2 - Yhdistetty syötteenkäsittely)
-import re
 from collections import defaultdict
-from io import BytesIO
-import docx
 import streamlit as st
 
 # Varmistetaan, että tuodaan uusin logiikka
-from logic import etsi_merkityksen_mukaan, lataa_resurssit
+from logic import (
+    etsi_merkityksen_mukaan_vaiheittain, kaynnista_taustalataus, resurssit_valmiina
+)
+from raportti import luo_osio_md, luo_raportti_doc, luo_raportti_md, sisallon_tiiviste
+from syote import jasenna_syote
+
+# Kuinka monen eri raportin viennit pidetään välimuistissa.
+RAPORTTI_VALIMUISTI = 8
 
 
 # --- Sivun asetukset ---
@@ -30,97 +34,35 @@ def lue_syote_data(syote_data):
         sisalto = syote_data.getvalue().decode("utf-8")
     else:
         sisalto = str(syote_data)
-    sisalto = sisalto.replace('\r\n', '\n')
-
-    paaotsikko_m = re.search(r"^(.*?)\n", sisalto)
-    paaotsikko = paaotsikko_m.group(1).strip() if paaotsikko_m else ""
-
-    hakulauseet = {}
-    otsikot = {}
-
-    osiot = re.split(r'\n(?=\d\.\s)', sisalto)
-
-    for osio_teksti in osiot:
-        osio_teksti = osio_teksti.strip()
-        if not osio_teksti:
-            continue
-
-        rivit = osio_teksti.split('\n', 1)
-        otsikko = rivit[0].strip()
-        kuvaus = rivit[1].strip() if len(rivit) > 1 else ""
-
-        osio_match = re.match(r"^([\d\.]+)", otsikko)
-        if osio_match:
-            osio_nro = osio_match.group(1).strip('.')
-            haku = f"{otsikko}: {kuvaus.replace('\n', ' ')}"
-            hakulauseet[osio_nro] = haku
-            otsikot[osio_nro] = otsikko
+    # Sama jäsennys kuin komentorivityökaluissa (syote.py).
+    return jasenna_syote(sisalto)
 
-    sl_match = re.search(r"Sisällysluettelo:(.*?)(?=\n\d\.|\Z)", sisalto, re.DOTALL)
-    sl_teksti = sl_match.group(1).strip() if sl_match else ""
 
-    return paaotsikko, hakulauseet, otsikot, sl_teksti
+# Vientejä pidetään välimuistissa sisällön tiivisteen mukaan, ei istunnossa.
+# Alaviivalliset parametrit jätetään Streamlitin avainlaskennan ulkopuolelle.
+@st.cache_data(max_entries=RAPORTTI_VALIMUISTI, show_spinner=False)
+def raportti_md(tiiviste, _sl, _jae_kartta):
+    return luo_raportti_md(_sl, _jae_kartta)
 
 
-def luo_raportti_md(sl, jae_kartta):
-    """Luo siistin tekstimuotoisen raportin."""
-    md = f"# {sl['otsikko']}\n\n"
-    if sl['teksti']:
-        md += "## Sisällysluettelo\n\n"
-        md += sl['teksti'] + "\n\n"
-
-    sorted_osiot = sorted(
-        jae_kartta.items(),
-        key=lambda item: [int(p) for p in item[0].split('.')]
-    )
-    for osio_nro, data in sorted_osiot:
-        md += f"## {data['otsikko']}\n\n"
-        if data["jakeet"]:
-            for jae in data["jakeet"]:
-                md += f"- **{jae['viite']}**: \"{jae['teksti']}\"\n"
-        else:
-            md += "*Ei jakeita tähän osioon.*\n"
-        md += "\n"
-    return md
-
-
-def luo_raportti_doc(sl, jae_kartta):
-    """Luo ladattavan Word-dokumentin."""
-    doc = docx.Document()
-    doc.add_heading(sl['otsikko'], 0)
-    if sl['teksti']:
-        doc.add_heading("Sisällysluettelo", 1)
-        doc.add_paragraph(sl['teksti'])
-
-    sorted_osiot = sorted(
-        jae_kartta.items(),
-        key=lambda item: [int(p) for p in item[0].split('.')]
-    )
-    for osio_nro, data in sorted_osiot:
-        doc.add_heading(data['otsikko'], 1)
-        if data["jakeet"]:
-            for jae in data["jakeet"]:
-                p = doc.add_paragraph()
-                p.add_run(f"{jae['viite']}: ").bold = True
-                p.add_run(f"\"{jae['teksti']}\"")
-        else:
-            doc.add_paragraph("Ei jakeita tähän osioon.")
-    
-    buffer = BytesIO()
-    doc.save(buffer)
-    buffer.seek(0)
-    return buffer
+@st.cache_data(max_entries=RAPORTTI_VALIMUISTI, show_spinner=False)
+def raportti_doc(tiiviste, _sl, _jae_kartta):
+    return luo_raportti_doc(_sl, _jae_kartta)
 
 
 # --- Streamlit-käyttöliittymä ---
 st.title("📚 Raamattu-tutkija v4")
 st.markdown("---")
 
-with st.spinner("Valmistellaan hakukonetta..."):
-    lataa_resurssit()
+# Mallit ja indeksi latautuvat taustalla; sivu piirtyy heti.
+kaynnista_taustalataus()
+if not resurssit_valmiina():
+    st.info("Hakukone latautuu taustalla. Voit jo syöttää tutkielman rakenteen.")
 
 if 'processing_complete' not in st.session_state:
     st.session_state.processing_complete = False
+# Tällä ajokerralla osiot on jo näytetty sitä mukaa kuin ne valmistuivat.
+osiot_naytetty = False
 
 col1, col2 = st.columns([2, 1])
 
@@ -162,7 +104,12 @@ if suorita_nappi:
     if not koko_syote:
         st.warning("Syötä aihe ja rakenne joko tiedostona tai tekstikenttään.")
     else:
-        with st.spinner("Suoritetaan älykästä hakua... Tämä voi kestää hetken."):
+        spinner_teksti = (
+            "Suoritetaan älykästä hakua... Tämä voi kestää hetken."
+            if resurssit_valmiina()
+            else "Odotetaan hakukoneen latautumista ja suoritetaan haku..."
+        )
+        with st.spinner(spinner_teksti):
             paaotsikko, hakulauseet, otsikot, sl_teksti = lue_syote_data(koko_syote)
 
             if not hakulauseet:
@@ -172,43 +119,71 @@ if suorita_nappi:
             sl = {"otsikko": paaotsikko, "teksti": sl_teksti}
             jae_kartta = defaultdict(lambda: {"jakeet": [], "otsikko": ""})
             total = len(hakulauseet)
-            p_bar = st.progress(0, text="Aloitetaan...")
+            p_bar = st.progress(0, text=f"Haetaan {total} osiota...")
 
             sorted_hakulauseet = sorted(
                 hakulauseet.items(),
                 key=lambda item: [int(p) for p in item[0].split('.')]
             )
 
-            for i, (osio_nro, haku) in enumerate(sorted_hakulauseet):
-                tulokset = etsi_merkityksen_mukaan(haku, top_k_valinta)
+            st.markdown(f"# {sl['otsikko']}")
+            if sl['teksti']:
+                st.markdown(f"## Sisällysluettelo\n\n{sl['teksti']}")
+
+            # Jokaiselle osiolle varataan paikka oikeassa järjestyksessä, ja
+            # osio piirretään heti, kun sen haku valmistuu.
+            paikat = {}
+            for osio_nro, haku in sorted_hakulauseet:
+                otsikko = otsikot.get(osio_nro, haku.split(':')[0])
+                jae_kartta[osio_nro]["otsikko"] = otsikko
+                paikat[osio_nro] = st.empty()
+                paikat[osio_nro].markdown(f"## {otsikko}\n\n*Haetaan...*")
+
+            valmiit = 0
+            for rivi, tulokset in etsi_merkityksen_mukaan_vaiheittain(
+                [haku for _, haku in sorted_hakulauseet], top_k_valinta
+            ):
+                osio_nro = sorted_hakulauseet[rivi][0]
                 jae_kartta[osio_nro]["jakeet"] = tulokset
-                jae_kartta[osio_nro]["otsikko"] = otsikot.get(
-                    osio_nro, haku.split(':')[0]
+                paikat[osio_nro].markdown(
+                    luo_osio_md(jae_kartta[osio_nro]["otsikko"], tulokset)
                 )
-                p_text = f"Käsitellään osiota {i+1}/{total}: {osio_nro}"
-                p_bar.progress((i + 1) / total, text=p_text)
-
-            st.session_state.final_report_md = luo_raportti_md(sl, jae_kartta)
-            st.session_state.final_report_doc = luo_raportti_doc(sl, jae_kartta)
+                valmiit += 1
+                p_bar.progress(valmiit / total, text=f"Käsitelty {valmiit}/{total} osiota.")
+
+            # Istuntoon tallennetaan vain tulokset; viennit luodaan pyydettäessä.
+            jae_kartta = dict(jae_kartta)
+            st.session_state.raportti = {
+                "sl": sl, "jae_kartta": jae_kartta,
+                "tiiviste": sisallon_tiiviste(sl, jae_kartta),
+            }
             st.session_state.processing_complete = True
+            osiot_naytetty = True
             p_bar.empty()
             st.success("Haku suoritettu onnistuneesti!")
 
 if st.session_state.processing_complete:
-    st.markdown(st.session_state.final_report_md)
+    raportti = st.session_state.raportti
+    tiiviste = raportti["tiiviste"]
+    if not osiot_naytetty:
+        st.markdown(raportti_md(tiiviste, raportti["sl"], raportti["jae_kartta"]))
     st.divider()
     st.subheader("Lataa raportti")
     col1, col2 = st.columns(2)
     with col1:
         st.download_button(
             "Lataa .txt-tiedostona",
-            st.session_state.final_report_md,
+            raportti_md(tiiviste, raportti["sl"], raportti["jae_kartta"]),
             "raamattu_tutkielma.txt"
         )
     with col2:
-        st.download_button(
-            "Lataa .docx-tiedostona",
-            st.session_state.final_report_doc,
-            "raamattu_tutkielma.docx",
-            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-        )
\ No newline at end of file
+        # Word-dokumentti luodaan vasta, kun sitä pyydetään tälle sisällölle.
+        if (st.session_state.get("docx_pyydetty") == tiiviste
+                or st.button("Luo .docx-tiedosto")):
+            st.session_state.docx_pyydetty = tiiviste
+            st.download_button(
+                "Lataa .docx-tiedostona",
+                raportti_doc(tiiviste, raportti["sl"], raportti["jae_kartta"]),
+                "raamattu_tutkielma.docx",
+                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+            )
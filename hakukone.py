@@ -0,0 +1,773 @@
+# hakukone.py (Versio 1.0 - Streamlitistä riippumaton hakukone)
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+
+from jaevarasto import Jaevarasto, varaston_tiedostot
+from kvantisointi import (
+    INT8_TUNNISTE, kvantisoi_cross_encoder, kvantisoi_embedding_malli,
+)
+from hierarkia import HIERARKIATASOT, KARKEA_MAARA, Hierarkiahaku, hierarkian_tiedostot
+from kaskadi import KASKADI_ERAKOKO, Pisterajat, etaisyys, jarjesta_kaskadina
+from mittarit import PROFIILI_TIEDOSTO, Mittarit, profiloi
+from pistevarasto import Pistevarasto, pisteavain
+from pituuserat import KYSELYN_TOKENIBUDJETTI, ennusta_pituusjarjestyksessa, rajaa_kysely
+from raamatunviitteet import Viite, jasenna_viitteet
+from sanaindeksi import RRF_K, Sanaindeksi, sanaindeksin_tiedostot, yhdista_rrf
+from sananormalisointi import SANAKIRJA_TIEDOSTO, Sananormalisoija, rakenna_sanakirjasta
+from strategiat import (
+    AUTOMAATTISET_SIEMENET, KYSELYN_PAINO, SELITTEEN_PAINO, SIEMENEN_PAINO,
+    STRATEGIA_SANAKIRJA, STRATEGIA_SIEMENJAE_KARTTA, STRATEGIA_VARTALOT,
+    Siemenhaku, Strategiakerros,
+)
+from syote import JASENNYS_VERSIO
+from tulosvalimuisti import Tulosvalimuisti, laske_versio
+
+# Raskaat kirjastot (torch, sentence_transformers, faiss) tuodaan vasta
+# latausmetodeissa, jotta moduulin tuonti pysyy kevyenä.
+
+# --- VAKIOASETUKSET ---
+# Datahakemiston voi vaihtaa ympäristömuuttujalla ilman koodimuutoksia.
+DATA_HAKEMISTO_MUUTTUJA = "RAAMATTU_DATA_HAKEMISTO"
+OLETUS_DATA_HAKEMISTO = "D:/Python_AI/Raamattu-tutkija-data"
+# int8-kvantisoinnin valinta ympäristöstä: "upotus", "rerank" tai "molemmat".
+KVANTISOINTI_MUUTTUJA = "RAAMATTU_INT8"
+HAKUTILA_MUUTTUJA = "RAAMATTU_HAKUTILA"
+# Hakujen vaihekohtaiset mittarit kirjoitetaan JSON-riveinä tähän tiedostoon.
+MITTARI_MUUTTUJA = "RAAMATTU_MITTARIT"
+# Haun tila: pelkkä vektorihaku tai BM25- ja vektorihaun RRF-yhdistelmä.
+HAKUTILAT = ("vektori", "hybridi")
+# Karkeasta tarkkaan -haun taso: "luku" tai "perikooppi" (tyhjä = ei käytössä).
+HIERARKIA_MUUTTUJA = "RAAMATTU_HIERARKIA"
+# Ehdokaspoolin kerroin top_k:n mukaan: (top_k:n yläraja, kerroin). Suuremmille
+# top_k-arvoille käytetään viimeistä kerrointa. parametrihaku.py virittää portaat.
+OLETUS_KERROINPORTAAT = ((10, 10), (20, 9), (40, 8), (60, 7), (80, 6), (100, 5))
+EMBEDDING_MALLI = "TurkuNLP/sbert-cased-finnish-paraphrase"
+CROSS_ENCODER_MALLI = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+# --- LOKITUKSEN ALUSTUS ---
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] - %(message)s",
+    datefmt="%H:%M:%S",
+)
+
+
+@dataclass
+class Hakuasetukset:
+    """
+    Hakukoneen polut ja säädöt. Tiedostopolut johdetaan datahakemistosta,
+    ellei niitä anneta erikseen.
+    """
+
+    data_hakemisto: str = OLETUS_DATA_HAKEMISTO
+    paaindeksi_tiedosto: str | None = None
+    jaevarasto_hakemisto: str | None = None
+    pistevarasto_tiedosto: str | None = None
+    tulosvalimuisti_hakemisto: str | None = None
+    siemenjae_indeksi_tiedosto: str | None = None
+    siemenjae_kartta_tiedosto: str | None = None
+    kaskadi_kalibrointi_tiedosto: str | None = None
+    sanaindeksi_hakemisto: str | None = None
+    sanastoindeksi_tiedosto: str | None = None
+    hakuparametrit_tiedosto: str | None = None
+    hierarkia_hakemisto: str | None = None
+    naapurit_hakemisto: str | None = None
+    vektorit_tiedosto: str | None = None
+    # Muistikartoitus: saman koneen työprosessit jakavat indeksin sivuvälimuistin.
+    paaindeksi_mmap: bool = True
+    pistevarasto_max_rivit: int = 2_000_000
+    tulosvalimuisti_muisti_mt: int = 64
+    tulosvalimuisti_levy_mt: int = 512
+    embedding_malli: str = EMBEDDING_MALLI
+    cross_encoder_malli: str = CROSS_ENCODER_MALLI
+    enkoodaus_erakoko: int = 32
+    rerank_erakoko: int = 64
+    # Uudelleenjärjestykseen lähtevän kyselyn enimmäispituus tokeneina; pitkästä
+    # osiokuvauksesta pidetään alkuosa kokonaisina lauseina (None = ei rajausta).
+    # Kannattaa ottaa käyttöön vasta, kun pituuserat.py on mitannut top_k-päällekkäisyyden.
+    kyselyn_tokenibudjetti: int | None = KYSELYN_TOKENIBUDJETTI
+    # Strategiakohtaisen esihaetun ehdokaspoolin koko (0 = ei käytössä).
+    strategia_pooli: int = 0
+    # Strategiattomiin kyselyihin yhdistettävien lähimpien superjakeiden määrä.
+    automaattiset_siemenet: int = AUTOMAATTISET_SIEMENET
+    kaskadi_erakoko: int = KASKADI_ERAKOKO
+    # Oletusaikaraja uudelleenjärjestykselle sekunteina (None = ei rajaa).
+    aikaraja_s: float | None = None
+    # Valinnainen dynaaminen int8-kvantisointi CPU-päättelyyn (ks. kvantisointi.py).
+    kvantisoi_upotus: bool = False
+    kvantisoi_rerank: bool = False
+    hakutila: str = "vektori"
+    # Hybriditilassa BM25-haun ehdokasmäärä ennen RRF-yhdistämistä.
+    sanahaku_maara: int = 100
+    # Karkeasta tarkkaan -haku: ensin lähimmät luvut tai perikoopit, sitten
+    # vain niiden jaeikkunat (None = koko pääindeksi).
+    hierarkia_taso: str | None = None
+    hierarkia_maara: int = KARKEA_MAARA
+    # Vaiheittaisessa haussa yhtä aikaa käsiteltävien osioiden enimmäismäärä.
+    osio_rinnakkaisuus: int = 2
+    # Pisteiden ja tulosten välimuistit; mittauksissa ne voi ohittaa.
+    kayta_valimuisteja: bool = True
+    # Vaihekohtaisten mittareiden JSON-rivitiedosto (None = ei tiedostoa).
+    mittari_tiedosto: str | None = None
+
+    def __post_init__(self):
+        if self.hakutila not in HAKUTILAT:
+            raise ValueError(f"Tuntematon hakutila '{self.hakutila}'.")
+        if self.hierarkia_taso is not None and self.hierarkia_taso not in HIERARKIATASOT:
+            raise ValueError(f"Tuntematon hierarkiataso '{self.hierarkia_taso}'.")
+        if self.paaindeksi_tiedosto is None:
+            self.paaindeksi_tiedosto = os.path.join(
+                self.data_hakemisto, "raamattu_vektori_indeksi.faiss"
+            )
+        if self.jaevarasto_hakemisto is None:
+            self.jaevarasto_hakemisto = os.path.join(self.data_hakemisto, "jaevarasto")
+        if self.pistevarasto_tiedosto is None:
+            self.pistevarasto_tiedosto = os.path.join(
+                self.data_hakemisto, "rerank_pisteet.sqlite"
+            )
+        if self.tulosvalimuisti_hakemisto is None:
+            self.tulosvalimuisti_hakemisto = os.path.join(
+                self.data_hakemisto, "tulosvalimuisti"
+            )
+        if self.siemenjae_indeksi_tiedosto is None:
+            self.siemenjae_indeksi_tiedosto = os.path.join(
+                self.data_hakemisto, "siemenjae_indeksi.faiss"
+            )
+        if self.siemenjae_kartta_tiedosto is None:
+            self.siemenjae_kartta_tiedosto = os.path.join(
+                self.data_hakemisto, "siemenjae_kartta.json"
+            )
+        if self.sanaindeksi_hakemisto is None:
+            self.sanaindeksi_hakemisto = os.path.join(self.data_hakemisto, "sanaindeksi")
+        if self.sanastoindeksi_tiedosto is None:
+            self.sanastoindeksi_tiedosto = os.path.join(
+                self.data_hakemisto, "sanastoindeksi.npz"
+            )
+        if self.hierarkia_hakemisto is None:
+            self.hierarkia_hakemisto = os.path.join(self.data_hakemisto, "hierarkia")
+        if self.naapurit_hakemisto is None:
+            self.naapurit_hakemisto = os.path.join(self.data_hakemisto, "naapurit")
+        if self.vektorit_tiedosto is None:
+            self.vektorit_tiedosto = os.path.join(
+                self.data_hakemisto, "raamattu_vektorit.npy"
+            )
+        if self.hakuparametrit_tiedosto is None:
+            self.hakuparametrit_tiedosto = os.path.join(
+                self.data_hakemisto, "hakuparametrit.json"
+            )
+        if self.kaskadi_kalibrointi_tiedosto is None:
+            self.kaskadi_kalibrointi_tiedosto = os.path.join(
+                self.data_hakemisto, "rerank_kalibrointi.json"
+            )
+
+    @property
+    def rerank_tunniste(self) -> str:
+        """Cross-encoderin tunniste pisteavaimiin; int8-pisteet pidetään erillään."""
+        return self.cross_encoder_malli + (INT8_TUNNISTE if self.kvantisoi_rerank else "")
+
+    @classmethod
+    def ymparistosta(cls, **asetukset) -> "Hakuasetukset":
+        """
+        Luo asetukset, joiden datahakemisto, hakutila, hierarkiataso,
+        int8-kvantisointi ja mittaritiedosto luetaan ympäristömuuttujista. Suoraan annetut asetukset ohittavat ne.
+        """
+        asetukset.setdefault(
+            "data_hakemisto",
+            os.environ.get(DATA_HAKEMISTO_MUUTTUJA, OLETUS_DATA_HAKEMISTO),
+        )
+        if os.environ.get(HAKUTILA_MUUTTUJA):
+            asetukset.setdefault("hakutila", os.environ[HAKUTILA_MUUTTUJA].strip().lower())
+        if os.environ.get(HIERARKIA_MUUTTUJA):
+            asetukset.setdefault(
+                "hierarkia_taso", os.environ[HIERARKIA_MUUTTUJA].strip().lower()
+            )
+        kvantisointi = os.environ.get(KVANTISOINTI_MUUTTUJA, "").strip().lower()
+        asetukset.setdefault("kvantisoi_upotus", kvantisointi in ("upotus", "molemmat"))
+        asetukset.setdefault("kvantisoi_rerank", kvantisointi in ("rerank", "molemmat"))
+        if os.environ.get(MITTARI_MUUTTUJA):
+            asetukset.setdefault("mittari_tiedosto", os.environ[MITTARI_MUUTTUJA])
+        return cls(**asetukset)
+
+
+def poimi_raamatunviitteet(teksti: str) -> list[Viite]:
+    """Etsii ja poimii tekstistä raamatunviitteitä."""
+    return jasenna_viitteet(teksti)
+
+
+def hae_jakeet_viitteella(viite: Viite, jaevarasto: Jaevarasto) -> list[dict]:
+    """Hakee jaejoukon tekstistä poimitun viitteen perusteella."""
+    return [jaevarasto.jae(jae_id) for jae_id in jaevarasto.viitevalin_tunnisteet(viite)]
+
+
+def laske_haettava_maara(top_k: int, indeksin_koko: int,
+                         portaat=OLETUS_KERROINPORTAAT) -> int:
+    """Valitsee uudelleenjärjestettävien ehdokkaiden määrän top_k:n mukaan."""
+    if top_k <= 0:
+        return 0
+    kerroin = portaat[-1][1]
+    for ylaraja, portaan_kerroin in portaat:
+        if top_k <= ylaraja:
+            kerroin = portaan_kerroin
+            break
+    return min(top_k * kerroin, indeksin_koko)
+
+
+def lataa_kerroinportaat(tiedosto: str) -> tuple:
+    """Lataa parametrihaun virittämät kerroinportaat tai palauttaa oletukset."""
+    try:
+        with open(tiedosto, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return OLETUS_KERROINPORTAAT
+    if data.get("jasennys_versio") != JASENNYS_VERSIO:
+        # Portaat on viritetty eri tavalla jäsennetyillä hakulauseilla.
+        logging.warning(
+            f"Kerroinportaat '{tiedosto}' on viritetty vanhalla syötteen jäsennyksellä; "
+            "käytetään oletuksia, kunnes parametrihaku.py ajetaan uudelleen."
+        )
+        return OLETUS_KERROINPORTAAT
+    portaat = tuple(sorted((int(y), int(k)) for y, k in data["kerroinportaat"]))
+    logging.info(f"Viritetyt kerroinportaat ladattu: {portaat}")
+    return portaat
+
+
+class Hakukone:
+    """
+    Hakuydin ilman käyttöliittymäriippuvuuksia. Omistaa mallit, indeksin,
+    jaevaraston sekä piste- ja tulosvälimuistit. Lataus ja vapautus ovat
+    eksplisiittisiä (lataa/sulje tai with-lause), joten samaa konetta voi
+    käyttää Streamlitissä, eräajoissa, palvelimessa tai työprosesseissa.
+    Latausvirheet nostetaan poikkeuksina kutsujalle.
+    """
+
+    def __init__(self, asetukset: Hakuasetukset | None = None):
+        self.asetukset = asetukset or Hakuasetukset.ymparistosta()
+        self.model = None
+        self.cross_encoder = None
+        self.paaindeksi = None
+        self.jaevarasto = None
+        self.pistevarasto = None
+        self.tulosvalimuisti = None
+        self.strategiat = None
+        self.pisterajat = None
+        self.sanaindeksi = None
+        self.hierarkia = None
+        self.kerroinportaat = OLETUS_KERROINPORTAAT
+        # Vaihekohtainen jäljitys; kuuntelijat lisätään mittarit.lisaa_kuuntelija():lla.
+        self.mittarit = Mittarit(self.asetukset.mittari_tiedosto)
+        self._lataus = None
+        self._lukko = threading.Lock()
+
+    def __enter__(self) -> "Hakukone":
+        self.lataa()
+        return self
+
+    def __exit__(self, *_):
+        self.sulje()
+
+    # --- ELINKAARI ---
+
+    def kaynnista_lataus(self) -> Future:
+        """
+        Käynnistää resurssien latauksen taustasäikeessä, jos sitä ei ole
+        jo käynnistetty. Palauttaa latauksen Future-olion.
+        """
+        with self._lukko:
+            if self._lataus is None:
+                lataaja = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="taustalataus"
+                )
+                self._lataus = lataaja.submit(self._lataa_ja_lammita)
+                lataaja.shutdown(wait=False)
+            return self._lataus
+
+    def lataa(self) -> "Hakukone":
+        """Lataa resurssit ja odottaa latauksen loppuun. Nostaa latausvirheen."""
+        self.kaynnista_lataus().result()
+        return self
+
+    @property
+    def valmis(self) -> bool:
+        """Kertoo, onko lataus päättynyt (onnistuneesti tai virheeseen)."""
+        return self._lataus is not None and self._lataus.done()
+
+    def sulje(self):
+        """Odottaa mahdollisen latauksen loppuun ja vapauttaa resurssit."""
+        with self._lukko:
+            lataus, self._lataus = self._lataus, None
+        if lataus is not None:
+            try:
+                lataus.result()
+            except Exception:
+                pass
+        if self.jaevarasto is not None:
+            self.jaevarasto.sulje()
+        if self.pistevarasto is not None:
+            self.pistevarasto.sulje()
+        self.model = self.cross_encoder = self.paaindeksi = None
+        self.jaevarasto = self.pistevarasto = self.tulosvalimuisti = None
+        self.strategiat = self.pisterajat = self.sanaindeksi = None
+        self.hierarkia = None
+        logging.info("Hakukoneen resurssit vapautettu.")
+
+    def _lataa_embedding_malli(self):
+        from sentence_transformers import SentenceTransformer
+        if not self.asetukset.kvantisoi_upotus:
+            return SentenceTransformer(self.asetukset.embedding_malli)
+        # Dynaaminen int8-kvantisointi toimii vain CPU:lla.
+        return kvantisoi_embedding_malli(
+            SentenceTransformer(self.asetukset.embedding_malli, device="cpu")
+        )
+
+    def _lataa_cross_encoder(self):
+        from sentence_transformers import CrossEncoder
+        if not self.asetukset.kvantisoi_rerank:
+            return CrossEncoder(self.asetukset.cross_encoder_malli)
+        return kvantisoi_cross_encoder(
+            CrossEncoder(self.asetukset.cross_encoder_malli, device="cpu")
+        )
+
+    def _lataa_paaindeksi(self):
+        from vektori_indeksi import Hakuindeksi
+        # Indeksityyppi (flat/hnsw/ivf/ivfpq) ja metriikka luetaan metatiedoista.
+        return Hakuindeksi(
+            self.asetukset.paaindeksi_tiedosto, mmap=self.asetukset.paaindeksi_mmap
+        )
+
+    def _lataa_siemenhaku(self):
+        """Lataa superjakeiden siemenindeksin, jos se on rakennettu."""
+        try:
+            return Siemenhaku(
+                self.asetukset.siemenjae_indeksi_tiedosto,
+                self.asetukset.siemenjae_kartta_tiedosto,
+            )
+        except Exception as e:
+            logging.warning(
+                f"Siemenjae-indeksiä ei voitu ladata, automaattiset siemenet ohitetaan: {e}"
+            )
+            return None
+
+    def _lataa_sanaindeksi(self):
+        """Lataa BM25-sanaindeksin hybriditilaa varten."""
+        if self.asetukset.hakutila != "hybridi":
+            return None
+        try:
+            return Sanaindeksi(self.asetukset.sanaindeksi_hakemisto)
+        except Exception as e:
+            logging.warning(f"Sanaindeksiä ei voitu ladata, käytetään pelkkää vektorihakua: {e}")
+            return None
+
+    def _lataa_hierarkia(self):
+        """Lataa luku- tai perikooppitason indeksin karkeasta tarkkaan -hakua varten."""
+        a = self.asetukset
+        if a.hierarkia_taso is None:
+            return None
+        try:
+            return Hierarkiahaku(
+                a.hierarkia_hakemisto, a.hierarkia_taso, a.vektorit_tiedosto,
+                a.hierarkia_maara,
+            )
+        except Exception as e:
+            logging.warning(f"Hierarkiaindeksiä ei voitu ladata, haetaan koko indeksistä: {e}")
+            return None
+
+    def _lataa_normalisoija(self):
+        """
+        Lataa kirjoitusvirheiden sanastoindeksin. Puuttuva indeksi rakennetaan
+        kerran bible_dictionary.json-tiedostosta, jos se on saatavilla.
+        """
+        tiedosto = self.asetukset.sanastoindeksi_tiedosto
+        try:
+            if not os.path.exists(tiedosto) and os.path.exists(SANAKIRJA_TIEDOSTO):
+                rakenna_sanakirjasta(SANAKIRJA_TIEDOSTO, tiedosto)
+            return Sananormalisoija(tiedosto)
+        except Exception as e:
+            logging.warning(f"Sanastoindeksiä ei voitu ladata, sanoja ei normalisoida: {e}")
+            return None
+
+    def _avaa_pistevarasto(self):
+        """Avaa cross-encoder-pisteiden pysyvän varaston, jos se on mahdollista."""
+        try:
+            return Pistevarasto(
+                self.asetukset.pistevarasto_tiedosto,
+                self.asetukset.pistevarasto_max_rivit,
+            )
+        except Exception as e:
+            logging.warning(f"Pistevarastoa ei voitu avata, pisteitä ei tallenneta: {e}")
+            return None
+
+    def _avaa_tulosvalimuisti(self):
+        """
+        Avaa osiokohtaisten hakutulosten välimuistin. Versiotunniste lasketaan
+        indeksi- ja datatiedostoista, malleista ja strategiakartoista, joten
+        indeksin uudelleenrakennus tai mallin vaihto mitätöi vanhat tulokset.
+        """
+        from vektori_indeksi import tiedot_polku
+
+        a = self.asetukset
+        versio = laske_versio(
+            [
+                a.paaindeksi_tiedosto, tiedot_polku(a.paaindeksi_tiedosto),
+                *varaston_tiedostot(a.jaevarasto_hakemisto),
+                a.siemenjae_indeksi_tiedosto, a.siemenjae_kartta_tiedosto,
+                a.kaskadi_kalibrointi_tiedosto,
+                *sanaindeksin_tiedostot(a.sanaindeksi_hakemisto),
+                a.sanastoindeksi_tiedosto, a.hakuparametrit_tiedosto,
+                *hierarkian_tiedostot(a.hierarkia_hakemisto), a.vektorit_tiedosto,
+            ],
+            a.embedding_malli, a.rerank_tunniste, a.kvantisoi_upotus,
+            STRATEGIA_SANAKIRJA, STRATEGIA_SIEMENJAE_KARTTA, STRATEGIA_VARTALOT,
+            [
+                KYSELYN_PAINO, SELITTEEN_PAINO, SIEMENEN_PAINO,
+                a.strategia_pooli, a.automaattiset_siemenet, a.kaskadi_erakoko,
+                a.hakutila, a.sanahaku_maara, RRF_K,
+                a.hierarkia_taso, a.hierarkia_maara,
+                # Budjetti vain käytössä ollessaan, jotta oletus ei mitätöi välimuisteja.
+                *([a.kyselyn_tokenibudjetti] if a.kyselyn_tokenibudjetti is not None else []),
+            ],
+        )
+        try:
+            return Tulosvalimuisti(
+                a.tulosvalimuisti_hakemisto, versio,
+                a.tulosvalimuisti_muisti_mt * 1024 * 1024,
+                a.tulosvalimuisti_levy_mt * 1024 * 1024,
+            )
+        except Exception as e:
+            logging.warning(f"Tulosvälimuistia ei voitu avata: {e}")
+            return None
+
+    def _lataa_ja_lammita(self):
+        """
+        Lataa mallit, indeksin ja jaevaraston rinnakkain, koska ne eivät riipu
+        toisistaan, ja ajaa lopuksi tyhjän päättelyn molemmilla malleilla, jotta
+        ensimmäinen oikea haku ei maksa alustus- ja muistinvarauskuluja.
+        """
+        logging.info("Ladataan hakumallit, indeksi ja datatiedostot muistiin...")
+        with ThreadPoolExecutor(max_workers=8, thread_name_prefix="lataus") as pooli:
+            model_f = pooli.submit(self._lataa_embedding_malli)
+            cross_encoder_f = pooli.submit(self._lataa_cross_encoder)
+            paaindeksi_f = pooli.submit(self._lataa_paaindeksi)
+            # Tiivis jaevarasto: FAISS-tunniste -> viite ja teksti taulukkohakuna.
+            jaevarasto_f = pooli.submit(Jaevarasto, self.asetukset.jaevarasto_hakemisto)
+            siemenhaku_f = pooli.submit(self._lataa_siemenhaku)
+            sanaindeksi_f = pooli.submit(self._lataa_sanaindeksi)
+            normalisoija_f = pooli.submit(self._lataa_normalisoija)
+            hierarkia_f = pooli.submit(self._lataa_hierarkia)
+            model = model_f.result()
+            cross_encoder = cross_encoder_f.result()
+            paaindeksi = paaindeksi_f.result()
+            jaevarasto = jaevarasto_f.result()
+            siemenhaku = siemenhaku_f.result()
+            sanaindeksi = sanaindeksi_f.result()
+            normalisoija = normalisoija_f.result()
+            hierarkia = hierarkia_f.result()
+
+        logging.info("Lämmitetään mallit tyhjällä päättelyllä...")
+        lammitys_vektori = model.encode(["Lämmittely"], show_progress_bar=False)
+        cross_encoder.predict([["Lämmittely", "Lämmittely"]], show_progress_bar=False)
+        paaindeksi.hae(lammitys_vektori, 1)
+
+        # Strategioiden selitteet ja siemenjakeet vektoroidaan kerran.
+        strategiat = Strategiakerros(
+            model, jaevarasto, self.asetukset.enkoodaus_erakoko,
+            siemenhaku, self.asetukset.automaattiset_siemenet, normalisoija,
+        )
+        strategiat.laske_ehdokaspoolit(paaindeksi, self.asetukset.strategia_pooli)
+
+        if self.asetukset.kayta_valimuisteja:
+            self.pistevarasto = self._avaa_pistevarasto()
+            self.tulosvalimuisti = self._avaa_tulosvalimuisti()
+        self.model, self.cross_encoder = model, cross_encoder
+        self.paaindeksi, self.jaevarasto = paaindeksi, jaevarasto
+        self.strategiat = strategiat
+        if sanaindeksi is not None:
+            sanaindeksi.normalisoija = normalisoija
+        self.sanaindeksi = sanaindeksi
+        self.hierarkia = hierarkia
+        self.kerroinportaat = lataa_kerroinportaat(self.asetukset.hakuparametrit_tiedosto)
+        self.pisterajat = Pisterajat.lataa(
+            self.asetukset.kaskadi_kalibrointi_tiedosto, paaindeksi.tiedot["metriikka"]
+        )
+        logging.info("Kaikki resurssit ladattu onnistuneesti.")
+
+    # --- HAKU ---
+
+    def pisteyta_parit(self, parit: list, viitteet: list[str]) -> list[float]:
+        """
+        Pisteyttää (kysely, jaeteksti) -parit. Pysyvästä varastosta löytyvät
+        pisteet käytetään sellaisenaan, ja cross-encoderille lähetetään vain puuttuvat.
+        """
+        if self.pistevarasto is None:
+            return self._ennusta(parit)
+
+        with self.mittarit.vaihe("pistevarasto", parit=len(parit)) as vaihe:
+            avaimet = [
+                pisteavain(self.asetukset.rerank_tunniste, kysely, viite)
+                for (kysely, _), viite in zip(parit, viitteet)
+            ]
+            tallennetut = self.pistevarasto.hae(avaimet)
+            puuttuvat = [i for i, avain in enumerate(avaimet) if avain not in tallennetut]
+            vaihe["osumat"] = len(parit) - len(puuttuvat)
+        logging.info(
+            f"Pistevarastosta löytyi {len(parit) - len(puuttuvat)}/{len(parit)} paria."
+        )
+
+        uudet = {}
+        if puuttuvat:
+            pisteet = self._ennusta([parit[i] for i in puuttuvat])
+            uudet = {avaimet[i]: float(p) for i, p in zip(puuttuvat, pisteet)}
+            self.pistevarasto.tallenna(uudet)
+
+        return [
+            tallennetut[avain] if avain in tallennetut else uudet[avain]
+            for avain in avaimet
+        ]
+
+    def _ennusta(self, parit: list) -> list[float]:
+        """
+        Pisteyttää parit cross-encoderilla pituusjärjestetyissä erissä ja
+        kirjaa parien ja erien määrän.
+        """
+        erakoko = self.asetukset.rerank_erakoko
+        with self.mittarit.vaihe(
+            "cross_encoder", parit=len(parit), erakoko=erakoko,
+            eria=-(-len(parit) // erakoko),
+        ):
+            return ennusta_pituusjarjestyksessa(self.cross_encoder, parit, erakoko)
+
+    def rajaa_kysely(self, kysely: str) -> str:
+        """Rajaa kyselyn uudelleenjärjestyksen tokenibudjettiin."""
+        return rajaa_kysely(
+            kysely, getattr(self.cross_encoder, "tokenizer", None),
+            self.asetukset.kyselyn_tokenibudjetti,
+        )
+
+    def kerai_pakolliset_jakeet(self, kysely: str) -> list[dict]:
+        """Poimii kyselyn omat raamatunviitteet ja palauttaa niiden jakeet."""
+        viite_lista = poimi_raamatunviitteet(kysely)
+        pakolliset_jakeet = []
+        loytyneet_viitteet = set()
+        for viite in viite_lista:
+            jakeet = hae_jakeet_viitteella(viite, self.jaevarasto)
+            for jae in jakeet:
+                if jae["viite"] not in loytyneet_viitteet:
+                    pakolliset_jakeet.append(jae)
+                    loytyneet_viitteet.add(jae["viite"])
+        logging.info(
+            f"Löydettiin {len(viite_lista)} viitettä, jotka vastasivat "
+            f"{len(pakolliset_jakeet)} uniikkia jaetta."
+        )
+        return pakolliset_jakeet
+
+    def tunnista_strategia(self, kysely: str) -> str | None:
+        """Palauttaa kyselyn aktivoiman strategian avainsanan tai None."""
+        avainsana = self.strategiat.tunnista(kysely)
+        if avainsana is None:
+            logging.info("Strategiaa ei löytynyt. Käytetään perinteistä semanttista hakua.")
+        else:
+            logging.info(f"Strategia aktivoitu avainsanalla '{avainsana}'.")
+        return avainsana
+
+    def etsi_batch(self, kyselyt: list[str], top_k: int = 15,
+                   aikaraja_s: float | None = None) -> list[list[dict]]:
+        """
+        Etsii usealle kyselylle (esim. tutkielman kaikille osioille) kerralla.
+        Kyselyt vektoroidaan yhdellä kutsulla, FAISS-haku tehdään yhtenä
+        monirivisenä hakuna ja (kysely, ehdokas) -parit pisteytetään
+        porrastetusti samoissa cross-encoder-erissä. Aikarajan (sekunteina)
+        ylittyessä palautetaan paras saatavilla oleva tulos. Tulokset
+        palautetaan kyselyiden järjestyksessä. Lataa resurssit tarvittaessa.
+        """
+        if not kyselyt:
+            return []
+        self.lataa()
+        if aikaraja_s is None:
+            aikaraja_s = self.asetukset.aikaraja_s
+        takaraja = None if aikaraja_s is None else time.perf_counter() + aikaraja_s
+
+        with self.mittarit.jaljita(kyselyja=len(kyselyt), top_k=top_k) as jalki:
+            if self.tulosvalimuisti is None:
+                tulokset, keskeneraiset = self._etsi_batch(kyselyt, top_k, takaraja)
+                puuttuvat = range(len(kyselyt))
+            else:
+                tulokset = [self.tulosvalimuisti.hae(kysely, top_k) for kysely in kyselyt]
+                puuttuvat = [i for i, tulos in enumerate(tulokset) if tulos is None]
+                logging.info(
+                    f"Tulosvälimuistista löytyi {len(kyselyt) - len(puuttuvat)}/"
+                    f"{len(kyselyt)} osiota."
+                )
+                keskeneraiset = set()
+                if puuttuvat:
+                    uudet, keskeneraiset = self._etsi_batch(
+                        [kyselyt[i] for i in puuttuvat], top_k, takaraja
+                    )
+                    for rivi, (i, tulos) in enumerate(zip(puuttuvat, uudet)):
+                        tulokset[i] = tulos
+                        # Aikarajan vuoksi keskeneräisiä tuloksia ei tallenneta.
+                        if tulos and rivi not in keskeneraiset:
+                            self.tulosvalimuisti.tallenna(kyselyt[i], top_k, tulos)
+            if jalki is not None:
+                jalki.tiedot.update(
+                    valimuistiosumat=len(kyselyt) - len(puuttuvat),
+                    keskeneraiset=len(keskeneraiset),
+                )
+        return tulokset
+
+    def etsi(self, kysely: str, top_k: int = 15,
+             aikaraja_s: float | None = None) -> list[dict]:
+        """Etsii yhdelle kyselylle."""
+        return self.etsi_batch([kysely], top_k, aikaraja_s)[0]
+
+    def etsi_vaiheittain(self, kyselyt: list[str], top_k: int = 15,
+                         rinnakkaisuus: int | None = None,
+                         aikaraja_s: float | None = None):
+        """
+        Etsii kyselyt rajatussa säiepoolissa ja tuottaa (rivi, tulokset)
+        -pareja valmistumisjärjestyksessä, jotta käyttöliittymä voi näyttää
+        ensimmäiset osiot ennen kuin koko tutkielma on haettu. Kyselyt
+        käynnistyvät annetussa järjestyksessä; kesken suljettu generaattori
+        peruu aloittamattomat haut.
+        """
+        if not kyselyt:
+            return
+        self.lataa()
+        rinnakkaisuus = rinnakkaisuus or self.asetukset.osio_rinnakkaisuus
+        with ThreadPoolExecutor(
+            max_workers=max(1, rinnakkaisuus), thread_name_prefix="osiohaku"
+        ) as pooli:
+            tehtavat = {
+                pooli.submit(self.etsi, kysely, top_k, aikaraja_s): rivi
+                for rivi, kysely in enumerate(kyselyt)
+            }
+            try:
+                for valmis in as_completed(tehtavat):
+                    yield tehtavat[valmis], valmis.result()
+            finally:
+                for tehtava in tehtavat:
+                    tehtava.cancel()
+
+    def profiloi(self, kysely: str, top_k: int = 15,
+                 tiedosto: str | None = PROFIILI_TIEDOSTO) -> list[dict]:
+        """Ajaa yhden haun cProfilen alla ja tallentaa profiilin tiedostoon."""
+        self.lataa()
+        tulokset, _ = profiloi(lambda: self.etsi(kysely, top_k), tiedosto)
+        return tulokset
+
+    def hae_ehdokkaat(self, kyselyt: list[str], top_k: int) -> tuple:
+        """
+        Kerää kyselyiden pakolliset jakeet sekä bi-enkooderin ehdokkaat ja
+        niiden etäisyydet (pienempi on parempi) parhaasta alkaen.
+        Palauttaa (pakolliset, ehdokkaat, etäisyydet).
+        """
+        with self.mittarit.vaihe("viitteet") as vaihe:
+            pakolliset = [self.kerai_pakolliset_jakeet(kysely) for kysely in kyselyt]
+            vaihe["jakeita"] = sum(len(p) for p in pakolliset)
+        with self.mittarit.vaihe("strategia") as vaihe:
+            strategiat = [self.tunnista_strategia(kysely) for kysely in kyselyt]
+            vaihe["osumat"] = sum(s is not None for s in strategiat)
+        kaikki_ehdokkaat = [[] for _ in kyselyt]
+        kaikki_etaisyydet = [[] for _ in kyselyt]
+        haettava_maara = laske_haettava_maara(
+            top_k, self.paaindeksi.ntotal, self.kerroinportaat
+        )
+        if haettava_maara <= 0:
+            return pakolliset, kaikki_ehdokkaat, kaikki_etaisyydet
+
+        # Vain lyhyet kyselyt vektoroidaan; strategian esilaskettu
+        # vektori yhdistetään niihin vektoritasolla.
+        erakoko = self.asetukset.enkoodaus_erakoko
+        with self.mittarit.vaihe("enkoodaus", kyselyja=len(kyselyt), erakoko=erakoko):
+            kysely_vektorit = self.strategiat.yhdista(self.model.encode(
+                kyselyt, batch_size=erakoko, show_progress_bar=False
+            ), strategiat)
+        with self.mittarit.vaihe("faiss", kyselyja=len(kyselyt), k=haettava_maara) as vaihe:
+            if self.hierarkia is not None:
+                # Vain karkealla tasolla valittujen lukujen jaeikkunat haetaan.
+                vaihe["hierarkia"] = self.hierarkia.taso
+                arvot, indeksit = self.hierarkia.hae(kysely_vektorit, haettava_maara)
+            else:
+                arvot, indeksit = self.paaindeksi.hae(kysely_vektorit, haettava_maara)
+        metriikka = self.paaindeksi.tiedot["metriikka"]
+
+        # Sanahaku kirjataan omana vaiheenaan kokoamisen sisällä.
+        with self.mittarit.vaihe("kokoaminen") as vaihe:
+            for rivi in range(len(kyselyt)):
+                loytyneet_viitteet = {jae["viite"] for jae in pakolliset[rivi]}
+                tunnisteet = [
+                    (int(idx), etaisyys(float(arvo), metriikka))
+                    for idx, arvo in zip(indeksit[rivi], arvot[rivi]) if idx >= 0
+                ]
+                if self.sanaindeksi is not None:
+                    tunnisteet = self._yhdista_sanahaku(
+                        kyselyt[rivi], tunnisteet, haettava_maara
+                    )
+                # Strategian esihaettu pooli jatkaa listaa viimeisellä etäisyydellä.
+                pooli = self.strategiat.ehdokaspoolit.get(strategiat[rivi], [])
+                nahdyt = {idx for idx, _ in tunnisteet}
+                viimeinen = tunnisteet[-1][1] if tunnisteet else 0.0
+                tunnisteet += [(idx, viimeinen) for idx in pooli if idx not in nahdyt]
+                for idx, etaisyys_arvo in tunnisteet:
+                    jae = self.jaevarasto.jae(idx)
+                    if jae["viite"] not in loytyneet_viitteet:
+                        kaikki_ehdokkaat[rivi].append(jae)
+                        kaikki_etaisyydet[rivi].append(etaisyys_arvo)
+            vaihe["ehdokkaita"] = sum(len(e) for e in kaikki_ehdokkaat)
+        return pakolliset, kaikki_ehdokkaat, kaikki_etaisyydet
+
+    def _yhdista_sanahaku(self, kysely: str, tunnisteet: list, maara: int) -> list:
+        """
+        Yhdistää vektorihaun ja BM25-haun sijoitukset RRF:llä ja rajaa tuloksen
+        maara ehdokkaaseen. Pelkän sanahaun löytämä jae ei mahtunut vektorihaun
+        tuloksiin, joten sen etäisyys on vähintään vektorihaun viimeinen.
+        Etäisyydet muutetaan loppuosan minimiksi, jotta kaskadin yläraja
+        kattaa kaikki jäljellä olevat ehdokkaat myös RRF-järjestyksessä.
+        """
+        etaisyydet = dict(tunnisteet)
+        viimeinen = tunnisteet[-1][1] if tunnisteet else 0.0
+        with self.mittarit.vaihe("sanahaku") as vaihe:
+            sanaosumat = self.sanaindeksi.hae(kysely, self.asetukset.sanahaku_maara)
+            vaihe["osumat"] = len(sanaosumat)
+        yhdistetty = yhdista_rrf([[idx for idx, _ in tunnisteet], sanaosumat])[:maara]
+        arvot = [etaisyydet.get(idx, viimeinen) for idx in yhdistetty]
+        for i in range(len(arvot) - 2, -1, -1):
+            arvot[i] = min(arvot[i], arvot[i + 1])
+        logging.info(
+            f"Hybridihaku: {len(sanaosumat)} BM25-osumaa, joista "
+            f"{sum(idx not in etaisyydet for idx in yhdistetty)} uutta ehdokasta."
+        )
+        return list(zip(yhdistetty, arvot))
+
+    def _etsi_batch(self, kyselyt: list[str], top_k: int,
+                    takaraja: float | None = None) -> tuple[list[list[dict]], set]:
+        """
+        Suorittaa erähaun ilman tulosvälimuistia. Palauttaa (tulokset,
+        keskeneräiset), missä keskeneräiset ovat aikarajan katkaisemat rivit.
+        """
+        pakolliset, ehdokkaat, etaisyydet = self.hae_ehdokkaat(kyselyt, top_k)
+
+        # VAIHE 4: Porrastettu uudelleenjärjestys kaikille kyselyille kerralla.
+        # Pisteavaimet lasketaan rajatusta kyselystä, joten budjetin muutos
+        # ei käytä vanhoja pisteitä.
+        with self.mittarit.vaihe("uudelleenjarjestys") as vaihe:
+            alyhaun_tulokset, keskeneraiset = jarjesta_kaskadina(
+                self.pisteyta_parit, [self.rajaa_kysely(k) for k in kyselyt],
+                ehdokkaat, etaisyydet, top_k,
+                self.pisterajat, self.asetukset.kaskadi_erakoko, takaraja,
+            )
+            vaihe["ehdokkaita"] = sum(len(e) for e in ehdokkaat)
+
+        lopulliset = []
+        for pakolliset_jakeet, tulokset in zip(pakolliset, alyhaun_tulokset):
+            lopulliset_tulokset = pakolliset_jakeet + tulokset
+            logging.info(
+                f"Yhdistetty {len(pakolliset_jakeet)} pakollista jaetta ja "
+                f"{len(tulokset)} älyhaun tulosta. "
+                f"Yhteensä {len(lopulliset_tulokset)} jaetta."
+            )
+            lopulliset.append(lopulliset_tulokset)
+        return lopulliset, keskeneraiset
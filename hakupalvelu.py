@@ -0,0 +1,228 @@
+# hakupalvelu.py (Versio 1.0 - Paikallinen HTTP-hakupalvelu erähaulla)
+import argparse
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from hakukone import Hakukone
+
+# --- MÄÄRITYKSET ---
+OLETUS_OSOITE = "127.0.0.1"
+OLETUS_PORTTI = 8765
+# Kuinka kauan ensimmäisen pyynnön jälkeen odotetaan muita samaan erään.
+ERAN_IKKUNA_MS = 20
+ERAN_MAX_KOKO = 32
+# Jonon täyttyessä uudet pyynnöt hylätään heti (503) eikä niitä jonoteta.
+JONON_MAX_KOKO = 256
+PYYNNON_AIKARAJA_S = 30.0
+RUNGON_MAX_TAVUT = 64 * 1024
+OLETUS_TOP_K = 15
+# Sama kuin käyttöliittymän liukusäätimen yläraja; suurempi top_k hylätään (400).
+MAX_TOP_K = 100
+
+_TILAT = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 500: "Internal Server Error",
+    503: "Service Unavailable", 504: "Gateway Timeout",
+}
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] - %(message)s",
+    datefmt="%H:%M:%S",
+)
+
+
+class Hakupalvelu:
+    """
+    Asyncio-pohjainen HTTP-palvelu hakukoneen ympärillä. Samanaikaiset
+    pyynnöt kerätään lyhyen ikkunan ajan yhdeksi eräksi, joka ajetaan
+    yhdellä vektoroinnilla, FAISS-haulla ja uudelleenjärjestyksellä.
+    Rajattu jono antaa vastapaineen (503) ja jokaisella pyynnöllä on aikaraja (504).
+    Aikaraja välitetään myös hakukoneelle, joten vanhentunut erä vapauttaa hakusäikeen.
+    """
+
+    def __init__(self, hakukone: Hakukone, ikkuna_ms: float = ERAN_IKKUNA_MS,
+                 max_era: int = ERAN_MAX_KOKO, jonon_koko: int = JONON_MAX_KOKO,
+                 aikaraja_s: float = PYYNNON_AIKARAJA_S):
+        self.hakukone = hakukone
+        self.ikkuna_s = ikkuna_ms / 1000
+        self.max_era = max_era
+        self.aikaraja_s = aikaraja_s
+        self._jono = asyncio.Queue(maxsize=jonon_koko)
+        # Yksi hakusäie: erät ajetaan peräkkäin, jotta mallit eivät kilpaile.
+        self._hakusaie = ThreadPoolExecutor(max_workers=1, thread_name_prefix="haku")
+        self._keraaja = None
+
+    async def kaynnista(self, osoite: str, portti: int):
+        """Lataa hakukoneen, käynnistää eräkerääjän ja palvelee pyyntöjä."""
+        silmukka = asyncio.get_running_loop()
+        await silmukka.run_in_executor(self._hakusaie, self.hakukone.lataa)
+        self._keraaja = asyncio.create_task(self._keraa_eria())
+        palvelin = await asyncio.start_server(self._kasittele_yhteys, osoite, portti)
+        logging.info(f"Hakupalvelu kuuntelee osoitteessa http://{osoite}:{portti}/etsi")
+        try:
+            async with palvelin:
+                await palvelin.serve_forever()
+        finally:
+            self._keraaja.cancel()
+            self._hakusaie.shutdown(wait=True)
+
+    async def etsi(self, kysely: str, top_k: int) -> list[dict]:
+        """
+        Lisää kyselyn jonoon ja odottaa sen erän tulosta. Nostaa
+        asyncio.QueueFull-poikkeuksen, jos jono on täynnä, ja
+        TimeoutError-poikkeuksen, jos aikaraja ylittyy.
+        """
+        silmukka = asyncio.get_running_loop()
+        tulos = silmukka.create_future()
+        takaraja = silmukka.time() + self.aikaraja_s
+        self._jono.put_nowait((kysely, top_k, tulos, takaraja))
+        return await asyncio.wait_for(tulos, self.aikaraja_s)
+
+    async def _keraa_eria(self):
+        """Kokoaa jonosta eriä ja ajaa ne hakukoneella."""
+        silmukka = asyncio.get_running_loop()
+        while True:
+            era = [await self._jono.get()]
+            takaraja = silmukka.time() + self.ikkuna_s
+            while len(era) < self.max_era:
+                jaljella = takaraja - silmukka.time()
+                if jaljella <= 0:
+                    break
+                try:
+                    era.append(await asyncio.wait_for(self._jono.get(), jaljella))
+                except asyncio.TimeoutError:
+                    break
+
+            # Aikarajan ylittäneiden pyyntöjen tuloksia ei enää odoteta.
+            era = [pyynto for pyynto in era if not pyynto[2].done()]
+            if not era:
+                continue
+            alku = time.perf_counter()
+            try:
+                await self._aja_era(silmukka, era)
+            except Exception as e:
+                logging.error(f"Erähaku epäonnistui: {e}")
+                for _, _, tulos, _ in era:
+                    if not tulos.done():
+                        tulos.set_exception(e)
+            logging.info(
+                f"Ajettiin {len(era)} kyselyn erä "
+                f"({(time.perf_counter() - alku) * 1000:.1f} ms)."
+            )
+
+    async def _aja_era(self, silmukka, era: list):
+        """
+        Ajaa erän; etsi_batch ottaa yhden top_k:n, joten erä ryhmitellään sen
+        mukaan. Ryhmän aikarajana on sen myöhäisimmän pyynnön jäljellä oleva
+        aika, joten haku keskeytyy viimeistään, kun kukaan ei enää odota sitä.
+        """
+        ryhmat = {}
+        for pyynto in era:
+            ryhmat.setdefault(pyynto[1], []).append(pyynto)
+        for top_k, pyynnot in ryhmat.items():
+            pyynnot = [pyynto for pyynto in pyynnot if not pyynto[2].done()]
+            jaljella = max((pyynto[3] for pyynto in pyynnot), default=0.0) - silmukka.time()
+            if jaljella <= 0:
+                continue
+            tulokset = await silmukka.run_in_executor(
+                self._hakusaie, self.hakukone.etsi_batch,
+                [kysely for kysely, _, _, _ in pyynnot], top_k, jaljella,
+            )
+            for (_, _, tulos, _), osion_tulokset in zip(pyynnot, tulokset):
+                if not tulos.done():
+                    tulos.set_result(osion_tulokset)
+
+    async def _kasittele_yhteys(self, lukija, kirjoittaja):
+        """Käsittelee yhden HTTP/1.1-pyynnön ja sulkee yhteyden."""
+        try:
+            tila, vastaus = await self._kasittele_pyynto(lukija)
+        except Exception as e:
+            logging.error(f"Pyynnön käsittely epäonnistui: {e}")
+            tila, vastaus = 500, {"virhe": str(e)}
+        runko = json.dumps(vastaus, ensure_ascii=False, default=float).encode("utf-8")
+        kirjoittaja.write(
+            f"HTTP/1.1 {tila} {_TILAT[tila]}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(runko)}\r\n"
+            "Connection: close\r\n\r\n".encode("ascii") + runko
+        )
+        try:
+            await kirjoittaja.drain()
+        finally:
+            kirjoittaja.close()
+
+    async def _kasittele_pyynto(self, lukija) -> tuple[int, dict]:
+        """Jäsentää pyynnön ja palauttaa (HTTP-tila, JSON-vastaus)."""
+        pyyntorivi = (await lukija.readline()).decode("latin-1").split()
+        otsakkeet = {}
+        while True:
+            rivi = await lukija.readline()
+            if rivi in (b"\r\n", b"\n", b""):
+                break
+            nimi, _, arvo = rivi.decode("latin-1").partition(":")
+            otsakkeet[nimi.strip().lower()] = arvo.strip()
+
+        if len(pyyntorivi) < 2:
+            return 400, {"virhe": "Virheellinen pyyntö."}
+        metodi, polku = pyyntorivi[0], pyyntorivi[1]
+        if polku == "/tila":
+            return 200, {
+                "valmis": self.hakukone.valmis, "jonossa": self._jono.qsize(),
+            }
+        if polku != "/etsi":
+            return 404, {"virhe": f"Tuntematon polku '{polku}'."}
+        if metodi != "POST":
+            return 405, {"virhe": "Käytä POST-pyyntöä."}
+
+        try:
+            pituus = int(otsakkeet.get("content-length", 0))
+        except ValueError:
+            return 400, {"virhe": "Virheellinen Content-Length."}
+        if pituus > RUNGON_MAX_TAVUT:
+            return 413, {"virhe": "Pyyntö on liian suuri."}
+        try:
+            data = json.loads(await lukija.readexactly(pituus))
+            kysely = data["kysely"]
+            top_k = int(data.get("top_k", OLETUS_TOP_K))
+        except (ValueError, KeyError, TypeError, asyncio.IncompleteReadError):
+            return 400, {"virhe": "Odotettiin JSON-runkoa {'kysely': ..., 'top_k': ...}."}
+        if not isinstance(kysely, str) or not kysely.strip() or top_k <= 0:
+            return 400, {"virhe": "Kysely puuttuu tai top_k ei ole positiivinen."}
+        if top_k > MAX_TOP_K:
+            return 400, {"virhe": f"top_k saa olla enintään {MAX_TOP_K}."}
+
+        try:
+            tulokset = await self.etsi(kysely, top_k)
+        except asyncio.QueueFull:
+            return 503, {"virhe": "Palvelu on ruuhkautunut, yritä hetken päästä uudelleen."}
+        except asyncio.TimeoutError:
+            return 504, {"virhe": f"Haku ei valmistunut {self.aikaraja_s:.0f} sekunnissa."}
+        return 200, {"kysely": kysely, "tulokset": tulokset}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Paikallinen Raamattu-hakupalvelu.")
+    parser.add_argument("--osoite", default=OLETUS_OSOITE)
+    parser.add_argument("--portti", type=int, default=OLETUS_PORTTI)
+    parser.add_argument("--ikkuna-ms", type=float, default=ERAN_IKKUNA_MS,
+                        help="Eräkeräyksen ikkuna millisekunteina.")
+    parser.add_argument("--max-era", type=int, default=ERAN_MAX_KOKO)
+    parser.add_argument("--jono", type=int, default=JONON_MAX_KOKO,
+                        help="Jonon enimmäiskoko ennen kuin pyyntöjä hylätään.")
+    parser.add_argument("--aikaraja", type=float, default=PYYNNON_AIKARAJA_S,
+                        help="Pyyntökohtainen aikaraja sekunteina.")
+    args = parser.parse_args()
+
+    palvelu = Hakupalvelu(
+        Hakukone(), args.ikkuna_ms, args.max_era, args.jono, args.aikaraja
+    )
+    try:
+        asyncio.run(palvelu.kaynnista(args.osoite, args.portti))
+    except KeyboardInterrupt:
+        logging.info("Hakupalvelu pysäytetty.")
+    finally:
+        palvelu.hakukone.sulje()
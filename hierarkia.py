@@ -0,0 +1,155 @@
+# hierarkia.py (Versio 1.0 - Luku- ja perikooppitason karkea haku)
+import argparse
+import logging
+import os
+import numpy as np
+
+from jaevarasto import JAEVARASTO_HAKEMISTO, Jaevarasto
+from vektori_indeksi import METRIIKAT, Hakuindeksi, rakenna_indeksi, tallenna_indeksi
+
+# --- MÄÄRITYKSET ---
+HIERARKIA_HAKEMISTO = "D:/Python_AI/Raamattu-tutkija-data/hierarkia"
+VEKTORIT_TIEDOSTO = "D:/Python_AI/Raamattu-tutkija-data/raamattu_vektorit.npy"
+HIERARKIATASOT = ("luku", "perikooppi")
+# Perikooppien rajoja ei ole lähdedatassa, joten luku jaetaan enintään
+# tämän mittaisiin, keskenään lähes yhtä pitkiin peräkkäisiin jaksoihin.
+PERIKOOPIN_MAX_JAKEET = 12
+# Karkealla tasolla valittavien lukujen tai perikooppien määrä.
+KARKEA_MAARA = 20
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] - %(message)s",
+    datefmt="%H:%M:%S",
+)
+
+
+def luvun_rajat(jaevarasto: Jaevarasto) -> np.ndarray:
+    """
+    Palauttaa lukujen rajat CSR-muodossa: luvun u jakeet ovat tunnisteet
+    alut[u]:alut[u+1]. Jaevaraston jakeet ovat kirja- ja lukujärjestyksessä.
+    """
+    kirjat = np.asarray(jaevarasto.kirja_nro, dtype=np.int64)
+    luvut = np.asarray(jaevarasto.luku_nro, dtype=np.int64)
+    if len(kirjat) == 0:
+        return np.zeros(1, dtype=np.int64)
+    vaihtuu = np.flatnonzero((kirjat[1:] != kirjat[:-1]) | (luvut[1:] != luvut[:-1])) + 1
+    return np.concatenate(([0], vaihtuu, [len(kirjat)])).astype(np.int64)
+
+
+def perikooppien_rajat(luku_alut: np.ndarray,
+                       max_jakeet: int = PERIKOOPIN_MAX_JAKEET) -> np.ndarray:
+    """Jakaa jokaisen luvun enintään max_jakeet jakeen perikooppeihin."""
+    alut = []
+    for alku, loppu in zip(luku_alut[:-1].tolist(), luku_alut[1:].tolist()):
+        osia = -(-(loppu - alku) // max_jakeet)
+        alut.extend(np.linspace(alku, loppu, osia + 1).round().astype(np.int64)[:-1].tolist())
+    return np.array(alut + [int(luku_alut[-1])], dtype=np.int64)
+
+
+def _indeksi_tiedosto(hakemisto: str, taso: str) -> str:
+    return os.path.join(hakemisto, f"{taso}_indeksi.faiss")
+
+
+def _alut_tiedosto(hakemisto: str, taso: str) -> str:
+    return os.path.join(hakemisto, f"{taso}_alut.npy")
+
+
+def hierarkian_tiedostot(hakemisto: str = HIERARKIA_HAKEMISTO) -> list[str]:
+    """Palauttaa hierarkiaindeksien tiedostopolut (esim. versiotunnistetta varten)."""
+    return [
+        polku for taso in HIERARKIATASOT
+        for polku in (_indeksi_tiedosto(hakemisto, taso), _alut_tiedosto(hakemisto, taso))
+    ]
+
+
+def rakenna_hierarkia(vektorit: np.ndarray, jaevarasto: Jaevarasto,
+                      hakemisto: str = HIERARKIA_HAKEMISTO, metriikka: str = "l2"):
+    """
+    Rakentaa luku- ja perikooppitason indeksit jaeikkunoiden vektoreista.
+    Yksikön vektori on sen jaeikkunoiden keskiarvo, joten uutta vektorointia
+    ei tarvita eikä mallin syötepituus rajoita pitkiä lukuja. Yksikön u
+    jaetunnisteet tallennetaan rajoina, joten tasot jakavat pääindeksin tunnisteavaruuden.
+    """
+    os.makedirs(hakemisto, exist_ok=True)
+    vektorit = np.asarray(vektorit, dtype=np.float32)
+    luku_alut = luvun_rajat(jaevarasto)
+    tasot = {"luku": luku_alut, "perikooppi": perikooppien_rajat(luku_alut)}
+    for taso, alut in tasot.items():
+        summat = np.add.reduceat(vektorit, alut[:-1], axis=0)
+        keskiarvot = summat / np.diff(alut)[:, None].astype(np.float32)
+        indeksi, tiedot = rakenna_indeksi(keskiarvot, "flat", metriikka)
+        tiedot["taso"] = taso
+        tallenna_indeksi(indeksi, tiedot, _indeksi_tiedosto(hakemisto, taso))
+        np.save(_alut_tiedosto(hakemisto, taso), alut)
+        logging.info(
+            f"Hierarkiataso '{taso}' tallennettu: {len(alut) - 1} yksikköä, "
+            f"keskimäärin {np.diff(alut).mean():.1f} jaetta."
+        )
+
+
+class Hierarkiahaku:
+    """
+    Karkeasta tarkkaan etenevä haku. Ensin haetaan pienestä luku- tai
+    perikooppi-indeksistä lähimmät yksiköt, sitten vain niiden jaeikkunat
+    pisteytetään tarkasti muistikartoitetuista vektoreista. Tulos on samassa
+    muodossa kuin FAISS-haun (arvot, tunnisteet), joten loppu putki ei muutu.
+    """
+
+    def __init__(self, hakemisto: str, taso: str, vektorit_tiedosto: str,
+                 karkea_maara: int = KARKEA_MAARA):
+        if taso not in HIERARKIATASOT:
+            raise ValueError(f"Tuntematon hierarkiataso '{taso}'.")
+        self.taso = taso
+        self.karkea_maara = karkea_maara
+        self.indeksi = Hakuindeksi(_indeksi_tiedosto(hakemisto, taso))
+        self.alut = np.load(_alut_tiedosto(hakemisto, taso))
+        self.vektorit = np.load(vektorit_tiedosto, mmap_mode="r")
+        self.metriikka = self.indeksi.tiedot["metriikka"]
+        if self.alut[-1] != len(self.vektorit):
+            raise ValueError(
+                f"Hierarkia kattaa {self.alut[-1]} jaetta, vektoreita on {len(self.vektorit)}."
+            )
+
+    def hae(self, kyselyvektorit, k: int) -> tuple:
+        """Palauttaa (arvot, tunnisteet) FAISS:n tapaan, puuttuvat rivit -1:nä."""
+        kyselyvektorit = np.asarray(kyselyvektorit, dtype=np.float32)
+        _, yksikot = self.indeksi.hae(
+            kyselyvektorit, min(self.karkea_maara, len(self.alut) - 1)
+        )
+        ip = self.metriikka == "ip"
+        arvot = np.full((len(kyselyvektorit), k), -np.inf if ip else np.inf, dtype=np.float32)
+        tunnisteet = np.full((len(kyselyvektorit), k), -1, dtype=np.int64)
+        for rivi, (kysely, rivin_yksikot) in enumerate(zip(kyselyvektorit, yksikot)):
+            jaet = np.sort(np.concatenate([
+                np.arange(self.alut[u], self.alut[u + 1]) for u in rivin_yksikot if u >= 0
+            ] or [np.zeros(0, dtype=np.int64)]))
+            if len(jaet) == 0:
+                continue
+            vektorit = np.asarray(self.vektorit[jaet], dtype=np.float32)
+            if ip:
+                vektorit /= np.linalg.norm(vektorit, axis=1, keepdims=True) + 1e-12
+                kysely = kysely / (np.linalg.norm(kysely) + 1e-12)
+                # Pienempi on parempi järjestyksessä; arvoksi palautetaan sisätulo.
+                etaisyydet = -(vektorit @ kysely)
+            else:
+                etaisyydet = ((vektorit - kysely) ** 2).sum(axis=1)
+            maara = min(k, len(jaet))
+            parhaat = np.argpartition(etaisyydet, maara - 1)[:maara]
+            parhaat = parhaat[np.argsort(etaisyydet[parhaat], kind="stable")]
+            arvot[rivi, :maara] = -etaisyydet[parhaat] if ip else etaisyydet[parhaat]
+            tunnisteet[rivi, :maara] = jaet[parhaat]
+        return arvot, tunnisteet
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rakentaa luku- ja perikooppi-indeksit tallennetuista jaevektoreista."
+    )
+    parser.add_argument("--metriikka", choices=METRIIKAT, default="l2",
+                        help="Käytä samaa metriikkaa kuin pääindeksissä.")
+    args = parser.parse_args()
+    rakenna_hierarkia(
+        np.load(VEKTORIT_TIEDOSTO), Jaevarasto(JAEVARASTO_HAKEMISTO),
+        HIERARKIA_HAKEMISTO, args.metriikka,
+    )
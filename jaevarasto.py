@@ -0,0 +1,169 @@
+# jaevarasto.py (Versio 1.0 - Tiivis, muistikartoitettu jaevarasto)
+import json
+import logging
+import mmap
+import os
+import numpy as np
+
+from raamatunviitteet import Viite, hae_viitevali, jasenna_viitteet, rakenna_jaeindeksi
+
+# --- MÄÄRITYKSET ---
+RAAMATTU_TIEDOSTO = "D:/Python_AI/Raamattu-tutkija-data/bible.json"
+JAEVARASTO_HAKEMISTO = "D:/Python_AI/Raamattu-tutkija-data/jaevarasto"
+
+TEKSTI_TIEDOSTO = "jaeteksti.bin"
+SIIRTYMA_TIEDOSTO = "jaeteksti_siirtymat.npy"
+KIRJA_TIEDOSTO = "jae_kirja.npy"
+LUKU_TIEDOSTO = "jae_luku.npy"
+JAE_TIEDOSTO = "jae_jae.npy"
+KIRJAT_TIEDOSTO = "kirjat.json"
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] - %(message)s",
+    datefmt="%H:%M:%S",
+)
+
+
+def lue_raamattu_json(raamattu_tiedosto: str = RAAMATTU_TIEDOSTO):
+    """
+    Käy läpi bible.json-tiedoston ja tuottaa jokaisesta ei-tyhjästä jakeesta
+    (kirjan nimi, luku, jae, teksti). Järjestys on sama kuin vektori-indeksissä.
+    """
+    with open(raamattu_tiedosto, "r", encoding="utf-8") as f:
+        raamattu_data = json.load(f)
+
+    if "book" not in raamattu_data or not isinstance(raamattu_data["book"], dict):
+        raise ValueError(f"Tiedostosta '{raamattu_tiedosto}' ei löytynyt 'book'-objektia.")
+
+    for book_obj in raamattu_data["book"].values():
+        kirjan_nimi = book_obj.get("info", {}).get("name")
+        luvut_obj = book_obj.get("chapter")
+        if not kirjan_nimi or not isinstance(luvut_obj, dict):
+            continue
+        for luku_nro, luku_obj in luvut_obj.items():
+            jakeet_obj = luku_obj.get("verse")
+            if not isinstance(jakeet_obj, dict):
+                continue
+            for jae_nro, jae_obj in jakeet_obj.items():
+                teksti = jae_obj.get("text", "").strip()
+                if teksti:
+                    yield kirjan_nimi, int(luku_nro), int(jae_nro), teksti
+
+
+def muunna_jaevarastoksi(
+    raamattu_tiedosto: str = RAAMATTU_TIEDOSTO,
+    hakemisto: str = JAEVARASTO_HAKEMISTO,
+):
+    """
+    Muuntaa bible.json-tiedoston kertaalleen tiiviiseen muotoon: UTF-8-tekstimassa,
+    siirtymätaulukko sekä kirja-, luku- ja jaetaulukot, joiden rivi i vastaa
+    FAISS-indeksin tunnistetta i.
+    """
+    logging.info(f"Muunnetaan '{raamattu_tiedosto}' jaevarastoksi...")
+    os.makedirs(hakemisto, exist_ok=True)
+
+    kirjat = []
+    kirja_nrot = {}
+    siirtymat = [0]
+    kirja_sarake, luku_sarake, jae_sarake = [], [], []
+
+    with open(os.path.join(hakemisto, TEKSTI_TIEDOSTO), "wb") as teksti_f:
+        for kirjan_nimi, luku, jae, teksti in lue_raamattu_json(raamattu_tiedosto):
+            if kirjan_nimi not in kirja_nrot:
+                kirja_nrot[kirjan_nimi] = len(kirjat)
+                kirjat.append(kirjan_nimi)
+            tavut = teksti.encode("utf-8")
+            teksti_f.write(tavut)
+            siirtymat.append(siirtymat[-1] + len(tavut))
+            kirja_sarake.append(kirja_nrot[kirjan_nimi])
+            luku_sarake.append(luku)
+            jae_sarake.append(jae)
+
+    np.save(os.path.join(hakemisto, SIIRTYMA_TIEDOSTO), np.array(siirtymat, dtype=np.int64))
+    np.save(os.path.join(hakemisto, KIRJA_TIEDOSTO), np.array(kirja_sarake, dtype=np.int16))
+    np.save(os.path.join(hakemisto, LUKU_TIEDOSTO), np.array(luku_sarake, dtype=np.int16))
+    np.save(os.path.join(hakemisto, JAE_TIEDOSTO), np.array(jae_sarake, dtype=np.int16))
+    with open(os.path.join(hakemisto, KIRJAT_TIEDOSTO), "w", encoding="utf-8") as f:
+        json.dump(kirjat, f, ensure_ascii=False, indent=4)
+
+    logging.info(
+        f"Jaevarasto tallennettu hakemistoon '{hakemisto}': "
+        f"{len(jae_sarake)} jaetta, {len(kirjat)} kirjaa."
+    )
+
+
+def varaston_tiedostot(hakemisto: str = JAEVARASTO_HAKEMISTO) -> list[str]:
+    """Palauttaa jaevaraston tiedostopolut (esim. versiotunnistetta varten)."""
+    return [
+        os.path.join(hakemisto, nimi) for nimi in (
+            TEKSTI_TIEDOSTO, SIIRTYMA_TIEDOSTO, KIRJA_TIEDOSTO,
+            LUKU_TIEDOSTO, JAE_TIEDOSTO, KIRJAT_TIEDOSTO,
+        )
+    ]
+
+
+class Jaevarasto:
+    """
+    Muistikartoitettu jaevarasto. Jaetunniste i on sama kuin FAISS-indeksin
+    rivi, joten tunnisteesta saadaan viite ja teksti suoraan taulukoista.
+    """
+
+    def __init__(self, hakemisto: str = JAEVARASTO_HAKEMISTO):
+        self.hakemisto = hakemisto
+        self.siirtymat = np.load(os.path.join(hakemisto, SIIRTYMA_TIEDOSTO), mmap_mode="r")
+        self.kirja_nro = np.load(os.path.join(hakemisto, KIRJA_TIEDOSTO), mmap_mode="r")
+        self.luku_nro = np.load(os.path.join(hakemisto, LUKU_TIEDOSTO), mmap_mode="r")
+        self.jae_nro = np.load(os.path.join(hakemisto, JAE_TIEDOSTO), mmap_mode="r")
+        with open(os.path.join(hakemisto, KIRJAT_TIEDOSTO), "r", encoding="utf-8") as f:
+            self.kirjat = json.load(f)
+
+        self._teksti_f = open(os.path.join(hakemisto, TEKSTI_TIEDOSTO), "rb")
+        self._teksti = mmap.mmap(self._teksti_f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # Kirja -> luku -> jae -> jaetunniste viitehakuja varten.
+        self.jae_indeksi = rakenna_jaeindeksi(
+            (self.kirjat[k], int(l), int(j), i)
+            for i, (k, l, j) in enumerate(zip(
+                self.kirja_nro.tolist(), self.luku_nro.tolist(), self.jae_nro.tolist()
+            ))
+        )
+
+    def __len__(self) -> int:
+        return len(self.kirja_nro)
+
+    def teksti(self, jae_id: int) -> str:
+        """Palauttaa jaetunnistetta vastaavan tekstin."""
+        return self._teksti[self.siirtymat[jae_id]:self.siirtymat[jae_id + 1]].decode("utf-8")
+
+    def viite(self, jae_id: int) -> str:
+        """Palauttaa jaetunnistetta vastaavan viitteen muodossa 'Kirja luku:jae'."""
+        return (
+            f"{self.kirjat[self.kirja_nro[jae_id]]} "
+            f"{self.luku_nro[jae_id]}:{self.jae_nro[jae_id]}"
+        )
+
+    def jae(self, jae_id: int) -> dict:
+        """Palauttaa jakeen hakutulosten käyttämässä muodossa."""
+        return {"viite": self.viite(jae_id), "teksti": self.teksti(jae_id)}
+
+    def viitevalin_tunnisteet(self, viite: Viite) -> list[int]:
+        """Palauttaa jäsennetyn viitteen kattamat jaetunnisteet."""
+        return hae_viitevali(viite, self.jae_indeksi)
+
+    def teksti_viitteella(self, viite_str: str) -> str:
+        """Palauttaa viitemerkkijonon (myös välin, esim. 'Ef. 4:11-12') koko tekstin."""
+        return " ".join(
+            self.teksti(jae_id)
+            for viite in jasenna_viitteet(viite_str)
+            for jae_id in self.viitevalin_tunnisteet(viite)
+        )
+
+    def sulje(self):
+        """Vapauttaa muistikartoituksen."""
+        self._teksti.close()
+        self._teksti_f.close()
+
+
+if __name__ == "__main__":
+    muunna_jaevarastoksi()
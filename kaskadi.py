@@ -0,0 +1,228 @@
+# kaskadi.py (Versio 1.0 - Porrastettu uudelleenjärjestys varhaisella lopetuksella)
+import bisect
+import json
+import logging
+import time
+import numpy as np
+
+from syote import SYOTE_TIEDOSTO, jarjestetyt_osiot, lue_syote_tiedosto
+
+# --- MÄÄRITYKSET ---
+# Ehdokkaita pisteytetään kyselyä kohden tämän kokoisina paloina bi-enkooderin järjestyksessä.
+KASKADI_ERAKOKO = 16
+KALIBROINTI_LOKEROT = 20
+# Ylärajana käytetään lokeron pisteiden kvantiilia lisättynä turvamarginaalilla.
+KALIBROINTI_KVANTIILI = 0.99
+KALIBROINTI_MARGINAALI = 0.5
+KALIBROINTI_TOP_K = 15
+
+
+class Pisterajat:
+    """
+    Kalibroidut cross-encoder-pisteiden ylärajat bi-enkooderin etäisyyden
+    funktiona. ylaraja(d) arvioi suurimman pisteen, jonka mikään ehdokas
+    etäisyydellä ≥ d uskottavasti saa, joten sitä kauempana olevia
+    ehdokkaita ei tarvitse pisteyttää, kun top_k on jo tätä parempi.
+    """
+
+    def __init__(self, rajat: list[float], ylarajat: list[float], metriikka: str):
+        self.rajat = list(rajat)
+        self.ylarajat = list(ylarajat)
+        self.metriikka = metriikka
+
+    def ylaraja(self, etaisyys: float) -> float:
+        lokero = min(max(bisect.bisect_right(self.rajat, etaisyys) - 1, 0), len(self.ylarajat) - 1)
+        return self.ylarajat[lokero]
+
+    def tallenna(self, polku: str):
+        with open(polku, "w", encoding="utf-8") as f:
+            json.dump(
+                {"metriikka": self.metriikka, "rajat": self.rajat, "ylarajat": self.ylarajat},
+                f, ensure_ascii=False, indent=4,
+            )
+
+    @classmethod
+    def lataa(cls, polku: str, metriikka: str):
+        """Lataa kalibroinnin tai palauttaa None, jos sitä ei ole tai se ei sovi indeksiin."""
+        try:
+            with open(polku, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            logging.info("Kaskadin kalibrointia ei löytynyt, kaikki ehdokkaat pisteytetään.")
+            return None
+        if data.get("metriikka") != metriikka:
+            logging.warning(
+                f"Kaskadin kalibrointi on tehty metriikalle '{data.get('metriikka')}', "
+                f"indeksi käyttää metriikkaa '{metriikka}'. Kalibrointi ohitetaan."
+            )
+            return None
+        return cls(data["rajat"], data["ylarajat"], metriikka)
+
+
+def etaisyys(arvo: float, metriikka: str) -> float:
+    """Muuntaa FAISS-tuloksen etäisyydeksi, jossa pienempi on aina parempi."""
+    return -arvo if metriikka == "ip" else arvo
+
+
+def kalibroi(etaisyydet, pisteet, metriikka: str,
+             lokerot: int = KALIBROINTI_LOKEROT,
+             kvantiili: float = KALIBROINTI_KVANTIILI,
+             marginaali: float = KALIBROINTI_MARGINAALI) -> Pisterajat:
+    """
+    Laskee ylärajat täysistä uudelleenjärjestyksistä kerätyistä
+    (etäisyys, pisteet) -pareista. Lokerot jaetaan etäisyyden kvantiileittain,
+    ja ylärajat tehdään etäisyyden suhteen laskeviksi (loppuosan maksimi).
+    """
+    etaisyydet = np.asarray(etaisyydet, dtype=np.float64)
+    pisteet = np.asarray(pisteet, dtype=np.float64)
+    rajat = np.unique(np.quantile(etaisyydet, np.linspace(0, 1, lokerot + 1)[:-1]))
+    lokero = np.clip(np.searchsorted(rajat, etaisyydet, side="right") - 1, 0, len(rajat) - 1)
+
+    ylarajat = np.full(len(rajat), -np.inf)
+    for i in range(len(rajat)):
+        lokeron_pisteet = pisteet[lokero == i]
+        if len(lokeron_pisteet):
+            ylarajat[i] = np.quantile(lokeron_pisteet, kvantiili) + marginaali
+    ylarajat = np.maximum.accumulate(ylarajat[::-1])[::-1]
+    return Pisterajat(rajat.tolist(), ylarajat.tolist(), metriikka)
+
+
+def jarjesta_kaskadina(pisteyta, kyselyt: list[str], ehdokkaat: list[list[dict]],
+                       etaisyydet: list[list[float]], top_k: int,
+                       rajat: Pisterajat | None = None,
+                       erakoko: int = KASKADI_ERAKOKO,
+                       takaraja: float | None = None) -> tuple[list[list[dict]], set]:
+    """
+    Pisteyttää ehdokkaat bi-enkooderin järjestyksessä kierroksittain. Jokaisella
+    kierroksella kaikkien vielä aktiivisten kyselyiden seuraavat ehdokkaat
+    pisteytetään yhdellä pisteyta(parit, viitteet) -kutsulla. Kysely
+    lopetetaan, kun jäljellä olevien ehdokkaiden yläraja jää top_k:n
+    heikoimman pisteen alle. Takarajan (time.perf_counter) ylittyessä
+    palautetaan paras siihen mennessä saatu tulos.
+
+    Palauttaa (tulokset, keskeneräiset), missä keskeneräiset sisältää
+    takarajan vuoksi kesken jääneiden kyselyiden rivinumerot.
+    """
+    porrastettu = rajat is not None or takaraja is not None
+    kasitelty = [0] * len(kyselyt)
+    pisteet = [[] for _ in kyselyt]
+    aktiiviset = [rivi for rivi, e in enumerate(ehdokkaat) if e]
+    keskeneraiset = set()
+
+    while aktiiviset:
+        if takaraja is not None and time.perf_counter() >= takaraja:
+            keskeneraiset = set(aktiiviset)
+            logging.warning(
+                f"Uudelleenjärjestyksen aikaraja ylittyi, {len(aktiiviset)} "
+                "kyselyä palautetaan keskeneräisinä."
+            )
+            break
+
+        parit, viitteet, palat = [], [], []
+        for rivi in aktiiviset:
+            alku = kasitelty[rivi]
+            if not porrastettu:
+                loppu = len(ehdokkaat[rivi])
+            elif alku == 0:
+                # Ennen top_k:n täyttymistä mikään ehdokas ei voi pudota pois.
+                loppu = alku + max(top_k, erakoko)
+            else:
+                loppu = alku + erakoko
+            pala = ehdokkaat[rivi][alku:loppu]
+            parit.extend([kyselyt[rivi], j["teksti"]] for j in pala)
+            viitteet.extend(j["viite"] for j in pala)
+            palat.append((rivi, len(pala)))
+
+        kierroksen_pisteet = pisteyta(parit, viitteet)
+        alku = 0
+        for rivi, maara in palat:
+            pisteet[rivi].extend(kierroksen_pisteet[alku:alku + maara])
+            kasitelty[rivi] += maara
+            alku += maara
+
+        jatkuvat = []
+        for rivi in aktiiviset:
+            if kasitelty[rivi] >= len(ehdokkaat[rivi]):
+                continue
+            if rajat is not None and len(pisteet[rivi]) >= top_k:
+                kynnys = sorted(pisteet[rivi], reverse=True)[top_k - 1]
+                if rajat.ylaraja(etaisyydet[rivi][kasitelty[rivi]]) < kynnys:
+                    logging.info(
+                        f"Kaskadi lopetti kyselyn {rivi + 1} {kasitelty[rivi]}"
+                        f"/{len(ehdokkaat[rivi])} ehdokkaan jälkeen."
+                    )
+                    continue
+            jatkuvat.append(rivi)
+        aktiiviset = jatkuvat
+
+    tulokset = []
+    for rivi, rivin_ehdokkaat in enumerate(ehdokkaat):
+        pisteytetyt = rivin_ehdokkaat[:kasitelty[rivi]]
+        for jae, arvo in zip(pisteytetyt, pisteet[rivi]):
+            jae['pisteet'] = arvo
+        jarjestetyt = sorted(pisteytetyt, key=lambda x: x['pisteet'], reverse=True)[:top_k]
+        if len(jarjestetyt) < top_k and rivi in keskeneraiset:
+            # Pisteyttämättömät täydennetään bi-enkooderin järjestyksessä.
+            jarjestetyt += rivin_ehdokkaat[kasitelty[rivi]:][:top_k - len(jarjestetyt)]
+        tulokset.append(jarjestetyt)
+    return tulokset, keskeneraiset
+
+
+def lue_kalibrointikyselyt(tiedosto: str = SYOTE_TIEDOSTO) -> list[str]:
+    """Lukee syötetiedoston osioiden hakulauseet kalibrointikyselyiksi."""
+    hakulauseet, _ = lue_syote_tiedosto(tiedosto)
+    return [haku for _, haku in jarjestetyt_osiot(hakulauseet or {})]
+
+
+def kalibroi_hakukone(hakukone, kyselyt: list[str], top_k: int = KALIBROINTI_TOP_K):
+    """
+    Pisteyttää kyselyiden (oletuksena syote.txt:n osiot) kaikki ehdokkaat, laskee kalibroinnin ja tallentaa
+    sen hakukoneen asetusten polkuun. Raportoi, kuinka suuren osan pareista
+    kaskadi olisi pisteyttänyt ja kuinka hyvin sen top_k vastaa täyttä järjestystä.
+    """
+    hakukone.lataa()
+    _, ehdokkaat, etaisyydet = hakukone.hae_ehdokkaat(kyselyt, top_k)
+    # Pisteytetään samoilla rajatuilla kyselyillä kuin varsinaisessa haussa.
+    kyselyt = [hakukone.rajaa_kysely(k) for k in kyselyt]
+    parit = [[k, j["teksti"]] for k, e in zip(kyselyt, ehdokkaat) for j in e]
+    viitteet = [j["viite"] for e in ehdokkaat for j in e]
+    kaikki_pisteet = hakukone.pisteyta_parit(parit, viitteet)
+
+    metriikka = hakukone.paaindeksi.tiedot["metriikka"]
+    rajat = kalibroi([d for rivi in etaisyydet for d in rivi], kaikki_pisteet, metriikka)
+    rajat.tallenna(hakukone.asetukset.kaskadi_kalibrointi_tiedosto)
+    logging.info(
+        f"Kaskadin kalibrointi tallennettu ({len(parit)} paria, "
+        f"{len(rajat.rajat)} lokeroa): '{hakukone.asetukset.kaskadi_kalibrointi_tiedosto}'"
+    )
+
+    # Simuloidaan kaskadi valmiiksi lasketuilla pisteillä.
+    valmiit = dict(zip(((k, v) for (k, _), v in zip(parit, viitteet)), kaikki_pisteet))
+    pisteytetyt = 0
+
+    def pisteyta(era_parit, era_viitteet):
+        nonlocal pisteytetyt
+        pisteytetyt += len(era_parit)
+        return [valmiit[(k, v)] for (k, _), v in zip(era_parit, era_viitteet)]
+
+    taydet, _ = jarjesta_kaskadina(pisteyta, kyselyt, ehdokkaat, etaisyydet, top_k)
+    taydet = [[j["viite"] for j in rivi] for rivi in taydet]
+    pisteytetyt = 0
+    kaskadi, _ = jarjesta_kaskadina(pisteyta, kyselyt, ehdokkaat, etaisyydet, top_k, rajat)
+    osumat = sum(
+        len(set(t) & {j["viite"] for j in k}) for t, k in zip(taydet, kaskadi)
+    )
+    yhteensa = sum(len(t) for t in taydet)
+    logging.info(
+        f"Kaskadi pisteyttäisi {pisteytetyt}/{len(parit)} paria "
+        f"({pisteytetyt / max(len(parit), 1):.0%}); "
+        f"top-{top_k}-osuvuus täyteen järjestykseen {osumat / max(yhteensa, 1):.3f}."
+    )
+    return rajat
+
+
+if __name__ == "__main__":
+    from hakukone import Hakukone
+
+    with Hakukone() as hakukone:
+        kalibroi_hakukone(hakukone, lue_kalibrointikyselyt())
@@ -0,0 +1,144 @@
+# kvantisointi.py (Versio 1.0 - Dynaaminen int8-kvantisointi CPU-päättelyyn)
+import argparse
+import json
+import logging
+import numpy as np
+
+from mittarit import jarjestyskorrelaatio, mittaa_paras
+from syote import SYOTE_TIEDOSTO, jarjestetyt_osiot, lue_syote_tiedosto
+
+# --- MÄÄRITYKSET ---
+VERTAILU_RAPORTTI = "kvantisointivertailu.json"
+VERTAILU_TOP_K = 15
+# Mallinimen pääte, jolla kvantisoidun mallin pisteet erotetaan välimuisteissa.
+INT8_TUNNISTE = "@int8"
+
+
+def kvantisoi_dynaamisesti(moduuli):
+    """
+    Korvaa moduulin Linear-kerrokset dynaamisesti kvantisoiduilla
+    int8-kerroksilla. Painot kvantisoidaan kerran, aktivoinnit ajon aikana;
+    toimii vain CPU:lla, mikä vastaa tuotantoympäristöä.
+    """
+    import torch
+    return torch.ao.quantization.quantize_dynamic(
+        moduuli, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+    )
+
+
+def kvantisoi_embedding_malli(model):
+    """Kvantisoi SentenceTransformer-mallin (nn.Sequential) paikallaan."""
+    kvantisoi_dynaamisesti(model)
+    logging.info("Upotusmalli kvantisoitu (dynaaminen int8).")
+    return model
+
+
+def kvantisoi_cross_encoder(cross_encoder):
+    """Kvantisoi CrossEncoderin sisäisen transformer-mallin paikallaan."""
+    cross_encoder.model = kvantisoi_dynaamisesti(cross_encoder.model)
+    logging.info("Cross-encoder kvantisoitu (dynaaminen int8).")
+    return cross_encoder
+
+
+def vertaa_kvantisointia(hakukone, kyselyt: list[str], top_k: int = VERTAILU_TOP_K) -> dict:
+    """
+    Mittaa float32-mallit, kvantisoi ne paikallaan ja mittaa uudelleen samoilla
+    kyselyillä ja ehdokaspareilla. Raportoi nopeutuksen sekä poikkeaman:
+    kyselyvektorien kosinisamankaltaisuuden, cross-encoder-pisteiden
+    järjestyskorrelaation ja lopullisten top_k-tulosten päällekkäisyyden.
+    Hakukoneen välimuistien tulee olla pois käytöstä.
+    """
+    from strategiat import Strategiakerros
+
+    hakukone.lataa()
+    erakoko = hakukone.asetukset.enkoodaus_erakoko
+    _, ehdokkaat, _ = hakukone.hae_ehdokkaat(kyselyt, top_k)
+    parit = [
+        [hakukone.rajaa_kysely(k), j["teksti"]] for k, e in zip(kyselyt, ehdokkaat) for j in e
+    ]
+
+    def enkoodaa():
+        return hakukone.model.encode(kyselyt, batch_size=erakoko, show_progress_bar=False)
+
+    def pisteyta():
+        return np.asarray(hakukone.cross_encoder.predict(
+            parit, batch_size=hakukone.asetukset.rerank_erakoko, show_progress_bar=False
+        ))
+
+    def viitteet(tulokset):
+        return [{j["viite"] for j in rivi} for rivi in tulokset]
+
+    vektorit_fp32, enkoodaus_fp32 = mittaa_paras(enkoodaa)
+    pisteet_fp32, rerank_fp32 = mittaa_paras(pisteyta)
+    tulokset_fp32 = viitteet(hakukone.etsi_batch(kyselyt, top_k))
+
+    kvantisoi_embedding_malli(hakukone.model)
+    kvantisoi_cross_encoder(hakukone.cross_encoder)
+    # Strategiavektorit lasketaan uudelleen kvantisoidulla mallilla kuten tuotannossa.
+    hakukone.strategiat = Strategiakerros(
+        hakukone.model, hakukone.jaevarasto, erakoko,
+        hakukone.strategiat.siemenhaku, hakukone.asetukset.automaattiset_siemenet,
+        hakukone.strategiat.normalisoija,
+    )
+    hakukone.strategiat.laske_ehdokaspoolit(
+        hakukone.paaindeksi, hakukone.asetukset.strategia_pooli
+    )
+
+    vektorit_int8, enkoodaus_int8 = mittaa_paras(enkoodaa)
+    pisteet_int8, rerank_int8 = mittaa_paras(pisteyta)
+    tulokset_int8 = viitteet(hakukone.etsi_batch(kyselyt, top_k))
+
+    kosinit = np.sum(vektorit_fp32 * vektorit_int8, axis=1) / (
+        np.linalg.norm(vektorit_fp32, axis=1) * np.linalg.norm(vektorit_int8, axis=1)
+    )
+    paallekkaisyys = [
+        len(a & b) / max(len(a), 1) for a, b in zip(tulokset_fp32, tulokset_int8)
+    ]
+    raportti = {
+        "kyselyt": len(kyselyt),
+        "parit": len(parit),
+        "top_k": top_k,
+        "upotus": {
+            "fp32_ms": enkoodaus_fp32, "int8_ms": enkoodaus_int8,
+            "nopeutus": enkoodaus_fp32 / enkoodaus_int8,
+            "kosini_ka": float(kosinit.mean()), "kosini_min": float(kosinit.min()),
+        },
+        "rerank": {
+            "fp32_ms": rerank_fp32, "int8_ms": rerank_int8,
+            "nopeutus": rerank_fp32 / rerank_int8,
+            "jarjestyskorrelaatio": jarjestyskorrelaatio(pisteet_fp32, pisteet_int8),
+            "pisteiden_ero_ka": float(np.abs(pisteet_fp32 - pisteet_int8).mean()),
+        },
+        f"top{top_k}_paallekkaisyys_ka": float(np.mean(paallekkaisyys)),
+        f"top{top_k}_paallekkaisyys_min": float(np.min(paallekkaisyys)),
+    }
+    logging.info(
+        f"Upotus: {enkoodaus_fp32:.1f} -> {enkoodaus_int8:.1f} ms "
+        f"(x{raportti['upotus']['nopeutus']:.2f}), kosini ka {kosinit.mean():.4f}. "
+        f"Rerank: {rerank_fp32:.1f} -> {rerank_int8:.1f} ms "
+        f"(x{raportti['rerank']['nopeutus']:.2f}), järjestyskorrelaatio "
+        f"{raportti['rerank']['jarjestyskorrelaatio']:.4f}. "
+        f"Top-{top_k}-päällekkäisyys ka {np.mean(paallekkaisyys):.3f}."
+    )
+    return raportti
+
+
+if __name__ == "__main__":
+    from hakukone import Hakuasetukset, Hakukone
+
+    parser = argparse.ArgumentParser(
+        description="Vertaa int8-kvantisoituja malleja float32-malleihin syote.txt:n osioilla."
+    )
+    parser.add_argument("--top-k", type=int, default=VERTAILU_TOP_K)
+    parser.add_argument("--syote", default=SYOTE_TIEDOSTO)
+    parser.add_argument("--raportti", default=VERTAILU_RAPORTTI)
+    args = parser.parse_args()
+
+    hakulauseet, _ = lue_syote_tiedosto(args.syote)
+    kyselyt = [haku for _, haku in jarjestetyt_osiot(hakulauseet or {})]
+    asetukset = Hakuasetukset.ymparistosta(kayta_valimuisteja=False)
+    with Hakukone(asetukset) as hakukone:
+        raportti = vertaa_kvantisointia(hakukone, kyselyt, args.top_k)
+    with open(args.raportti, "w", encoding="utf-8") as f:
+        json.dump(raportti, f, ensure_ascii=False, indent=4)
+    logging.info(f"Vertailuraportti tallennettu: '{args.raportti}'")
@@ -1,12 +1,16 @@
 # luo_siemenjae_indeksi.py
 import json
 import logging
-import faiss
+import os
 import numpy as np
 from sentence_transformers import SentenceTransformer
 
+from jaevarasto import Jaevarasto, muunna_jaevarastoksi
+from vektori_indeksi import rakenna_indeksi, tallenna_indeksi
+
 # --- MÄÄRITYKSET ---
 RAAMATTU_TIEDOSTO = "D:/Python_AI/Raamattu-tutkija-data/bible.json"
+JAEVARASTO_HAKEMISTO = "D:/Python_AI/Raamattu-tutkija-data/jaevarasto"
 SIEMENJAE_INDEKSI_TIEDOSTO = "D:/Python_AI/Raamattu-tutkija-data/siemenjae_indeksi.faiss"
 SIEMENJAE_KARTTA_TIEDOSTO = "D:/Python_AI/Raamattu-tutkija-data/siemenjae_kartta.json"
 EMBEDDING_MALLI = "TurkuNLP/sbert-cased-finnish-paraphrase"
@@ -67,43 +71,31 @@ def luo_siemenjae_indeksi():
     """
     Lukee Raamatusta vain ennalta määritellyt superjakeet,
     luo niistä vektoriupotukset ja tallentaa ne omaan FAISS-indeksiin.
+    Kartta tallentaa rivin viitteen alkuperäisessä muodossaan (esim. 'Ef. 4:11-12').
     """
     logging.info("Aloitetaan siemenjae-vektoritietokannan luonti...")
 
     try:
-        with open(RAAMATTU_TIEDOSTO, "r", encoding="utf-8") as f:
-            raamattu_data = json.load(f)
+        if not os.path.isdir(JAEVARASTO_HAKEMISTO):
+            muunna_jaevarastoksi(RAAMATTU_TIEDOSTO, JAEVARASTO_HAKEMISTO)
+        jaevarasto = Jaevarasto(JAEVARASTO_HAKEMISTO)
     except Exception as e:
-        logging.error(f"Raamatun datatiedostoa '{RAAMATTU_TIEDOSTO}' ei voitu lukea: {e}")
+        logging.error(f"Jaevarastoa ei voitu luoda tai lukea: {e}")
         return
 
     model = SentenceTransformer(EMBEDDING_MALLI)
 
-    # Muunnetaan lista setiksi nopeaa hakua varten
-    superjakeet_set = set(SUPERJAKEET)
     valitut_jakeet = []
 
-    logging.info("Jäsennellään Raamattua ja poimitaan superjakeet...")
-    for book_obj in raamattu_data.get("book", {}).values():
-        kirjan_nimi = book_obj.get("info", {}).get("name")
-        luvut_obj = book_obj.get("chapter")
-
-        if not kirjan_nimi or not isinstance(luvut_obj, dict):
-            continue
-
-        for luku_nro, luku_obj in luvut_obj.items():
-            jakeet_obj = luku_obj.get("verse")
-
-            if not isinstance(jakeet_obj, dict):
-                continue
-
-            for jae_nro, jae_obj in jakeet_obj.items():
-                teksti = jae_obj.get("text", "").strip()
-                viite = f"{kirjan_nimi} {luku_nro}:{jae_nro}"
-                
-                # Tarkistetaan, onko jae haluttujen superjakeiden listalla
-                if teksti and viite in superjakeet_set:
-                    valitut_jakeet.append({"viite": viite, "teksti": teksti})
+    logging.info("Haetaan superjakeiden tekstit jaevarastosta...")
+    # Jokaisesta superjakeesta (myös välit, esim. 'Ef. 4:11-12') tulee yksi
+    # indeksin rivi, jonka tekstinä on välin kaikki jakeet.
+    for viite in dict.fromkeys(SUPERJAKEET):
+        teksti = jaevarasto.teksti_viitteella(viite)
+        if teksti:
+            valitut_jakeet.append({"viite": viite, "teksti": teksti})
+        else:
+            logging.warning(f"Superjaetta '{viite}' ei löytynyt jaevarastosta.")
 
     logging.info(f"Jäsennys valmis. Löydettiin {len(valitut_jakeet)}/{len(SUPERJAKEET)} superjaetta.")
 
@@ -123,11 +115,9 @@ def luo_siemenjae_indeksi():
         logging.error("Vektorien luonti epäonnistui. Indeksiä ei luoda.")
         return
 
-    vektorin_ulottuvuus = vektorit.shape[1]
-    indeksi = faiss.IndexFlatL2(vektorin_ulottuvuus)
-    indeksi.add(np.array(vektorit, dtype=np.float32))
-
-    faiss.write_index(indeksi, SIEMENJAE_INDEKSI_TIEDOSTO)
+    indeksi, tiedot = rakenna_indeksi(np.asarray(vektorit, dtype=np.float32), "flat")
+    tiedot["malli"] = EMBEDDING_MALLI
+    tallenna_indeksi(indeksi, tiedot, SIEMENJAE_INDEKSI_TIEDOSTO)
     logging.info(f"Uusi siemenjae-indeksi tallennettu: '{SIEMENJAE_INDEKSI_TIEDOSTO}'")
 
     viite_kartta = {str(i): viite for i, viite in enumerate(viitteet_karttaan)}
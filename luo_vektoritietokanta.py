@@ -1,15 +1,37 @@
 # luo_vektoritietokanta.py (Versio 3.4 - Oikea JSON-rakenne)
+import argparse
 import json
 import logging
-import faiss
+import os
 import numpy as np
 from sentence_transformers import SentenceTransformer
 
+from hierarkia import luvun_rajat, rakenna_hierarkia
+from jaevarasto import Jaevarasto, muunna_jaevarastoksi
+from naapurit import rakenna_naapurit
+from sanaindeksi import rakenna_sanaindeksi
+from vektorointi import vektoroi_osissa
+from vektori_indeksi import (
+    INDEKSITYYPIT, KOODAUKSET, METRIIKAT, indeksin_koko,
+    rakenna_indeksi, tallenna_indeksi, vertaile_indekseja
+)
+
 # --- MÄÄRITYKSET ---
 RAAMATTU_TIEDOSTO = "D:/Python_AI/Raamattu-tutkija-data/bible.json"
 VEKTORI_INDEKSI_TIEDOSTO = "D:/Python_AI/Raamattu-tutkija-data/raamattu_vektori_indeksi.faiss"
-VIITE_KARTTA_TIEDOSTO = "D:/Python_AI/Raamattu-tutkija-data/raamattu_viite_kartta.json"
+VEKTORIT_TIEDOSTO = "D:/Python_AI/Raamattu-tutkija-data/raamattu_vektorit.npy"
+UPOTUSVALIMUISTI_HAKEMISTO = "D:/Python_AI/Raamattu-tutkija-data/upotusvalimuisti"
+VERTAILU_TIEDOSTO = "D:/Python_AI/Raamattu-tutkija-data/indeksivertailu.json"
+JAEVARASTO_HAKEMISTO = "D:/Python_AI/Raamattu-tutkija-data/jaevarasto"
+SANAINDEKSI_HAKEMISTO = "D:/Python_AI/Raamattu-tutkija-data/sanaindeksi"
+HIERARKIA_HAKEMISTO = "D:/Python_AI/Raamattu-tutkija-data/hierarkia"
+NAAPURIT_HAKEMISTO = "D:/Python_AI/Raamattu-tutkija-data/naapurit"
 EMBEDDING_MALLI = "TurkuNLP/sbert-cased-finnish-paraphrase"
+SYOTE_TIEDOSTO = "syote.txt"
+IKKUNAN_SADE = 1
+VEKTOROINTI_OSAKOKO = 4096
+VERTAILU_KYSELYT = 200
+VERTAILU_K = 10
 
 logging.basicConfig(
     level=logging.INFO,
@@ -17,93 +39,141 @@ logging.basicConfig(
     datefmt="%H:%M:%S",
 )
 
-def luo_vektoritietokanta():
+def luo_vektoritietokanta(tyyppi: str = "flat", metriikka: str = "l2",
+                          koodaus: str = "float32", vertailu: bool = False,
+                          prosessit: int = 1, ikkunan_sade: int = IKKUNAN_SADE):
     """
-    Lukee Raamatun, luo kontekstuaalisia 3 jakeen kokonaisuuksia,
-    luo niistä vektoriupotukset ja tallentaa ne FAISS-indeksiin.
+    Lukee Raamatun, luo kontekstuaalisia jakeiden kokonaisuuksia (oletuksena
+    3 jakeen ikkuna, joka ei ylitä luvun rajaa), luo niistä vektoriupotukset ja tallentaa ne valitun
+    tyyppiseen FAISS-indeksiin. Vektorointi etenee osissa ja jokainen osa
+    tallennetaan upotusvälimuistiin, joten keskeytynyt ajo jatkuu ja
+    muuttuneesta korpuksesta vektoroidaan vain muuttuneet ikkunat.
+    Vektorit tallennetaan myös erikseen, jotta indeksin voi rakentaa
+    uudelleen toisen tyyppisenä ilman uutta vektorointia.
     """
     logging.info("Aloitetaan vektoritietokannan (v3.4 - Oikea JSON-rakenne) luonti...")
 
+    # Jaevarasto määrää jakeiden järjestyksen, joten FAISS-tunniste i on
+    # aina varaston jae i. Varasto luodaan bible.json-tiedostosta tarvittaessa.
     try:
-        with open(RAAMATTU_TIEDOSTO, "r", encoding="utf-8") as f:
-            raamattu_data = json.load(f)
+        if not os.path.isdir(JAEVARASTO_HAKEMISTO):
+            muunna_jaevarastoksi(RAAMATTU_TIEDOSTO, JAEVARASTO_HAKEMISTO)
+        jaevarasto = Jaevarasto(JAEVARASTO_HAKEMISTO)
     except Exception as e:
-        logging.error(f"Raamatun datatiedostoa '{RAAMATTU_TIEDOSTO}' ei voitu lukea: {e}")
+        logging.error(f"Jaevarastoa ei voitu luoda tai lukea: {e}")
         return
 
     model = SentenceTransformer(EMBEDDING_MALLI)
-    
-    # --- TÄYSIN UUSITTU JÄSENNYSLOGIIKKA, JOKA VASTAA bible.json RAKENNETTA ---
-    kaikki_jakeet = []
-    logging.info("Jäsennellään Raamattua ja kerätään kaikki jakeet...")
-    
-    if "book" not in raamattu_data or not isinstance(raamattu_data["book"], dict):
-        logging.error(f"Tiedostosta '{RAAMATTU_TIEDOSTO}' ei löytynyt 'book'-objektia.")
-        return
 
-    # Käydään läpi kirja-objektin arvot (1, 2, 3...)
-    for book_obj in raamattu_data["book"].values():
-        kirjan_nimi = book_obj.get("info", {}).get("name")
-        luvut_obj = book_obj.get("chapter")
-
-        if not kirjan_nimi or not isinstance(luvut_obj, dict):
-            continue
-
-        # Käydään läpi luku-objektin arvot (1, 2, 3...)
-        for luku_nro, luku_obj in luvut_obj.items():
-            jakeet_obj = luku_obj.get("verse")
-            
-            if not isinstance(jakeet_obj, dict):
-                continue
-            
-            # Käydään läpi jae-objektin arvot (1, 2, 3...)
-            for jae_nro, jae_obj in jakeet_obj.items():
-                teksti = jae_obj.get("text", "").strip()
-                if teksti:
-                    viite = f"{kirjan_nimi} {luku_nro}:{jae_nro}"
-                    kaikki_jakeet.append({"viite": viite, "teksti": teksti})
-
-    logging.info(f"Jäsennys valmis. Löydettiin yhteensä {len(kaikki_jakeet)} jaetta.")
+    kaikki_jakeet = [jaevarasto.jae(i) for i in range(len(jaevarasto))]
+    logging.info(f"Jaevarasto luettu. Löydettiin yhteensä {len(kaikki_jakeet)} jaetta.")
 
     if not kaikki_jakeet:
         logging.error("Jakeiden kerääminen epäonnistui. Vektorikantaa ei luoda.")
         return
         
     konteksti_tekstit = []
-    konteksti_viitteet = []
-    logging.info("Luodaan kontekstuaalisia jakeiden kokonaisuuksia (3 jakeen ikkuna)...")
+    logging.info(
+        f"Luodaan kontekstuaalisia jakeiden kokonaisuuksia "
+        f"({2 * ikkunan_sade + 1} jakeen ikkuna)..."
+    )
 
-    for i, jae in enumerate(kaikki_jakeet):
-        edellinen_teksti = kaikki_jakeet[i-1]["teksti"] if i > 0 else ""
-        nykyinen_teksti = jae["teksti"]
-        seuraava_teksti = kaikki_jakeet[i+1]["teksti"] if i < len(kaikki_jakeet) - 1 else ""
-        
-        koko_teksti = f"{edellinen_teksti} {nykyinen_teksti} {seuraava_teksti}".strip()
-        
-        konteksti_tekstit.append(koko_teksti)
-        konteksti_viitteet.append(jae["viite"])
+    # Ikkuna rajataan jakeen omaan lukuun, jotta edellisen luvun tai
+    # kirjan teksti ei valu seuraavan alkuun.
+    luku_alut = luvun_rajat(jaevarasto)
+    for alku, loppu in zip(luku_alut[:-1].tolist(), luku_alut[1:].tolist()):
+        for i in range(alku, loppu):
+            ikkuna = kaikki_jakeet[max(alku, i - ikkunan_sade):min(loppu, i + ikkunan_sade + 1)]
+            koko_teksti = " ".join(jae["teksti"] for jae in ikkuna).strip()
+
+            konteksti_tekstit.append(koko_teksti)
 
     logging.info(f"Kerätty {len(konteksti_tekstit)} kontekstuaalista kokonaisuutta. Muunnetaan vektoreiksi...")
     
-    vektorit = model.encode(konteksti_tekstit, show_progress_bar=True)
+    vektorit = vektoroi_osissa(
+        model, EMBEDDING_MALLI, konteksti_tekstit, UPOTUSVALIMUISTI_HAKEMISTO,
+        osakoko=VEKTOROINTI_OSAKOKO, prosessit=prosessit,
+    )
     
     if vektorit.ndim < 2 or vektorit.shape[0] == 0:
         logging.error("Vektorien luonti epäonnistui. Indeksiä ei luoda.")
         return
 
-    vektorin_ulottuvuus = vektorit.shape[1]
-    indeksi = faiss.IndexFlatL2(vektorin_ulottuvuus)
-    indeksi.add(np.array(vektorit, dtype=np.float32))
+    vektorit = np.array(vektorit, dtype=np.float32)
+    np.save(VEKTORIT_TIEDOSTO, vektorit)
+    logging.info(f"Vektorit tallennettu: '{VEKTORIT_TIEDOSTO}'")
+
+    logging.info(f"Rakennetaan {tyyppi}-indeksi ({metriikka}, {koodaus})...")
+    indeksi, tiedot = rakenna_indeksi(vektorit, tyyppi, metriikka, koodaus)
+    tiedot["malli"] = EMBEDDING_MALLI
+    tallenna_indeksi(indeksi, tiedot, VEKTORI_INDEKSI_TIEDOSTO)
+    logging.info(
+        f"Uusi indeksi tallennettu: '{VEKTORI_INDEKSI_TIEDOSTO}' "
+        f"({indeksin_koko(indeksi) / 2**20:.1f} MT, "
+        f"float32-vektorit {vektorit.nbytes / 2**20:.1f} MT)"
+    )
+
+    # BM25-sanaindeksi samoilla jaetunnisteilla hybridihakua varten.
+    rakenna_sanaindeksi(jaevarasto, SANAINDEKSI_HAKEMISTO)
+    # Luku- ja perikooppitason indeksit karkeasta tarkkaan -hakua varten.
+    rakenna_hierarkia(vektorit, jaevarasto, HIERARKIA_HAKEMISTO, metriikka)
+    # Jakeiden naapurit "liittyvät jakeet" -hakua varten samoista vektoreista.
+    rakenna_naapurit(vektorit, jaevarasto, NAAPURIT_HAKEMISTO, ikkunan_sade=ikkunan_sade)
+
+    if vertailu:
+        suorita_vertailu(model, jaevarasto, vektorit, metriikka)
 
-    faiss.write_index(indeksi, VEKTORI_INDEKSI_TIEDOSTO)
-    logging.info(f"Uusi indeksi tallennettu: '{VEKTORI_INDEKSI_TIEDOSTO}'")
-
-    viite_kartta = {str(i): viite for i, viite in enumerate(konteksti_viitteet)}
-    with open(VIITE_KARTTA_TIEDOSTO, "w", encoding="utf-8") as f:
-        json.dump(viite_kartta, f, ensure_ascii=False, indent=4)
-    logging.info(f"Uusi viitekartta tallennettu: '{VIITE_KARTTA_TIEDOSTO}'")
-    
     logging.info("Vektorikannan luonti onnistui!")
 
+
+def vertailukyselyt(model, jaevarasto) -> np.ndarray:
+    """
+    Muodostaa indeksistä erillisen kyselyjoukon: satunnaisia yksittäisiä
+    jakeita (indeksissä on 3 jakeen ikkunat) sekä syote.txt-tiedoston rivit.
+    """
+    satunnainen = np.random.default_rng(42)
+    tunnisteet = satunnainen.choice(
+        len(jaevarasto), size=min(VERTAILU_KYSELYT, len(jaevarasto)), replace=False
+    )
+    tekstit = [jaevarasto.teksti(int(i)) for i in tunnisteet]
+    if os.path.exists(SYOTE_TIEDOSTO):
+        with open(SYOTE_TIEDOSTO, "r", encoding="utf-8") as f:
+            tekstit.extend(rivi.strip() for rivi in f if rivi.strip())
+    return np.array(model.encode(tekstit, show_progress_bar=False), dtype=np.float32)
+
+
+def suorita_vertailu(model, jaevarasto, vektorit: np.ndarray, metriikka: str):
+    """Vertailee kaikkia indeksityyppejä ja tallentaa tulokset JSON-tiedostoon."""
+    logging.info("Vertaillaan indeksityyppejä (recall@k tarkkaa indeksiä vastaan)...")
+    kyselyt = vertailukyselyt(model, jaevarasto)
+    tulokset = vertaile_indekseja(vektorit, kyselyt, metriikka=metriikka, k=VERTAILU_K)
+    with open(VERTAILU_TIEDOSTO, "w", encoding="utf-8") as f:
+        json.dump(tulokset, f, ensure_ascii=False, indent=4)
+    logging.info(f"Vertailun tulokset tallennettu: '{VERTAILU_TIEDOSTO}'")
+
+
 if __name__ == "__main__":
-    luo_vektoritietokanta()
\ No newline at end of file
+    jasennin = argparse.ArgumentParser(description="Rakentaa Raamatun vektori-indeksin.")
+    jasennin.add_argument("--tyyppi", choices=INDEKSITYYPIT, default="flat")
+    jasennin.add_argument("--metriikka", choices=METRIIKAT, default="l2")
+    jasennin.add_argument(
+        "--koodaus", choices=KOODAUKSET, default="float32",
+        help="Vektorien tallennusmuoto: fp16 puolittaa ja sq8 neljännestää indeksin koon."
+    )
+    jasennin.add_argument(
+        "--vertailu", action="store_true",
+        help="Vertaa indeksityyppejä ja koodauksia tarkkaan indeksiin (recall@k, viive, koko)."
+    )
+    jasennin.add_argument(
+        "--prosessit", type=int, default=os.cpu_count() or 1,
+        help="Vektorointiprosessien määrä (oletus: kaikki ytimet)."
+    )
+    jasennin.add_argument(
+        "--ikkuna", type=int, default=IKKUNAN_SADE,
+        help="Kontekstin säde jakeina kummallakin puolella (1 = 3 jakeen ikkuna)."
+    )
+    argumentit = jasennin.parse_args()
+    luo_vektoritietokanta(
+        argumentit.tyyppi, argumentit.metriikka, argumentit.koodaus,
+        argumentit.vertailu, argumentit.prosessit, argumentit.ikkuna,
+    )
\ No newline at end of file
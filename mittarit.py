@@ -0,0 +1,188 @@
+# mittarit.py (Versio 1.0 - Hakuvaiheiden jäljitys, mittarit ja profilointi)
+import argparse
+import cProfile
+import io
+import json
+import logging
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+
+# --- MÄÄRITYKSET ---
+# Hakuputken vaiheet siinä järjestyksessä, jossa ne suoritetaan.
+VAIHEET = (
+    "viitteet", "strategia", "enkoodaus", "faiss", "sanahaku",
+    "kokoaminen", "pistevarasto", "cross_encoder", "uudelleenjarjestys",
+)
+PROFIILI_TIEDOSTO = "haku.prof"
+PROFIILI_RIVIT = 25
+# Vertailumittausten toistot; tuloksena käytetään nopeinta ajoa.
+MITTAUS_TOISTOT = 3
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] - %(message)s",
+    datefmt="%H:%M:%S",
+)
+
+
+class Jalki:
+    """Yhden haun jäljitys: kokonaiskesto, yleistiedot ja vaiheiden ajat."""
+
+    def __init__(self, **tiedot):
+        self.aika = datetime.now().isoformat(timespec="milliseconds")
+        self.tiedot = tiedot
+        self.vaiheet = []
+        self.kesto_ms = None
+
+    def vaiheiden_ajat(self) -> dict:
+        """Summaa saman nimiset vaiheet (esim. kaskadin kierrokset) yhteen."""
+        ajat = {}
+        for vaihe in self.vaiheet:
+            ajat[vaihe["vaihe"]] = ajat.get(vaihe["vaihe"], 0.0) + vaihe["ms"]
+        return ajat
+
+    def sanakirjana(self) -> dict:
+        return {
+            "aika": self.aika, "kesto_ms": self.kesto_ms,
+            "tiedot": self.tiedot, "vaiheet": self.vaiheet,
+        }
+
+
+class Mittarit:
+    """
+    Hakukoneen instrumentointi. jaljita() avaa haulle jäljen, ja vaihe()
+    kirjaa sen sisällä vaiheen keston sekä vaiheen palauttamaan sanakirjaan
+    lisätyt määrät (ehdokkaat, parit, eräkoot). Valmis jälki kirjoitetaan
+    JSON-rivinä mittaritiedostoon ja annetaan kuuntelijoille. Jäljet ovat
+    säiekohtaisia, joten rinnakkaiset haut eivät sekoitu.
+    """
+
+    def __init__(self, tiedosto: str | None = None):
+        self.tiedosto = tiedosto
+        self.kuuntelijat = []
+        self._paikallinen = threading.local()
+        self._kirjoituslukko = threading.Lock()
+
+    def lisaa_kuuntelija(self, kuuntelija):
+        """Rekisteröi funktion, jota kutsutaan jokaisella valmiilla Jalki-oliolla."""
+        self.kuuntelijat.append(kuuntelija)
+
+    def poista_kuuntelija(self, kuuntelija):
+        self.kuuntelijat.remove(kuuntelija)
+
+    @property
+    def kaytossa(self) -> bool:
+        return self.tiedosto is not None or bool(self.kuuntelijat)
+
+    @contextmanager
+    def jaljita(self, **tiedot):
+        """
+        Jäljittää haun. Sisäkkäinen kutsu (esim. etsi -> etsi_batch) liittyy
+        ulompaan jälkeen, ja ilman tiedostoa tai kuuntelijoita jäljitys ohitetaan.
+        """
+        ulompi = getattr(self._paikallinen, "jalki", None)
+        if ulompi is not None or not self.kaytossa:
+            yield ulompi
+            return
+        jalki = Jalki(**tiedot)
+        self._paikallinen.jalki = jalki
+        alku = time.perf_counter()
+        try:
+            yield jalki
+        finally:
+            jalki.kesto_ms = (time.perf_counter() - alku) * 1000
+            self._paikallinen.jalki = None
+            self._julkaise(jalki)
+
+    @contextmanager
+    def vaihe(self, nimi: str, **tiedot):
+        """Kirjaa vaiheen keston aktiiviseen jälkeen; tietoja voi täydentää lohkossa."""
+        jalki = getattr(self._paikallinen, "jalki", None)
+        if jalki is None:
+            yield tiedot
+            return
+        alku = time.perf_counter()
+        try:
+            yield tiedot
+        finally:
+            jalki.vaiheet.append(
+                {"vaihe": nimi, "ms": (time.perf_counter() - alku) * 1000, **tiedot}
+            )
+
+    def _julkaise(self, jalki: Jalki):
+        ajat = ", ".join(
+            f"{v} {ms:.1f}" for v, ms in jalki.vaiheiden_ajat().items()
+        ) or "vain välimuisti"
+        logging.info(f"Haun vaiheet (ms): {ajat}; yhteensä {jalki.kesto_ms:.1f}.")
+        if self.tiedosto is not None:
+            rivi = json.dumps(jalki.sanakirjana(), ensure_ascii=False)
+            try:
+                with self._kirjoituslukko, open(self.tiedosto, "a", encoding="utf-8") as f:
+                    f.write(rivi + "\n")
+            except OSError as e:
+                logging.warning(f"Mittareita ei voitu kirjoittaa tiedostoon: {e}")
+        for kuuntelija in list(self.kuuntelijat):
+            try:
+                kuuntelija(jalki)
+            except Exception as e:
+                logging.warning(f"Mittarikuuntelija epäonnistui: {e}")
+
+
+def mittaa_paras(funktio, toistot: int = MITTAUS_TOISTOT):
+    """Ajaa funktion toistot kertaa ja palauttaa (viimeinen tulos, paras aika ms)."""
+    ajat = []
+    for _ in range(toistot):
+        alku = time.perf_counter()
+        tulos = funktio()
+        ajat.append((time.perf_counter() - alku) * 1000)
+    return tulos, min(ajat)
+
+
+def jarjestyskorrelaatio(a, b) -> float:
+    """Spearmanin järjestyskorrelaatio (ilman tasapelikorjausta)."""
+    sijat_a = np.argsort(np.argsort(a))
+    sijat_b = np.argsort(np.argsort(b))
+    if len(a) < 2:
+        return 1.0
+    return float(np.corrcoef(sijat_a, sijat_b)[0, 1])
+
+
+def profiloi(funktio, tiedosto: str | None = PROFIILI_TIEDOSTO,
+             rivit: int = PROFIILI_RIVIT):
+    """
+    Ajaa funktion cProfilen alla, tallentaa profiilin tiedostoon (avattavissa
+    esim. snakevizillä tai pstatsilla) ja kirjaa raskaimmat kutsut lokiin.
+    Palauttaa (funktion tulos, tekstimuotoinen yhteenveto).
+    """
+    profiili = cProfile.Profile()
+    tulos = profiili.runcall(funktio)
+    if tiedosto:
+        profiili.dump_stats(tiedosto)
+        logging.info(f"Profiili tallennettu: '{tiedosto}'")
+    puskuri = io.StringIO()
+    pstats.Stats(profiili, stream=puskuri).sort_stats("cumulative").print_stats(rivit)
+    yhteenveto = puskuri.getvalue()
+    logging.info(f"Profiilin raskaimmat kutsut:\n{yhteenveto}")
+    return tulos, yhteenveto
+
+
+if __name__ == "__main__":
+    from hakukone import Hakuasetukset, Hakukone
+
+    parser = argparse.ArgumentParser(description="Profiloi yhden haun cProfilella.")
+    parser.add_argument("kysely")
+    parser.add_argument("--top-k", type=int, default=15)
+    parser.add_argument("--tiedosto", default=PROFIILI_TIEDOSTO)
+    parser.add_argument("--valimuistit", action="store_true",
+                        help="Pitää pisteiden ja tulosten välimuistit käytössä.")
+    args = parser.parse_args()
+
+    asetukset = Hakuasetukset.ymparistosta(kayta_valimuisteja=args.valimuistit)
+    with Hakukone(asetukset) as hakukone:
+        # Ensimmäinen haku lämmittää mallit, jotta profiili kuvaa tavallista hakua.
+        hakukone.etsi(args.kysely, args.top_k)
+        hakukone.profiloi(args.kysely, args.top_k, args.tiedosto)
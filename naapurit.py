@@ -0,0 +1,145 @@
+# naapurit.py (Versio 1.0 - Ennalta lasketut jakeiden naapurit)
+import argparse
+import logging
+import os
+import numpy as np
+
+from hierarkia import luvun_rajat
+from jaevarasto import JAEVARASTO_HAKEMISTO, Jaevarasto
+from raamatunviitteet import jasenna_viitteet
+
+# --- MÄÄRITYKSET ---
+NAAPURIT_HAKEMISTO = "D:/Python_AI/Raamattu-tutkija-data/naapurit"
+VEKTORIT_TIEDOSTO = "D:/Python_AI/Raamattu-tutkija-data/raamattu_vektorit.npy"
+NAAPURIT_TIEDOSTO = "naapurit.npy"
+PISTEET_TIEDOSTO = "naapuripisteet.npy"
+# Tallennettavien naapureiden määrä jaetta kohden.
+NAAPURIMAARA = 20
+# Kerralla pisteytettävät jakeet; erä x jakeet float32-matriisi (512 -> n. 64 MT).
+NAAPURI_ERAKOKO = 512
+# Sama kuin vektoritietokannan ikkunan säde: lähempänä samassa luvussa
+# olevien jakeiden ikkunat menevät päällekkäin, joten ne eivät ole viittauksia.
+IKKUNAN_SADE = 1
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] - %(message)s",
+    datefmt="%H:%M:%S",
+)
+
+
+def naapureiden_tiedostot(hakemisto: str = NAAPURIT_HAKEMISTO) -> list[str]:
+    """Palauttaa naapuritaulukoiden tiedostopolut."""
+    return [os.path.join(hakemisto, NAAPURIT_TIEDOSTO), os.path.join(hakemisto, PISTEET_TIEDOSTO)]
+
+
+def rakenna_naapurit(vektorit: np.ndarray, jaevarasto: Jaevarasto,
+                     hakemisto: str = NAAPURIT_HAKEMISTO, maara: int = NAAPURIMAARA,
+                     ikkunan_sade: int = IKKUNAN_SADE, erakoko: int = NAAPURI_ERAKOKO):
+    """
+    Laskee jokaiselle jakeelle maara lähintä jaetta tallennetuista
+    jaeikkunoiden vektoreista tarkalla, erissä tehtävällä matriisitulolla.
+    Naapurit järjestetään kosinisamankaltaisuuden mukaan indeksin
+    metriikasta riippumatta. Jae itse ja sen ikkunan kanssa päällekkäiset
+    saman luvun jakeet ohitetaan. Tulokset tallennetaan (jakeet x maara)
+    -taulukkoina: tunnisteet int32:na ja samankaltaisuudet float16:na.
+    """
+    os.makedirs(hakemisto, exist_ok=True)
+    vektorit = np.asarray(vektorit, dtype=np.float32)
+    normit = vektorit / (np.linalg.norm(vektorit, axis=1, keepdims=True) + 1e-12)
+    jakeita = len(normit)
+    maara = min(maara, max(jakeita - 1, 0))
+
+    luku_alut = luvun_rajat(jaevarasto)
+    luku = np.repeat(np.arange(len(luku_alut) - 1), np.diff(luku_alut))
+    ohitus = 2 * ikkunan_sade
+
+    naapurit = np.full((jakeita, maara), -1, dtype=np.int32)
+    pisteet = np.zeros((jakeita, maara), dtype=np.float16)
+    for alku in range(0, jakeita, erakoko):
+        loppu = min(alku + erakoko, jakeita)
+        samankaltaisuus = normit[alku:loppu] @ normit.T
+        for rivi, jae_id in enumerate(range(alku, loppu)):
+            luvun_alku = luku_alut[luku[jae_id]]
+            luvun_loppu = luku_alut[luku[jae_id] + 1]
+            samankaltaisuus[rivi, max(luvun_alku, jae_id - ohitus):
+                                  min(luvun_loppu, jae_id + ohitus + 1)] = -np.inf
+        parhaat = np.argpartition(-samankaltaisuus, maara - 1, axis=1)[:, :maara]
+        parhaat_pisteet = np.take_along_axis(samankaltaisuus, parhaat, axis=1)
+        jarjestys = np.argsort(-parhaat_pisteet, axis=1, kind="stable")
+        parhaat = np.take_along_axis(parhaat, jarjestys, axis=1)
+        parhaat_pisteet = np.take_along_axis(parhaat_pisteet, jarjestys, axis=1)
+        # Ohitetut jakeet voivat päätyä listaan vain, jos muita ei ole tarpeeksi.
+        parhaat[~np.isfinite(parhaat_pisteet)] = -1
+        naapurit[alku:loppu] = parhaat
+        pisteet[alku:loppu] = np.nan_to_num(parhaat_pisteet, neginf=0.0)
+
+    tunnisteet_tiedosto, pisteet_tiedosto = naapureiden_tiedostot(hakemisto)
+    np.save(tunnisteet_tiedosto, naapurit)
+    np.save(pisteet_tiedosto, pisteet)
+    logging.info(
+        f"Naapurit tallennettu hakemistoon '{hakemisto}': {jakeita} jaetta x {maara} "
+        f"naapuria ({(naapurit.nbytes + pisteet.nbytes) / 2**20:.1f} MT)."
+    )
+
+
+class Naapurigraafi:
+    """
+    Ennalta laskettujen naapureiden haku. Taulukot muistikartoitetaan,
+    joten jakeeseen liittyvät jakeet saadaan taulukkohakuna ilman malleja.
+    """
+
+    def __init__(self, hakemisto: str, jaevarasto: Jaevarasto):
+        tunnisteet_tiedosto, pisteet_tiedosto = naapureiden_tiedostot(hakemisto)
+        self.naapurit = np.load(tunnisteet_tiedosto, mmap_mode="r")
+        self.pisteet = np.load(pisteet_tiedosto, mmap_mode="r")
+        self.jaevarasto = jaevarasto
+        if len(self.naapurit) != len(jaevarasto):
+            raise ValueError(
+                f"Naapurit kattavat {len(self.naapurit)} jaetta, "
+                f"jaevarastossa on {len(jaevarasto)}."
+            )
+
+    def naapurit_tunnisteelle(self, jae_id: int, maara: int | None = None) -> list[tuple]:
+        """Palauttaa jakeen (naapurin tunniste, samankaltaisuus) -parit parhaasta alkaen."""
+        return [
+            (naapuri, piste) for naapuri, piste in zip(
+                self.naapurit[jae_id, :maara].tolist(), self.pisteet[jae_id, :maara].tolist()
+            ) if naapuri >= 0
+        ]
+
+    def liittyvat_jakeet(self, viite_str: str, maara: int = 10) -> list[dict]:
+        """
+        Palauttaa viitteeseen (myös väliin, esim. 'Ef. 4:11-12') liittyvät
+        jakeet. Välin jakeiden naapurit yhdistetään parhaan samankaltaisuuden
+        mukaan, eikä välin omia jakeita palauteta.
+        """
+        omat = {
+            jae_id
+            for viite in jasenna_viitteet(viite_str)
+            for jae_id in self.jaevarasto.viitevalin_tunnisteet(viite)
+        }
+        parhaat = {}
+        for jae_id in omat:
+            for naapuri, piste in self.naapurit_tunnisteelle(jae_id):
+                if naapuri not in omat and piste > parhaat.get(naapuri, -np.inf):
+                    parhaat[naapuri] = piste
+        jarjestetyt = sorted(parhaat.items(), key=lambda pari: pari[1], reverse=True)
+        return [
+            {**self.jaevarasto.jae(naapuri), "samankaltaisuus": piste}
+            for naapuri, piste in jarjestetyt[:maara]
+        ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Laskee jakeiden naapurit tallennetuista jaevektoreista."
+    )
+    parser.add_argument("--maara", type=int, default=NAAPURIMAARA)
+    parser.add_argument("--ikkuna", type=int, default=IKKUNAN_SADE,
+                        help="Vektoritietokannan ikkunan säde.")
+    args = parser.parse_args()
+    rakenna_naapurit(
+        np.load(VEKTORIT_TIEDOSTO), Jaevarasto(JAEVARASTO_HAKEMISTO),
+        NAAPURIT_HAKEMISTO, args.maara, args.ikkuna,
+    )
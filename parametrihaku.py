@@ -0,0 +1,207 @@
+# parametrihaku.py (Versio 1.0 - Ehdokaspoolin kertoimien viritys)
+import argparse
+import json
+import logging
+import os
+import re
+import time
+from datetime import datetime
+
+from syote import JASENNYS_VERSIO, SYOTE_TIEDOSTO, jarjestetyt_osiot, lue_syote_tiedosto
+
+# --- MÄÄRITYKSET ---
+PYYHKAISY_TOP_K = (5, 10, 15, 20, 40, 60, 80, 100)
+PYYHKAISY_KERTOIMET = (2, 3, 4, 5, 6, 7, 8, 10, 12, 15)
+# Vertailukohta: syvin pooli, jonka tuloksia pidetään "oikeina".
+REFERENSSI_KERROIN = 20
+# Pienin kerroin, jonka top_k-päällekkäisyys referenssiin on vähintään tämä.
+TAVOITE_OSUVUUS = 0.98
+MITTAUS_TOISTOT = 3
+DIAGNOSTIIKKA_RAPORTIT = (
+    "diagnostiikka_raportti_hybridihaku.txt",
+    "diagnostiikka_raportti_dynaaminen_haku.txt",
+)
+MITTAUSTAULUKKO = "parametrihaku.json"
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] - %(message)s",
+    datefmt="%H:%M:%S",
+)
+
+_OSIO_OTSIKKO = re.compile(r"^--- (\S+) .* ---$")
+_JAE_RIVI = re.compile(r'^- (.+?): "')
+
+
+def lue_diagnostiikka_raportti(tiedosto: str) -> dict[str, set[str]]:
+    """
+    Lukee run_full_diagnostics.py:n tallentaman raportin jaejaottelun:
+    osion numero -> raportoitujen jakeiden viitteet. Aiempia tuloksia
+    käytetään viitejoukkoina, joihin uusien tulosten kattavuutta verrataan.
+    """
+    osiot = {}
+    nykyinen = None
+    try:
+        with open(tiedosto, "r", encoding="utf-8") as f:
+            for rivi in f:
+                rivi = rivi.rstrip("\n")
+                otsikko = _OSIO_OTSIKKO.match(rivi)
+                if otsikko:
+                    nykyinen = osiot.setdefault(otsikko.group(1), set())
+                    continue
+                jae = _JAE_RIVI.match(rivi)
+                if jae and nykyinen is not None:
+                    nykyinen.add(jae.group(1))
+    except FileNotFoundError:
+        logging.warning(f"Diagnostiikkaraporttia '{tiedosto}' ei löytynyt.")
+    return osiot
+
+
+def _viitteet(tulokset: list[list[dict]]) -> list[set[str]]:
+    return [{jae["viite"] for jae in rivi} for rivi in tulokset]
+
+
+def _mittaa_haku(hakukone, kyselyt: list[str], top_k: int, kerroin: int,
+                 toistot: int) -> tuple[list[set[str]], float]:
+    """Ajaa haun kiinteällä kertoimella ja palauttaa (viitteet, paras aika ms)."""
+    hakukone.kerroinportaat = ((top_k, kerroin),)
+    ajat = []
+    for _ in range(toistot):
+        alku = time.perf_counter()
+        tulokset = hakukone.etsi_batch(kyselyt, top_k)
+        ajat.append((time.perf_counter() - alku) * 1000)
+    return _viitteet(tulokset), min(ajat)
+
+
+def pyyhi(hakukone, kyselyt: list[str], viitejoukot: list[set[str]] | None = None,
+          top_k_arvot=PYYHKAISY_TOP_K, kertoimet=PYYHKAISY_KERTOIMET,
+          toistot: int = MITTAUS_TOISTOT) -> list[dict]:
+    """
+    Käy läpi top_k- ja kerroinparit. Jokaisesta mitataan latenssi ja
+    top_k-tulosten päällekkäisyys saman top_k:n referenssihakuun
+    (REFERENSSI_KERROIN), sekä kattavuus tallennettuihin viitejoukkoihin.
+    Referenssipooli rajataan indeksin kokoon, jolloin sitä syvemmät
+    kertoimet ohitetaan. Hakukoneen välimuistien tulee olla pois käytöstä.
+    """
+    hakukone.lataa()
+    alkuperaiset = hakukone.kerroinportaat
+    ntotal = hakukone.paaindeksi.ntotal
+    mittaukset = []
+    try:
+        for top_k in top_k_arvot:
+            referenssi_kerroin = min(REFERENSSI_KERROIN, max(ntotal // top_k, 1))
+            if referenssi_kerroin < REFERENSSI_KERROIN:
+                logging.warning(
+                    f"top_k {top_k}: referenssipooli rajattu {top_k * referenssi_kerroin}"
+                    f"/{ntotal} ehdokkaaseen (kerroin {referenssi_kerroin})."
+                )
+            referenssi, referenssi_ms = _mittaa_haku(
+                hakukone, kyselyt, top_k, referenssi_kerroin, toistot
+            )
+            for kerroin in kertoimet:
+                if kerroin >= referenssi_kerroin:
+                    continue
+                tulokset, kesto_ms = _mittaa_haku(hakukone, kyselyt, top_k, kerroin, toistot)
+                osuvuus = sum(
+                    len(t & r) / max(len(r), 1) for t, r in zip(tulokset, referenssi)
+                ) / len(kyselyt)
+                mittaus = {
+                    "top_k": top_k, "kerroin": kerroin,
+                    "ehdokkaita": min(top_k * kerroin, ntotal),
+                    "osuvuus": osuvuus, "latenssi_ms": kesto_ms,
+                    "referenssi_kerroin": referenssi_kerroin, "referenssi_ms": referenssi_ms,
+                }
+                if viitejoukot:
+                    kattavuudet = [
+                        len(t & v) / len(v) for t, v in zip(tulokset, viitejoukot) if v
+                    ]
+                    if kattavuudet:
+                        mittaus["kattavuus"] = sum(kattavuudet) / len(kattavuudet)
+                mittaukset.append(mittaus)
+    finally:
+        hakukone.kerroinportaat = alkuperaiset
+    return mittaukset
+
+
+def tulosta_taulukko(mittaukset: list[dict]):
+    """Kirjaa mittaukset taulukkona lokiin."""
+    rivit = ["top_k  kerroin  ehdokkaita  osuvuus  kattavuus  latenssi_ms  nopeutus"]
+    for m in mittaukset:
+        kattavuus = f"{m['kattavuus']:.3f}" if "kattavuus" in m else "-"
+        rivit.append(
+            f"{m['top_k']:>5}  {m['kerroin']:>7}  {m['ehdokkaita']:>10}  "
+            f"{m['osuvuus']:>7.3f}  {kattavuus:>9}  {m['latenssi_ms']:>11.1f}  "
+            f"x{m['referenssi_ms'] / max(m['latenssi_ms'], 1e-9):.2f}"
+        )
+    logging.info("Parametrihaun tulokset:\n" + "\n".join(rivit))
+
+
+def valitse_kerroinportaat(mittaukset: list[dict],
+                           tavoite: float = TAVOITE_OSUVUUS) -> list[list[int]]:
+    """
+    Valitsee jokaiselle top_k:lle pienimmän kertoimen, joka saavuttaa
+    tavoiteosuvuuden. Porras kattaa edellisen top_k:n jälkeiset arvot.
+    Jos mikään kerroin ei riitä, käytetään top_k:n (rajattua) referenssikerrointa.
+    """
+    portaat = []
+    for top_k in sorted({m["top_k"] for m in mittaukset}):
+        rivit = [m for m in mittaukset if m["top_k"] == top_k]
+        riittavat = [m["kerroin"] for m in rivit if m["osuvuus"] >= tavoite]
+        referenssi = rivit[0].get("referenssi_kerroin", REFERENSSI_KERROIN)
+        portaat.append([top_k, min(riittavat, default=referenssi)])
+    return portaat
+
+
+def tallenna_parametrit(tiedosto: str, portaat: list[list[int]], mittaukset: list[dict],
+                        tavoite: float = TAVOITE_OSUVUUS):
+    """Tallentaa viritetyt kerroinportaat, jotka hakukone lataa käynnistyessään."""
+    kansio = os.path.dirname(tiedosto)
+    if kansio:
+        os.makedirs(kansio, exist_ok=True)
+    with open(tiedosto, "w", encoding="utf-8") as f:
+        json.dump({
+            "kerroinportaat": portaat,
+            "tavoite_osuvuus": tavoite,
+            "referenssi_kerroin": REFERENSSI_KERROIN,
+            "jasennys_versio": JASENNYS_VERSIO,
+            "luotu": datetime.now().isoformat(timespec="seconds"),
+            "mittaukset": mittaukset,
+        }, f, ensure_ascii=False, indent=4)
+    logging.info(f"Viritetyt kerroinportaat {portaat} tallennettu: '{tiedosto}'")
+
+
+if __name__ == "__main__":
+    from hakukone import Hakuasetukset, Hakukone
+
+    parser = argparse.ArgumentParser(
+        description="Virittää ehdokaspoolin kertoimet syote.txt:n osioilla."
+    )
+    parser.add_argument("--syote", default=SYOTE_TIEDOSTO)
+    parser.add_argument("--tavoite", type=float, default=TAVOITE_OSUVUUS)
+    parser.add_argument("--toistot", type=int, default=MITTAUS_TOISTOT)
+    parser.add_argument("--taulukko", default=MITTAUSTAULUKKO)
+    parser.add_argument("--kuiva-ajo", action="store_true",
+                        help="Tulostaa taulukon tallentamatta viritettyjä portaita.")
+    args = parser.parse_args()
+
+    hakulauseet, _ = lue_syote_tiedosto(args.syote)
+    osiot = jarjestetyt_osiot(hakulauseet or {})
+    raportit = [lue_diagnostiikka_raportti(t) for t in DIAGNOSTIIKKA_RAPORTIT]
+    viitejoukot = [
+        set().union(*(raportti.get(osio_nro, set()) for raportti in raportit))
+        for osio_nro, _ in osiot
+    ]
+
+    asetukset = Hakuasetukset.ymparistosta(kayta_valimuisteja=False)
+    with Hakukone(asetukset) as hakukone:
+        mittaukset = pyyhi(
+            hakukone, [haku for _, haku in osiot], viitejoukot, toistot=args.toistot
+        )
+    tulosta_taulukko(mittaukset)
+    portaat = valitse_kerroinportaat(mittaukset, args.tavoite)
+    with open(args.taulukko, "w", encoding="utf-8") as f:
+        json.dump(mittaukset, f, ensure_ascii=False, indent=4)
+    if args.kuiva_ajo:
+        logging.info(f"Kuiva-ajo: ehdotetut kerroinportaat {portaat}")
+    else:
+        tallenna_parametrit(asetukset.hakuparametrit_tiedosto, portaat, mittaukset, args.tavoite)
@@ -0,0 +1,110 @@
+# pistevarasto.py (Versio 1.0 - Cross-encoder-pisteiden pysyvä välimuisti)
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+
+# Kuinka suuri osa riveistä jätetään jäljelle, kun varasto täyttyy.
+SIIVOUKSEN_TAVOITE = 0.9
+# SQLiten parametrirajan alittava eräkoko IN-kyselyille.
+KYSELYN_ERAKOKO = 500
+
+
+def pisteavain(malli: str, kysely: str, viite: str) -> bytes:
+    """Laskee (malli, laajennettu kysely, jaeviite) -parin tiivisteavaimen."""
+    tiiviste = hashlib.blake2b(digest_size=16)
+    for osa in (malli, kysely, viite):
+        tiiviste.update(osa.encode("utf-8"))
+        tiiviste.update(b"\x1f")
+    return tiiviste.digest()
+
+
+class Pistevarasto:
+    """
+    SQLite-pohjainen, kooltaan rajattu LRU-varasto cross-encoderin pisteille.
+    Jokaisen rivin viimeisin käyttöaika päivitetään haettaessa, ja kun
+    rivejä on yli max_rivit, vanhimmin käytetyt poistetaan.
+    """
+
+    def __init__(self, polku: str, max_rivit: int = 2_000_000):
+        self.polku = polku
+        self.max_rivit = max_rivit
+        self._lukko = threading.Lock()
+        self._yhteys = sqlite3.connect(polku, check_same_thread=False)
+        self._yhteys.execute("PRAGMA journal_mode=WAL")
+        self._yhteys.execute("PRAGMA synchronous=NORMAL")
+        self._yhteys.execute(
+            "CREATE TABLE IF NOT EXISTS pisteet ("
+            "avain BLOB PRIMARY KEY, pisteet REAL NOT NULL, "
+            "kaytetty REAL NOT NULL) WITHOUT ROWID"
+        )
+        self._yhteys.execute(
+            "CREATE INDEX IF NOT EXISTS pisteet_kaytetty ON pisteet (kaytetty)"
+        )
+        self._yhteys.commit()
+        self._rivimaara = self._yhteys.execute(
+            "SELECT COUNT(*) FROM pisteet"
+        ).fetchone()[0]
+
+    def hae(self, avaimet: list[bytes]) -> dict[bytes, float]:
+        """Palauttaa varastosta löytyvät pisteet ja merkitsee ne käytetyiksi."""
+        loytyneet = {}
+        if not avaimet:
+            return loytyneet
+        nyt = time.time()
+        with self._lukko:
+            for alku in range(0, len(avaimet), KYSELYN_ERAKOKO):
+                era = avaimet[alku:alku + KYSELYN_ERAKOKO]
+                paikat = ",".join("?" * len(era))
+                loytyneet.update(self._yhteys.execute(
+                    f"SELECT avain, pisteet FROM pisteet WHERE avain IN ({paikat})",
+                    era,
+                ).fetchall())
+            osumat = list(loytyneet)
+            for alku in range(0, len(osumat), KYSELYN_ERAKOKO):
+                era = osumat[alku:alku + KYSELYN_ERAKOKO]
+                paikat = ",".join("?" * len(era))
+                self._yhteys.execute(
+                    f"UPDATE pisteet SET kaytetty = ? WHERE avain IN ({paikat})",
+                    [nyt, *era],
+                )
+            self._yhteys.commit()
+        return loytyneet
+
+    def tallenna(self, pisteet: dict[bytes, float]):
+        """Tallentaa uudet pisteet ja karsii varaston kokorajaan."""
+        if not pisteet:
+            return
+        nyt = time.time()
+        with self._lukko:
+            self._yhteys.executemany(
+                "INSERT OR REPLACE INTO pisteet (avain, pisteet, kaytetty) "
+                "VALUES (?, ?, ?)",
+                [(avain, float(arvo), nyt) for avain, arvo in pisteet.items()],
+            )
+            self._rivimaara += len(pisteet)
+            if self._rivimaara > self.max_rivit:
+                self._karsi()
+            self._yhteys.commit()
+
+    def _karsi(self):
+        """Poistaa vanhimmin käytetyt rivit. Kutsutaan lukko hallussa."""
+        self._rivimaara = self._yhteys.execute(
+            "SELECT COUNT(*) FROM pisteet"
+        ).fetchone()[0]
+        poistettavat = self._rivimaara - int(self.max_rivit * SIIVOUKSEN_TAVOITE)
+        if poistettavat <= 0:
+            return
+        self._yhteys.execute(
+            "DELETE FROM pisteet WHERE avain IN ("
+            "SELECT avain FROM pisteet ORDER BY kaytetty LIMIT ?)",
+            (poistettavat,),
+        )
+        self._rivimaara -= poistettavat
+        logging.info(f"Pistevarastosta poistettiin {poistettavat} vanhinta riviä.")
+
+    def sulje(self):
+        """Sulkee tietokantayhteyden."""
+        with self._lukko:
+            self._yhteys.close()
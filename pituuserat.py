@@ -0,0 +1,172 @@
+# pituuserat.py (Versio 1.0 - Pituuden mukaan lajitellut erät ja kyselyn tokenibudjetti)
+import argparse
+import json
+import logging
+import re
+import numpy as np
+
+from mittarit import jarjestyskorrelaatio, mittaa_paras
+from syote import SYOTE_TIEDOSTO, jarjestetyt_osiot, lue_syote_tiedosto
+
+# --- MÄÄRITYKSET ---
+# Uudelleenjärjestykseen lähtevän kyselyn enimmäispituus tokeneina (None = ei rajaa).
+# Oletuksena pois päältä: suomi pilkkoutuu englanninkielisellä tokenisoijalla
+# moneen osaan, joten budjetti otetaan käyttöön vasta vertailun jälkeen.
+KYSELYN_TOKENIBUDJETTI = None
+# Vertailussa kokeiltava budjetti, kun hakukoneelle ei ole asetettu omaa.
+VERTAILU_TOKENIBUDJETTI = 96
+VERTAILU_RAPORTTI = "pituuseravertailu.json"
+VERTAILU_TOP_K = 15
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] - %(message)s",
+    datefmt="%H:%M:%S",
+)
+
+_LAUSERAJA = re.compile(r"(?<=[.!?:;])\s+")
+
+
+def pituusjarjestys(pituudet) -> np.ndarray:
+    """Palauttaa indeksit pisimmästä lyhimpään; saman pituiset pysyvät järjestyksessä."""
+    return np.argsort(-np.asarray(pituudet, dtype=np.int64), kind="stable")
+
+
+def ennusta_pituusjarjestyksessa(cross_encoder, parit: list, erakoko: int) -> list[float]:
+    """
+    Pisteyttää parit cross-encoderilla pituusjärjestyksessä, jolloin saman
+    erän parit ovat lähes yhtä pitkiä eikä täyte hallitse laskentaa.
+    Pituutena käytetään merkkimäärää kuten sentence-transformersin omassa
+    lajittelussa. Pisteet palautetaan parien alkuperäisessä järjestyksessä.
+    """
+    if not parit:
+        return []
+    jarjestys = pituusjarjestys([len(kysely) + len(teksti) for kysely, teksti in parit])
+    pisteet = cross_encoder.predict(
+        [parit[i] for i in jarjestys], batch_size=erakoko, show_progress_bar=False
+    )
+    tulos = np.empty(len(parit), dtype=np.float64)
+    tulos[jarjestys] = np.asarray(pisteet, dtype=np.float64).reshape(-1)
+    return tulos.tolist()
+
+
+def rajaa_kysely(kysely: str, tokenisoija, budjetti: int | None = KYSELYN_TOKENIBUDJETTI) -> str:
+    """
+    Rajaa kyselyn tokenibudjettiin. Osion kysely alkaa otsikolla, jota seuraa
+    kuvaus, joten alusta pidetään kokonaisia lauseita niin monta kuin mahtuu.
+    Jos jo ensimmäinen lause ylittää budjetin, pidetään alusta kokonaisia sanoja.
+    """
+    if budjetti is None or tokenisoija is None:
+        return kysely
+    if len(tokenisoija.tokenize(kysely)) <= budjetti:
+        return kysely
+    for palat in (_LAUSERAJA.split(kysely), kysely.split()):
+        pidetyt, tokeneita = [], 0
+        for pala in palat:
+            tokeneita += len(tokenisoija.tokenize(pala))
+            if tokeneita > budjetti:
+                break
+            pidetyt.append(pala)
+        if pidetyt:
+            return " ".join(pidetyt)
+    return kysely
+
+
+def vertaa_eraytysta(hakukone, kyselyt: list[str], top_k: int = VERTAILU_TOP_K,
+                     budjetti: int | None = None) -> dict:
+    """
+    Mittaa samoilla ehdokaspareilla cross-encoderin ajan saapumisjärjestyksessä,
+    pituusjärjestyksessä sekä pituusjärjestyksessä rajatuilla kyselyillä.
+    Raportoi nopeutukset, rajauksen vaikutuksen pisteisiin ja top_k-tuloksiin
+    sekä kyselyiden keskimääräisen tokenimäärän. Budjettina käytetään annettua,
+    hakukoneen omaa tai VERTAILU_TOKENIBUDJETTI-arvoa. Välimuistien tulee olla
+    pois käytöstä.
+    """
+    hakukone.lataa()
+    erakoko = hakukone.asetukset.rerank_erakoko
+    alkuperainen = hakukone.asetukset.kyselyn_tokenibudjetti
+    budjetti = budjetti or alkuperainen or VERTAILU_TOKENIBUDJETTI
+    tokenisoija = hakukone.cross_encoder.tokenizer
+    _, ehdokkaat, _ = hakukone.hae_ehdokkaat(kyselyt, top_k)
+    rajatut = [rajaa_kysely(k, tokenisoija, budjetti) for k in kyselyt]
+    parit = [[k, j["teksti"]] for k, e in zip(kyselyt, ehdokkaat) for j in e]
+    rajatut_parit = [[k, j["teksti"]] for k, e in zip(rajatut, ehdokkaat) for j in e]
+
+    pisteet, saapumis_ms = mittaa_paras(lambda: np.asarray(hakukone.cross_encoder.predict(
+        parit, batch_size=erakoko, show_progress_bar=False
+    )))
+    _, lajiteltu_ms = mittaa_paras(
+        lambda: ennusta_pituusjarjestyksessa(hakukone.cross_encoder, parit, erakoko)
+    )
+    rajatut_pisteet, rajattu_ms = mittaa_paras(lambda: np.asarray(
+        ennusta_pituusjarjestyksessa(hakukone.cross_encoder, rajatut_parit, erakoko)
+    ))
+
+    def viitteet(tulokset):
+        return [{j["viite"] for j in rivi} for rivi in tulokset]
+
+    try:
+        hakukone.asetukset.kyselyn_tokenibudjetti = None
+        tulokset_taysi = viitteet(hakukone.etsi_batch(kyselyt, top_k))
+        hakukone.asetukset.kyselyn_tokenibudjetti = budjetti
+        tulokset_rajattu = viitteet(hakukone.etsi_batch(kyselyt, top_k))
+    finally:
+        hakukone.asetukset.kyselyn_tokenibudjetti = alkuperainen
+    paallekkaisyys = [
+        len(a & b) / max(len(a), 1) for a, b in zip(tulokset_taysi, tulokset_rajattu)
+    ]
+    tokenit = [len(tokenisoija.tokenize(k)) for k in kyselyt]
+    rajatut_tokenit = [len(tokenisoija.tokenize(k)) for k in rajatut]
+
+    raportti = {
+        "kyselyt": len(kyselyt),
+        "parit": len(parit),
+        "top_k": top_k,
+        "tokenibudjetti": budjetti,
+        "kyselyn_tokenit_ka": float(np.mean(tokenit)),
+        "rajatun_kyselyn_tokenit_ka": float(np.mean(rajatut_tokenit)),
+        "rajattuja_kyselyita": sum(a != b for a, b in zip(kyselyt, rajatut)),
+        "rerank": {
+            "saapumisjarjestys_ms": saapumis_ms,
+            "pituusjarjestys_ms": lajiteltu_ms,
+            "pituusjarjestys_ja_budjetti_ms": rajattu_ms,
+            "nopeutus_lajittelu": saapumis_ms / lajiteltu_ms,
+            "nopeutus_yhteensa": saapumis_ms / rajattu_ms,
+            "jarjestyskorrelaatio": jarjestyskorrelaatio(pisteet, rajatut_pisteet),
+        },
+        f"top{top_k}_paallekkaisyys_ka": float(np.mean(paallekkaisyys)),
+        f"top{top_k}_paallekkaisyys_min": float(np.min(paallekkaisyys)),
+    }
+    logging.info(
+        f"Rerank {len(parit)} paria: saapumisjärjestys {saapumis_ms:.1f} ms, "
+        f"pituusjärjestys {lajiteltu_ms:.1f} ms (x{raportti['rerank']['nopeutus_lajittelu']:.2f}), "
+        f"+ budjetti {budjetti} {rajattu_ms:.1f} ms "
+        f"(x{raportti['rerank']['nopeutus_yhteensa']:.2f}). Kyselyn tokenit ka "
+        f"{np.mean(tokenit):.0f} -> {np.mean(rajatut_tokenit):.0f}. "
+        f"Top-{top_k}-päällekkäisyys ka {np.mean(paallekkaisyys):.3f}."
+    )
+    return raportti
+
+
+if __name__ == "__main__":
+    from hakukone import Hakuasetukset, Hakukone
+
+    parser = argparse.ArgumentParser(
+        description="Mittaa pituusjärjestetyn uudelleenjärjestyksen ja kyselyn "
+                    "tokenibudjetin vaikutuksen syote.txt:n osioilla."
+    )
+    parser.add_argument("--top-k", type=int, default=VERTAILU_TOP_K)
+    parser.add_argument("--syote", default=SYOTE_TIEDOSTO)
+    parser.add_argument("--raportti", default=VERTAILU_RAPORTTI)
+    parser.add_argument("--budjetti", type=int, default=VERTAILU_TOKENIBUDJETTI,
+                        help="Kokeiltava kyselyn tokenibudjetti.")
+    args = parser.parse_args()
+
+    hakulauseet, _ = lue_syote_tiedosto(args.syote)
+    kyselyt = [haku for _, haku in jarjestetyt_osiot(hakulauseet or {})]
+    asetukset = Hakuasetukset.ymparistosta(kayta_valimuisteja=False)
+    with Hakukone(asetukset) as hakukone:
+        raportti = vertaa_eraytysta(hakukone, kyselyt, args.top_k, args.budjetti)
+    with open(args.raportti, "w", encoding="utf-8") as f:
+        json.dump(raportti, f, ensure_ascii=False, indent=4)
+    logging.info(f"Vertailu tallennettu: '{args.raportti}'")
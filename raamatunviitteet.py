@@ -0,0 +1,216 @@
+# raamatunviitteet.py (Versio 1.0 - Viitejäsennin ja jaeindeksi)
+import re
+from collections import namedtuple
+
+# Yksi jäsennetty viite. Yhden jakeen viitteessä alku ja loppu ovat samat.
+Viite = namedtuple(
+    "Viite", ["kirja", "alku_luku", "alku_jae", "loppu_luku", "loppu_jae"]
+)
+
+# --- KIRJOJEN NIMET JA LYHENTEET ---
+# Kanoninen nimi (kuten bible.json käyttää) -> tunnetut lyhenteet ja muunnelmat.
+KIRJOJEN_LYHENTEET = {
+    "1. Mooseksen kirja": ["1. Moos.", "1. Mooses"],
+    "2. Mooseksen kirja": ["2. Moos.", "2. Mooses"],
+    "3. Mooseksen kirja": ["3. Moos.", "3. Mooses"],
+    "4. Mooseksen kirja": ["4. Moos.", "4. Mooses"],
+    "5. Mooseksen kirja": ["5. Moos.", "5. Mooses"],
+    "Joosua": ["Joos.", "Joosuan kirja"],
+    "Tuomarien kirja": ["Tuom.", "Tuomarit"],
+    "Ruut": ["Ruutin kirja"],
+    "1. Samuelin kirja": ["1. Sam."],
+    "2. Samuelin kirja": ["2. Sam."],
+    "1. Kuningasten kirja": ["1. Kun."],
+    "2. Kuningasten kirja": ["2. Kun."],
+    "1. Aikakirja": ["1. Aik.", "1. Aikakirjat"],
+    "2. Aikakirja": ["2. Aik.", "2. Aikakirjat"],
+    "Esra": ["Esr."],
+    "Nehemia": ["Neh."],
+    "Ester": ["Est."],
+    "Job": ["Jobin kirja"],
+    "Psalmit": ["Ps.", "Psalmi"],
+    "Sananlaskut": ["Sananl.", "Sananl", "Snl."],
+    "Saarnaaja": ["Saarn."],
+    "Laulujen laulu": ["Laul. l.", "Korkea veisu", "Korkea v."],
+    "Jesaja": ["Jes."],
+    "Jeremia": ["Jer."],
+    "Valitusvirret": ["Valit.", "Valitusvirsi"],
+    "Hesekiel": ["Hes."],
+    "Daniel": ["Dan."],
+    "Hoosea": ["Hoos."],
+    "Joel": ["Jooel"],
+    "Aamos": ["Aam."],
+    "Obadja": ["Obadj.", "Ob."],
+    "Joona": ["Joon."],
+    "Miika": ["Miik.", "Mika"],
+    "Nahum": ["Nah."],
+    "Habakuk": ["Hab."],
+    "Sefanja": ["Sef."],
+    "Haggai": ["Hagg."],
+    "Sakarja": ["Sak."],
+    "Malakia": ["Mal."],
+    "Matteus": ["Matt.", "Mt."],
+    "Markus": ["Mark.", "Mk."],
+    "Luukas": ["Luuk.", "Lk."],
+    "Johannes": ["Joh."],
+    "Apostolien teot": ["Ap. t.", "Apt.", "Ap.t."],
+    "Roomalaiskirje": ["Room."],
+    "1. Korinttilaiskirje": ["1. Kor."],
+    "2. Korinttilaiskirje": ["2. Kor."],
+    "Galatalaiskirje": ["Gal."],
+    "Efesolaiskirje": ["Ef."],
+    "Filippiläiskirje": ["Fil."],
+    "Kolossalaiskirje": ["Kol."],
+    "1. Tessalonikalaiskirje": ["1. Tess."],
+    "2. Tessalonikalaiskirje": ["2. Tess."],
+    "1. Timoteuskirje": ["1. Tim."],
+    "2. Timoteuskirje": ["2. Tim."],
+    "Tiituskirje": ["Tit."],
+    "Filemonin kirje": ["Filem."],
+    "Heprealaiskirje": ["Hepr."],
+    "Jaakobin kirje": ["Jaak."],
+    "1. Pietarin kirje": ["1. Piet."],
+    "2. Pietarin kirje": ["2. Piet."],
+    "1. Johanneksen kirje": ["1. Joh."],
+    "2. Johanneksen kirje": ["2. Joh."],
+    "3. Johanneksen kirje": ["3. Joh."],
+    "Juudaksen kirje": ["Juud."],
+    "Ilmestyskirja": ["Ilm."],
+}
+
+
+def normalisoi_kirja(nimi: str) -> str:
+    """Muuntaa kirjan nimen vertailumuotoon ('1. Piet.' -> '1piet')."""
+    return re.sub(r"[\s.]", "", nimi).lower()
+
+
+# Normalisoitu lyhenne tai nimi -> normalisoitu kanoninen nimi (jaeindeksin avain).
+KIRJA_ALIAKSET = {}
+for _nimi, _lyhenteet in KIRJOJEN_LYHENTEET.items():
+    for _muoto in [_nimi, *_lyhenteet]:
+        KIRJA_ALIAKSET[normalisoi_kirja(_muoto)] = normalisoi_kirja(_nimi)
+
+
+def kirjan_avain(nimi: str) -> str:
+    """Palauttaa kirjan nimen tai lyhenteen jaeindeksin avaimen."""
+    normalisoitu = normalisoi_kirja(nimi)
+    return KIRJA_ALIAKSET.get(normalisoitu, normalisoitu)
+
+
+# --- VIITTEIDEN JÄSENNYS ---
+_KIRJA_PATTERN = re.compile(
+    r"(?<![\w.])"
+    r"((?:[1-3]\.?\s?)?[A-ZÅÄÖa-zåäö]+\.?"
+    r"(?:\s?(?:t\.|l\.|v\.|kirja|kirje|laulu|veisu|teot))?)"
+    r"\s?(?=\d+:\d+)"
+)
+_OSA_PATTERN = re.compile(r"(\d+)(?::(\d+))?(?:\s*[-–]\s*(\d+)(?::(\d+))?)?")
+_EROTIN_PATTERN = re.compile(r"\s*([,;])\s*")
+
+
+def _muodosta_viite(kirja, luku, osa) -> Viite:
+    """Tulkitsee yhden viiteosan ('4-5', '13:1', '5:3-7:29') nykyisessä luvussa."""
+    eka, toka, kolmas, neljas = osa.groups()
+    if toka is not None:
+        alku_luku, alku_jae = int(eka), int(toka)
+    else:
+        alku_luku, alku_jae = luku, int(eka)
+
+    if neljas is not None:
+        loppu_luku, loppu_jae = int(kolmas), int(neljas)
+    elif kolmas is not None:
+        loppu_luku, loppu_jae = alku_luku, int(kolmas)
+    else:
+        loppu_luku, loppu_jae = alku_luku, alku_jae
+
+    if (loppu_luku, loppu_jae) < (alku_luku, alku_jae):
+        loppu_luku, loppu_jae = alku_luku, alku_jae
+    return Viite(kirja, alku_luku, alku_jae, loppu_luku, loppu_jae)
+
+
+def _alkaa_kirjalla(teksti: str, kohta: int) -> bool:
+    """Tarkistaa, alkaako kohdasta tunnetun kirjan viite."""
+    osuma = _KIRJA_PATTERN.match(teksti, kohta)
+    return bool(osuma) and normalisoi_kirja(osuma.group(1)) in KIRJA_ALIAKSET
+
+
+def jasenna_viitteet(teksti: str) -> list[Viite]:
+    """
+    Poimii tekstistä kaikki raamatunviitteet, myös luettelot
+    ('Room. 12:4-5, 8; 13:1') ja lukurajan ylittävät välit ('Matt. 5:3-7:29').
+    Tuntemattomilla kirjannimillä alkavat osumat ohitetaan.
+    """
+    viitteet = []
+    kohta = 0
+    while True:
+        osuma = _KIRJA_PATTERN.search(teksti, kohta)
+        if not osuma:
+            return viitteet
+        kohta = osuma.end()
+        avain = KIRJA_ALIAKSET.get(normalisoi_kirja(osuma.group(1)))
+        if avain is None:
+            continue
+
+        osa = _OSA_PATTERN.match(teksti, kohta)
+        viite = _muodosta_viite(avain, 0, osa)
+        viitteet.append(viite)
+        kohta = osa.end()
+        luku = viite.loppu_luku
+
+        # Jatketaan luetteloa niin kauan kuin erotinta seuraa viiteosa.
+        while True:
+            erotin = _EROTIN_PATTERN.match(teksti, kohta)
+            if not erotin:
+                break
+            # Erottimen jälkeen voi alkaa uusi kirja ("; 1. Kor. 3:1").
+            if _alkaa_kirjalla(teksti, erotin.end()):
+                break
+            osa = _OSA_PATTERN.match(teksti, erotin.end())
+            # Puolipisteen jälkeen odotetaan aina lukua ja jaetta.
+            if not osa or (erotin.group(1) == ";" and osa.group(2) is None):
+                break
+            viite = _muodosta_viite(avain, luku, osa)
+            viitteet.append(viite)
+            kohta = osa.end()
+            luku = viite.loppu_luku
+
+
+# --- JAEINDEKSI ---
+def rakenna_jaeindeksi(jakeet) -> dict:
+    """
+    Rakentaa hakemiston kirja -> luku -> jae -> arvo monikoista
+    (kirjan nimi, luku, jae, arvo). Arvona on tyypillisesti jaetunniste.
+    """
+    jae_indeksi = {}
+    for kirja, luku, jae, arvo in jakeet:
+        luvut = jae_indeksi.setdefault(kirjan_avain(kirja), {})
+        luvut.setdefault(luku, {})[jae] = arvo
+
+    for luvut in jae_indeksi.values():
+        for luku, jakeet_luvussa in luvut.items():
+            luvut[luku] = dict(sorted(jakeet_luvussa.items()))
+    return jae_indeksi
+
+
+def hae_viitevali(viite: Viite, jae_indeksi: dict) -> list:
+    """
+    Palauttaa viitteen kattamien jakeiden arvot järjestyksessä.
+    Työmäärä on verrannollinen välin pituuteen, ei koko Raamatun kokoon.
+    """
+    luvut = jae_indeksi.get(viite.kirja)
+    if not luvut:
+        return []
+
+    loytyneet = []
+    for luku in range(viite.alku_luku, viite.loppu_luku + 1):
+        jakeet = luvut.get(luku)
+        if not jakeet:
+            continue
+        viimeinen = next(reversed(jakeet))
+        alku = viite.alku_jae if luku == viite.alku_luku else 1
+        loppu = viite.loppu_jae if luku == viite.loppu_luku else viimeinen
+        for jae in range(alku, min(loppu, viimeinen) + 1):
+            arvo = jakeet.get(jae)
+            if arvo is not None:
+                loytyneet.append(arvo)
+    return loytyneet
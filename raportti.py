@@ -0,0 +1,82 @@
+# raportti.py (Versio 1.0 - Tutkielmaraportin vienti Markdown- ja Word-muotoon)
+import hashlib
+import json
+from io import BytesIO
+
+
+def _osiojarjestys(jae_kartta: dict) -> list:
+    """Palauttaa (osio_nro, data) -parit osionumeroiden mukaisessa järjestyksessä."""
+    return sorted(
+        jae_kartta.items(),
+        key=lambda item: [int(p) for p in item[0].split('.')]
+    )
+
+
+def sisallon_tiiviste(sl: dict, jae_kartta: dict) -> str:
+    """
+    Laskee raportin sisällön (otsikko, sisällysluettelo, osiot ja jakeet)
+    tiivisteen. Samasta sisällöstä tehdyt viennit voidaan käyttää uudelleen.
+    """
+    sisalto = json.dumps(
+        [sl, _osiojarjestys(jae_kartta)], ensure_ascii=False, sort_keys=True
+    )
+    return hashlib.blake2b(sisalto.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def kirjoita_osio_md(otsikko: str, jakeet: list[dict]):
+    """Tuottaa yhden osion Markdown-tekstin paloina."""
+    yield f"## {otsikko}\n\n"
+    if jakeet:
+        for jae in jakeet:
+            yield f"- **{jae['viite']}**: \"{jae['teksti']}\"\n"
+    else:
+        yield "*Ei jakeita tähän osioon.*\n"
+    yield "\n"
+
+
+def kirjoita_raportti_md(sl: dict, jae_kartta: dict):
+    """
+    Tuottaa koko raportin Markdown-tekstin paloina, jotta suurta raporttia
+    ei koota toistuvalla merkkijonojen yhdistämisellä.
+    """
+    yield f"# {sl['otsikko']}\n\n"
+    if sl['teksti']:
+        yield "## Sisällysluettelo\n\n"
+        yield sl['teksti'] + "\n\n"
+    for _, data in _osiojarjestys(jae_kartta):
+        yield from kirjoita_osio_md(data['otsikko'], data["jakeet"])
+
+
+def luo_osio_md(otsikko: str, jakeet: list[dict]) -> str:
+    """Luo yhden osion Markdown-tekstin (käytetään myös vaiheittaisessa näytössä)."""
+    return "".join(kirjoita_osio_md(otsikko, jakeet))
+
+
+def luo_raportti_md(sl: dict, jae_kartta: dict) -> str:
+    """Luo siistin tekstimuotoisen raportin."""
+    return "".join(kirjoita_raportti_md(sl, jae_kartta))
+
+
+def luo_raportti_doc(sl: dict, jae_kartta: dict) -> bytes:
+    """Luo ladattavan Word-dokumentin ja palauttaa sen tavuina."""
+    import docx  # Tuodaan vasta tarvittaessa, ei sivun piirron yhteydessä.
+
+    doc = docx.Document()
+    doc.add_heading(sl['otsikko'], 0)
+    if sl['teksti']:
+        doc.add_heading("Sisällysluettelo", 1)
+        doc.add_paragraph(sl['teksti'])
+
+    for _, data in _osiojarjestys(jae_kartta):
+        doc.add_heading(data['otsikko'], 1)
+        if data["jakeet"]:
+            for jae in data["jakeet"]:
+                p = doc.add_paragraph()
+                p.add_run(f"{jae['viite']}: ").bold = True
+                p.add_run(f"\"{jae['teksti']}\"")
+        else:
+            doc.add_paragraph("Ei jakeita tähän osioon.")
+
+    buffer = BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
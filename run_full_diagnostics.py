@@ -1,11 +1,11 @@
 # run_full_diagnostics.py (Versio 6.2 - Yksinkertaistettu ja korjattu)
 import logging
 import time
-import re
 from collections import defaultdict
 
-# Tuodaan vain tarvittavat pääfunktiot
-from logic import etsi_merkityksen_mukaan, lataa_resurssit
+# Hakukone ajetaan suoraan ilman Streamlit-ajoympäristöä
+from hakukone import Hakukone
+from syote import jarjestetyt_osiot, lue_syote_tiedosto
 
 # --- MÄÄRITYKSET ---
 SYOTE_TIEDOSTO = 'syote.txt'
@@ -36,41 +36,6 @@ def log_header(text):
     logger.info("\n%s\n%s\n%s\n", line, text.center(80), line)
 
 
-def lue_syote_tiedosto(tiedostopolku):
-    """Lukee ja jäsentää syötetiedoston vankasti."""
-    try:
-        with open(tiedostopolku, 'r', encoding='utf-8') as f:
-            sisalto = f.read()
-    except FileNotFoundError:
-        logging.error(f"Syötetiedostoa '{tiedostopolku}' ei löytynyt.")
-        return None, None
-
-    sisallysluettelo_match = re.search(
-        r"Sisällysluettelo:(.*?)(?=\n\d\.|\Z)", sisalto, re.DOTALL
-    )
-    sisallysluettelo = sisallysluettelo_match.group(1).strip() if sisallysluettelo_match else ""
-
-    hakulauseet = {}
-    osiot = re.split(r'\n(?=\d\.\s)', sisalto)
-
-    for osio_teksti in osiot:
-        osio_teksti = osio_teksti.strip()
-        if not osio_teksti:
-            continue
-
-        rivit = osio_teksti.split('\n', 1)
-        otsikko = rivit[0].strip()
-        kuvaus = rivit[1].strip() if len(rivit) > 1 else ""
-
-        osio_match = re.match(r"^([\d\.]+)", otsikko)
-        if osio_match:
-            osio_nro = osio_match.group(1).strip('.')
-            haku = f"{otsikko}: {kuvaus.replace(' ', ' ')}"
-            hakulauseet[osio_nro] = haku
-
-    return hakulauseet, sisallysluettelo
-
-
 def suorita_diagnostiikka():
     """Ajaa koko diagnostiikkaprosessin kutsuen uutta hybridihakua."""
     total_start_time = time.time()
@@ -79,13 +44,26 @@ def suorita_diagnostiikka():
     logging.info("Esiladataan kaikki resurssit...")
     resurssien_lataus_alku = time.time()
     # Lataa resurssit kerran alussa, jotta se ei vaikuta hakuaikoihin
-    lataa_resurssit()
+    hakukone = Hakukone()
+    try:
+        hakukone.lataa()
+    except Exception as e:
+        logging.error(f"Resurssien lataus epäonnistui: {e}")
+        return
     resurssien_lataus_loppu = time.time()
     logging.info(
         "Resurssit ladattu. Kesto: "
         f"{(resurssien_lataus_loppu - resurssien_lataus_alku):.2f} sekuntia."
     )
 
+    try:
+        _suorita_haut(hakukone, total_start_time)
+    finally:
+        hakukone.sulje()
+
+
+def _suorita_haut(hakukone, total_start_time):
+    """Hakee kaikki syötteen osiot ladatulla hakukoneella ja kirjaa tulokset."""
     hakulauseet, _ = lue_syote_tiedosto(SYOTE_TIEDOSTO)
     if not hakulauseet:
         logging.error("Lopetetaan, koska syötettä ei voitu jäsentää.")
@@ -94,31 +72,28 @@ def suorita_diagnostiikka():
     logging.info(f"Löytyi {len(hakulauseet)} osiota käsiteltäväksi.")
 
     jae_kartta_tuloksille = defaultdict(list)
-    total_search_time = 0
 
-    sorted_osiot = sorted(
-        hakulauseet.items(),
-        key=lambda item: [int(p) for p in item[0].split('.')]
+    sorted_osiot = jarjestetyt_osiot(hakulauseet)
+
+    log_header(f"Käsitellään kaikki {len(sorted_osiot)} osiota yhtenä eränä")
+
+    haku_alku = time.time()
+    kaikki_tulokset = hakukone.etsi_batch(
+        [haku for _, haku in sorted_osiot], top_k=HAKUTULOSTEN_MAARA_PER_TEEMA
+    )
+    haku_loppu = time.time()
+    total_search_time = haku_loppu - haku_alku
+
+    logging.info(
+        f"Erähaku valmis. Kesto: {total_search_time:.4f} sekuntia "
+        f"({total_search_time / len(sorted_osiot):.4f} s / osio)."
     )
 
-    for i, (osio_nro, haku) in enumerate(sorted_osiot):
-        log_header(f"Käsitellään osio {i+1}/{len(sorted_osiot)}: {osio_nro}")
-        
-        haku_alku = time.time()
-        tulokset = etsi_merkityksen_mukaan(
-            haku, top_k=HAKUTULOSTEN_MAARA_PER_TEEMA
-        )
-        haku_loppu = time.time()
-        
-        kesto = haku_loppu - haku_alku
-        total_search_time += kesto
-
-        logging.info(f"Haku valmis. Kesto: {kesto:.4f} sekuntia. Löydettiin {len(tulokset)} jaetta.")
-
-        if tulokset:
-            for tulos in tulokset:
-                jae_viite_teksti = f"- {tulos['viite']}: \"{tulos['teksti']}\""
-                jae_kartta_tuloksille[osio_nro].append(jae_viite_teksti)
+    for (osio_nro, _), tulokset in zip(sorted_osiot, kaikki_tulokset):
+        logging.info(f"Osio {osio_nro}: löydettiin {len(tulokset)} jaetta.")
+        for tulos in tulokset:
+            jae_viite_teksti = f"- {tulos['viite']}: \"{tulos['teksti']}\""
+            jae_kartta_tuloksille[osio_nro].append(jae_viite_teksti)
 
     total_end_time = time.time()
     log_header("DIAGNOSTIIKAN YHTEENVETO")
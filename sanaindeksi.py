@@ -0,0 +1,147 @@
+# sanaindeksi.py (Versio 1.0 - BM25-käänteisindeksi jaeteksteille)
+import json
+import logging
+import os
+import re
+from collections import Counter
+import numpy as np
+
+from jaevarasto import JAEVARASTO_HAKEMISTO, Jaevarasto
+
+# --- MÄÄRITYKSET ---
+SANAINDEKSI_HAKEMISTO = "D:/Python_AI/Raamattu-tutkija-data/sanaindeksi"
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Reciprocal rank fusion: pisteet = Σ 1 / (RRF_K + sija).
+RRF_K = 60
+
+SANASTO_TIEDOSTO = "sanasto.json"
+ALUT_TIEDOSTO = "postaus_alut.npy"
+JAET_TIEDOSTO = "postaus_jaet.npy"
+PAINOT_TIEDOSTO = "postaus_painot.npy"
+
+_SANA = re.compile(r"\w+")
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] - %(message)s",
+    datefmt="%H:%M:%S",
+)
+
+
+def sanaksi(teksti: str) -> list[str]:
+    """Pilkkoo tekstin pienaakkosiksi sanoiksi."""
+    return _SANA.findall(teksti.lower())
+
+
+def rakenna_sanaindeksi(jaevarasto: Jaevarasto, hakemisto: str = SANAINDEKSI_HAKEMISTO):
+    """
+    Rakentaa jaevaraston teksteistä käänteisindeksin. Postauslistat ovat
+    CSR-muodossa: sanan t jakeet ovat jaet[alut[t]:alut[t+1]], ja painoihin
+    on laskettu valmiiksi koko BM25-termi (idf · tf-normalisointi), joten
+    haku on pelkkää yhteenlaskua. Jaetunnisteet ovat samat kuin FAISS-indeksissä.
+    """
+    logging.info("Rakennetaan BM25-sanaindeksiä...")
+    os.makedirs(hakemisto, exist_ok=True)
+
+    postaukset = {}
+    pituudet = np.zeros(len(jaevarasto), dtype=np.float32)
+    for jae_id in range(len(jaevarasto)):
+        sanat = sanaksi(jaevarasto.teksti(jae_id))
+        pituudet[jae_id] = len(sanat)
+        for sana, maara in Counter(sanat).items():
+            postaukset.setdefault(sana, []).append((jae_id, maara))
+
+    keskipituus = float(pituudet.mean()) if len(pituudet) else 0.0
+    jae_maara = len(jaevarasto)
+    sanasto = sorted(postaukset)
+    alut = np.zeros(len(sanasto) + 1, dtype=np.int64)
+    jaet, painot = [], []
+    for t, sana in enumerate(sanasto):
+        lista = postaukset[sana]
+        idf = np.log(1 + (jae_maara - len(lista) + 0.5) / (len(lista) + 0.5))
+        for jae_id, tf in lista:
+            normi = BM25_K1 * (1 - BM25_B + BM25_B * pituudet[jae_id] / keskipituus)
+            jaet.append(jae_id)
+            painot.append(idf * tf * (BM25_K1 + 1) / (tf + normi))
+        alut[t + 1] = len(jaet)
+
+    np.save(os.path.join(hakemisto, ALUT_TIEDOSTO), alut)
+    np.save(os.path.join(hakemisto, JAET_TIEDOSTO), np.array(jaet, dtype=np.int32))
+    np.save(os.path.join(hakemisto, PAINOT_TIEDOSTO), np.array(painot, dtype=np.float32))
+    with open(os.path.join(hakemisto, SANASTO_TIEDOSTO), "w", encoding="utf-8") as f:
+        json.dump({"jakeita": jae_maara, "sanat": sanasto}, f, ensure_ascii=False)
+    logging.info(
+        f"Sanaindeksi tallennettu hakemistoon '{hakemisto}': "
+        f"{len(sanasto)} sanaa, {len(jaet)} postausta."
+    )
+
+
+def sanaindeksin_tiedostot(hakemisto: str = SANAINDEKSI_HAKEMISTO) -> list[str]:
+    """Palauttaa sanaindeksin tiedostopolut (esim. versiotunnistetta varten)."""
+    return [
+        os.path.join(hakemisto, nimi)
+        for nimi in (SANASTO_TIEDOSTO, ALUT_TIEDOSTO, JAET_TIEDOSTO, PAINOT_TIEDOSTO)
+    ]
+
+
+def yhdista_rrf(sijoitukset: list[list[int]], k: int = RRF_K) -> list[int]:
+    """Yhdistää tunnistelistat reciprocal rank fusionilla parhaasta alkaen."""
+    pisteet = {}
+    for lista in sijoitukset:
+        for sija, tunniste in enumerate(lista):
+            pisteet[tunniste] = pisteet.get(tunniste, 0.0) + 1.0 / (k + sija + 1)
+    return sorted(pisteet, key=pisteet.get, reverse=True)
+
+
+class Sanaindeksi:
+    """
+    Muistikartoitettu BM25-sanaindeksi. Jos normalisoija (Sananormalisoija)
+    on annettu, indeksistä puuttuvat kyselyn sanat korvataan niiden
+    sanastomuodoista yleisimmällä indeksiin kuuluvalla.
+    """
+
+    def __init__(self, hakemisto: str = SANAINDEKSI_HAKEMISTO, normalisoija=None):
+        self.normalisoija = normalisoija
+        with open(os.path.join(hakemisto, SANASTO_TIEDOSTO), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.jakeita = data["jakeita"]
+        self.sanasto = {sana: t for t, sana in enumerate(data["sanat"])}
+        self.alut = np.load(os.path.join(hakemisto, ALUT_TIEDOSTO), mmap_mode="r")
+        self.jaet = np.load(os.path.join(hakemisto, JAET_TIEDOSTO), mmap_mode="r")
+        self.painot = np.load(os.path.join(hakemisto, PAINOT_TIEDOSTO), mmap_mode="r")
+        logging.info(f"Sanaindeksi ladattu: {len(self.sanasto)} sanaa, {self.jakeita} jaetta.")
+
+    def sanat(self, kysely: str) -> list[str]:
+        """Palauttaa kyselyn sanat indeksin muodoissa; tuntemattomat ohitetaan."""
+        sanat = []
+        for sana in sanaksi(kysely):
+            if sana not in self.sanasto and self.normalisoija is not None:
+                muodot = [m for m in self.normalisoija.normalisoi(sana) if m in self.sanasto]
+                if muodot:
+                    sana = max(muodot, key=self._yleisyys)
+            if sana in self.sanasto:
+                sanat.append(sana)
+        return list(dict.fromkeys(sanat))
+
+    def _yleisyys(self, sana: str) -> int:
+        """Sanan dokumenttifrekvenssi eli postauslistan pituus."""
+        t = self.sanasto[sana]
+        return int(self.alut[t + 1] - self.alut[t])
+
+    def hae(self, kysely: str, k: int) -> list[int]:
+        """Palauttaa k parhaan jakeen tunnisteet BM25-pisteiden mukaan."""
+        pisteet = np.zeros(self.jakeita, dtype=np.float32)
+        for sana in self.sanat(kysely):
+            t = self.sanasto[sana]
+            alku, loppu = self.alut[t], self.alut[t + 1]
+            # Sanan jakeet ovat yksilöllisiä, joten indeksoitu lisäys on turvallinen.
+            pisteet[self.jaet[alku:loppu]] += self.painot[alku:loppu]
+        osumat = np.flatnonzero(pisteet)
+        if len(osumat) > k:
+            osumat = osumat[np.argpartition(-pisteet[osumat], k - 1)[:k]]
+        return osumat[np.argsort(-pisteet[osumat], kind="stable")].tolist()
+
+
+if __name__ == "__main__":
+    rakenna_sanaindeksi(Jaevarasto(JAEVARASTO_HAKEMISTO))
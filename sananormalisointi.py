@@ -0,0 +1,175 @@
+# sananormalisointi.py (Versio 1.0 - Kirjoitusvirhe- ja taivutussietoinen sanahaku)
+import bisect
+import hashlib
+import json
+import logging
+import os
+import numpy as np
+
+from strategiat import STRATEGIA_SANAKIRJA
+
+# --- MÄÄRITYKSET ---
+SANAKIRJA_TIEDOSTO = "bible_dictionary.json"
+SANASTOINDEKSI_TIEDOSTO = "D:/Python_AI/Raamattu-tutkija-data/sanastoindeksi.npz"
+# Symmetrisen poiston syvyys: yksi poisto kattaa lisäyksen, poiston,
+# korvauksen ja vierekkäisten merkkien vaihdon.
+POISTOJEN_SYVYYS = 1
+# Lyhyitä sanoja ei korjata, koska yhden merkin muutos vaihtaa ne helposti toiseksi sanaksi.
+KORJATTAVAN_MIN_PITUUS = 4
+# Taivutusmuodot: sanastosta haetaan sanat, joilla on yhteinen vartalo (etuliite).
+VARTALON_MIN_PITUUS = 5
+VARTALON_MAX_PAATE = 4
+TAIVUTUSMUOTOJA_ENINTAAN = 5
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] - %(message)s",
+    datefmt="%H:%M:%S",
+)
+
+
+def _tiiviste(teksti: str) -> int:
+    """Prosessista riippumaton 64-bittinen tiiviste poistoavaimille."""
+    return int.from_bytes(
+        hashlib.blake2b(teksti.encode("utf-8"), digest_size=8).digest(), "little"
+    )
+
+
+def _poistot(sana: str, syvyys: int = POISTOJEN_SYVYYS) -> set[str]:
+    """Palauttaa sanan ja kaikki siitä enintään syvyys merkin poistolla saadut muodot."""
+    muodot = {sana}
+    reuna = {sana}
+    for _ in range(syvyys):
+        reuna = {m[:i] + m[i + 1:] for m in reuna for i in range(len(m))}
+        muodot |= reuna
+    return muodot
+
+
+def muokkausetaisyys(a: str, b: str) -> int:
+    """Damerau-Levenshtein-etäisyys (optimaalinen merkkijonon kohdistus)."""
+    edellinen2, edellinen = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        nykyinen = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            hinta = a[i - 1] != b[j - 1]
+            nykyinen[j] = min(
+                edellinen[j] + 1, nykyinen[j - 1] + 1, edellinen[j - 1] + hinta
+            )
+            if (i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                nykyinen[j] = min(nykyinen[j], edellinen2[j - 2] + 1)
+        edellinen2, edellinen = edellinen, nykyinen
+    return edellinen[-1]
+
+
+def rakenna_sanastoindeksi(sanat, tiedosto: str = SANASTOINDEKSI_TIEDOSTO):
+    """
+    Rakentaa sanalistasta symmetrisen poiston indeksin ja tallentaa sen
+    yhteen .npz-tiedostoon: aakkosjärjestetyt sanat yhtenä UTF-8-massana,
+    poistoavainten järjestetyt 64-bittiset tiivisteet sekä CSR-muotoiset
+    sanatunnisteet jokaiselle avaimelle.
+    """
+    sanat = sorted({s.strip().lower() for s in sanat if s and s.strip()})
+    logging.info(f"Rakennetaan sanastoindeksiä {len(sanat)} sanasta...")
+
+    avaimet = {}
+    for sana_id, sana in enumerate(sanat):
+        if len(sana) < KORJATTAVAN_MIN_PITUUS:
+            continue
+        for muoto in _poistot(sana):
+            avaimet.setdefault(_tiiviste(muoto), []).append(sana_id)
+
+    tiivisteet = np.array(sorted(avaimet), dtype=np.uint64)
+    alut = np.zeros(len(tiivisteet) + 1, dtype=np.int64)
+    sana_idt = []
+    for i, tiiviste in enumerate(tiivisteet.tolist()):
+        sana_idt.extend(avaimet[tiiviste])
+        alut[i + 1] = len(sana_idt)
+
+    kansio = os.path.dirname(tiedosto)
+    if kansio:
+        os.makedirs(kansio, exist_ok=True)
+    np.savez(
+        tiedosto,
+        sanat=np.frombuffer("\n".join(sanat).encode("utf-8"), dtype=np.uint8),
+        tiivisteet=tiivisteet,
+        alut=alut,
+        sana_idt=np.array(sana_idt, dtype=np.int32),
+    )
+    logging.info(
+        f"Sanastoindeksi tallennettu: '{tiedosto}' "
+        f"({len(tiivisteet)} poistoavainta, {os.path.getsize(tiedosto) / 2**20:.1f} MT)."
+    )
+
+
+def rakenna_sanakirjasta(sanakirja: str = SANAKIRJA_TIEDOSTO,
+                         tiedosto: str = SANASTOINDEKSI_TIEDOSTO):
+    """Rakentaa indeksin bible_dictionary.json-listasta ja strategioiden avainsanoista."""
+    with open(sanakirja, "r", encoding="utf-8") as f:
+        sanat = json.load(f)
+    rakenna_sanastoindeksi([*sanat, *STRATEGIA_SANAKIRJA], tiedosto)
+
+
+class Sananormalisoija:
+    """
+    Kuvaa kyselyn sanat sanaston muotoihin. Sanastosta löytyvä sana
+    palautetaan sellaisenaan; muuten haetaan yhden muokkauksen päässä olevat
+    sanat symmetrisen poiston indeksistä ja lopuksi samalla vartalolla
+    alkavat taivutusmuodot. Indeksi ladataan valmiista binääritiedostosta.
+    """
+
+    def __init__(self, tiedosto: str = SANASTOINDEKSI_TIEDOSTO):
+        with np.load(tiedosto) as data:
+            self.sanat = data["sanat"].tobytes().decode("utf-8").split("\n")
+            self.tiivisteet = data["tiivisteet"]
+            self.alut = data["alut"]
+            self.sana_idt = data["sana_idt"]
+        self._sanasto = set(self.sanat)
+        self._valimuisti = {}
+        logging.info(f"Sanastoindeksi ladattu: {len(self.sanat)} sanaa.")
+
+    def __contains__(self, sana: str) -> bool:
+        return sana in self._sanasto
+
+    def _korjaukset(self, sana: str) -> list[str]:
+        """Sanaston sanat, joiden muokkausetäisyys sanaan on pienin (enintään 1)."""
+        ehdokkaat = set()
+        for muoto in _poistot(sana):
+            tiiviste = np.uint64(_tiiviste(muoto))
+            i = int(np.searchsorted(self.tiivisteet, tiiviste))
+            if i < len(self.tiivisteet) and self.tiivisteet[i] == tiiviste:
+                ehdokkaat.update(self.sana_idt[self.alut[i]:self.alut[i + 1]].tolist())
+        etaisyydet = {
+            self.sanat[s]: muokkausetaisyys(sana, self.sanat[s]) for s in ehdokkaat
+        }
+        paras = min(etaisyydet.values(), default=None)
+        if paras is None or paras > POISTOJEN_SYVYYS:
+            return []
+        return sorted(s for s, e in etaisyydet.items() if e == paras)
+
+    def _taivutusmuodot(self, sana: str) -> list[str]:
+        """Sanaston lyhyimmät sanat, joilla on pisin yhteinen vartalo sanan kanssa."""
+        lyhin = max(VARTALON_MIN_PITUUS, len(sana) - VARTALON_MAX_PAATE)
+        for pituus in range(len(sana), lyhin - 1, -1):
+            vartalo = sana[:pituus]
+            alku = bisect.bisect_left(self.sanat, vartalo)
+            loppu = bisect.bisect_left(self.sanat, vartalo + "\uffff")
+            if loppu > alku:
+                return sorted(self.sanat[alku:loppu], key=len)[:TAIVUTUSMUOTOJA_ENINTAAN]
+        return []
+
+    def normalisoi(self, sana: str) -> list[str]:
+        """Palauttaa sanan sanastomuodot parhaasta alkaen (tyhjä, jos ei vastinetta)."""
+        sana = sana.lower()
+        if sana in self._sanasto:
+            return [sana]
+        if sana in self._valimuisti:
+            return self._valimuisti[sana]
+        muodot = []
+        if len(sana) >= KORJATTAVAN_MIN_PITUUS:
+            muodot = self._korjaukset(sana) or self._taivutusmuodot(sana)
+        self._valimuisti[sana] = muodot
+        return muodot
+
+
+if __name__ == "__main__":
+    rakenna_sanakirjasta()
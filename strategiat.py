@@ -0,0 +1,251 @@
+# strategiat.py (Versio 1.0 - Esilasketut strategialaajennukset)
+import json
+import logging
+import re
+import numpy as np
+
+# --- MÄÄRITYKSET ---
+# Yhdistetyn kyselyvektorin painot: elävä kysely vs. strategian vektori.
+KYSELYN_PAINO = 0.5
+# Strategian vektori: selitteen ja siemenjakeen painotettu keskiarvo.
+SELITTEEN_PAINO = 0.5
+SIEMENEN_PAINO = 0.5
+# Kuinka monta lähintä superjaetta yhdistetään strategiattomaan kyselyyn.
+AUTOMAATTISET_SIEMENET = 1
+
+# --- STRATEGIAT ---
+STRATEGIA_SANAKIRJA = {
+    "jännite": (
+        "Hae Raamatusta kohtia, jotka kuvaavat rakentavaa erimielisyyttä, "
+        "toisiaan täydentäviä rooleja tai sitä, miten erilaisuus johtaa "
+        "hengelliseen kasvuun ja terveen jännitteen kautta parempaan lopputulokseen."
+    ),
+    "tasapaino": (
+        "Etsi kohtia, jotka käsittelevät tasapainoa, harmoniaa tai oikeaa "
+        "suhdetta kahden eri asian, kuten työn ja levon, tai totuuden "
+        "ja rakkauden, välillä."
+    ),
+    "profeetta": (
+        "Etsi kohtia, jotka kuvaavat profeetallisen ja pastoraalisen tai "
+        "opettavan roolin välistä dynamiikkaa, yhteistyötä tai jännitettä "
+        "seurakunnassa."
+    ),
+    "paimen": (
+        "Etsi kohtia, jotka kuvaavat profeetallisen ja pastoraalisen tai "
+        "opettavan roolin välistä dynamiikkaa, yhteistyötä tai jännitettä "
+        "seurakunnassa."
+    ),
+    "pappi": (
+        "Etsi kohtia, jotka kuvaavat profeetallisen ja pastoraalisen tai "
+        "opettavan roolin välistä dynamiikkaa, yhteistyötä tai jännitettä "
+        "seurakunnassa."
+    ),
+    "koetinkivi": (
+        "Etsi jakeita, jotka käsittelevät luonteen testaamista ja koettelemista "
+        "erityisissä olosuhteissa, kuten vastoinkäymisissä, menestyksessä, "
+        "kritiikin alla tai näkymättömyydessä."
+    ),
+    "testi": (
+        "Etsi jakeita, jotka käsittelevät luonteen testaamista ja koettelemista "
+        "erityisissä olosuhteissa, kuten vastoinkäymisissä, menestyksessä, "
+        "kritiikin alla tai näkymättömyydessä."
+    ),
+    "näkymättömyys": (
+        "Hae jakeita, jotka käsittelevät palvelemista ilman ihmisten "
+        "näkemystä, kiitosta tai tunnustusta, keskittyen Jumalan palkkioon "
+        "ja oikeaan sydämen asenteeseen."
+    ),
+    "kritiikki": (
+        "Etsi jakeita, jotka opastavat, miten suhtautua oikeutetusti "
+        "tai epäoikeutetusti saatuun kritiikkiin, arvosteluun tai "
+        "nuhteeseen säilyttäen nöyrän ja opetuslapseen sopivan sydämen."
+    ),
+    "intohimo": (
+        "Hae jakeita, jotka kuvaavat sydämen paloa, innostusta, "
+        "syvää mielenkiintoa tai Jumalan antamaa tahtoa ja paloa "
+        "tiettyä asiaa tai tehtävää kohtaan."
+    ),
+    "kyvyt": (
+        "Etsi kohtia, jotka käsittelevät luontaisia, synnynnäisiä "
+        "taitoja, lahjakkuutta ja osaamista, jotka Jumala on ihmiselle antanut "
+        "ja joita voidaan käyttää hänen kunniakseen."
+    )
+}
+
+# UUSI MANUAALINEN KARTTA STRATEGIOIDEN JA SIEMENJAKEIDEN VÄLILLÄ
+STRATEGIA_SIEMENJAE_KARTTA = {
+    "jännite": "Room. 12:4-5",
+    "tasapaino": "Saarn. 3:1",
+    "profeetta": "Ef. 4:11-12",
+    "paimen": "Ef. 4:11-12",
+    "pappi": "Ef. 4:11-12",
+    "koetinkivi": "Jaak. 1:2-4",
+    "testi": "Jaak. 1:2-4",
+    "näkymättömyys": "Fil. 2:3-4",
+    "kritiikki": "Miika 6:8",
+    "intohimo": "Room. 12:1-2",
+    "kyvyt": "1. Piet. 4:10",
+}
+
+
+# Avainsanojen vartalot taivutusmuotoineen (esim. jännite -> jännitteen,
+# kyvyt -> kyky, pappi -> papin). Puuttuva avainsana haetaan sellaisenaan.
+STRATEGIA_VARTALOT = {
+    "jännite": r"jännit(?:e|te)",
+    "profeetta": r"profee(?:tt|t)",
+    "pappi": r"pap(?:p|i)",
+    "koetinkivi": r"koetinkiv",
+    "testi": r"test(?:i|e)",
+    "näkymättömyys": r"näkymättömy",
+    "kritiikki": r"kritiik",
+    "kyvyt": r"ky(?:ky|vy)",
+}
+
+
+def rakenna_avainsanahaku(avainsanat: list[str]) -> re.Pattern:
+    """
+    Kokoaa kaikki avainsanat yhdeksi säännölliseksi lausekkeeksi. Osuman
+    pitää alkaa sanan alusta, ja vartalon perään sallitaan taivutuspääte.
+    Kunkin avainsanan osuma tunnistetaan nimetystä ryhmästä s<järjestysnumero>.
+    """
+    vaihtoehdot = "|".join(
+        f"(?P<s{i}>{STRATEGIA_VARTALOT.get(sana, re.escape(sana))})"
+        for i, sana in enumerate(avainsanat)
+    )
+    return re.compile(rf"(?<!\w)(?:{vaihtoehdot})\w*", re.IGNORECASE)
+
+
+class Siemenhaku:
+    """
+    Superjakeiden pieni FAISS-indeksi (luo_siemenjae_indeksi.py). Jokainen
+    rivi on yksi superjae tai -väli, jonka koko teksti on vektoroitu, joten
+    lähimmät siemenjakeet löytyvät mille tahansa kyselylle alle millisekunnissa.
+    """
+
+    def __init__(self, indeksi_tiedosto: str, kartta_tiedosto: str):
+        from vektori_indeksi import Hakuindeksi
+
+        self.indeksi = Hakuindeksi(indeksi_tiedosto)
+        with open(kartta_tiedosto, "r", encoding="utf-8") as f:
+            kartta = json.load(f)
+        self.viitteet = [kartta[str(i)] for i in range(len(kartta))]
+        # Pieni tarkka indeksi: vektorit pidetään muistissa yhdistämistä varten.
+        self.vektorit = self.indeksi.indeksi.reconstruct_n(0, self.indeksi.ntotal)
+
+    def hae(self, kysely_vektorit: np.ndarray, k: int) -> list[list[int]]:
+        """Palauttaa jokaiselle kyselylle k lähimmän superjakeen rivinumerot."""
+        _, indeksit = self.indeksi.hae(kysely_vektorit, min(k, self.indeksi.ntotal))
+        return [[int(i) for i in rivi if i >= 0] for rivi in indeksit]
+
+
+class Strategiakerros:
+    """
+    Strategioiden esilaskettu kerros. Avainsanat tunnistetaan yhdellä
+    käännetyllä lausekkeella, ja jokaisen strategian selite ja siemenjae
+    vektoroidaan kerran käynnistyksessä. Hakuhetkellä vektoroidaan vain
+    alkuperäinen kysely, jota painotetaan strategian vektorilla, sen sijaan
+    että koko pitkä "superkysely" vektoroitaisiin ja pisteytettäisiin joka kerta.
+    """
+
+    def __init__(self, model, jaevarasto, erakoko: int = 32,
+                 siemenhaku: Siemenhaku | None = None,
+                 automaattiset_siemenet: int = AUTOMAATTISET_SIEMENET,
+                 normalisoija=None):
+        self.siemenhaku = siemenhaku
+        self.automaattiset_siemenet = automaattiset_siemenet
+        # Valinnainen Sananormalisoija kirjoitusvirheiden korjaamiseen.
+        self.normalisoija = normalisoija
+        self.avainsanat = list(STRATEGIA_SANAKIRJA)
+        self._haku = rakenna_avainsanahaku(self.avainsanat)
+
+        selitteet = list(dict.fromkeys(STRATEGIA_SANAKIRJA.values()))
+        siemenviitteet = list(dict.fromkeys(STRATEGIA_SIEMENJAE_KARTTA.values()))
+        siementekstit = [jaevarasto.teksti_viitteella(v) for v in siemenviitteet]
+        vektorit = np.asarray(model.encode(
+            selitteet + siementekstit, batch_size=erakoko, show_progress_bar=False
+        ), dtype=np.float32)
+        selite_vektorit = dict(zip(selitteet, vektorit[:len(selitteet)]))
+        siemen_vektorit = {
+            viite: vektori for viite, teksti, vektori in zip(
+                siemenviitteet, siementekstit, vektorit[len(selitteet):]
+            ) if teksti
+        }
+
+        self.vektorit = {}
+        for avainsana, selite in STRATEGIA_SANAKIRJA.items():
+            siemen = siemen_vektorit.get(STRATEGIA_SIEMENJAE_KARTTA.get(avainsana))
+            if siemen is None:
+                self.vektorit[avainsana] = selite_vektorit[selite]
+            else:
+                self.vektorit[avainsana] = (
+                    SELITTEEN_PAINO * selite_vektorit[selite] + SIEMENEN_PAINO * siemen
+                ) / (SELITTEEN_PAINO + SIEMENEN_PAINO)
+        self.ehdokaspoolit = {}
+        logging.info(
+            f"Strategiakerros valmis: {len(self.vektorit)} strategiaa, "
+            f"{len(siemen_vektorit)} siemenjaetta vektoroitu."
+        )
+
+    def tunnista(self, kysely: str) -> str | None:
+        """
+        Palauttaa kyselyn aktivoiman strategian avainsanan tai None. Jos
+        osumia on useita, valitaan sanakirjassa ensimmäisenä oleva. Ellei
+        kysely sellaisenaan osu, haetaan uudelleen sen sanojen sanastomuodoista,
+        jolloin esim. "jänite" tai "kritikki" aktivoi strategian.
+        """
+        osumat = [int(m.lastgroup[1:]) for m in self._haku.finditer(kysely)]
+        if not osumat and self.normalisoija is not None:
+            korjattu = " ".join(
+                muoto for sana in re.findall(r"\w+", kysely)
+                for muoto in self.normalisoija.normalisoi(sana)
+            )
+            osumat = [int(m.lastgroup[1:]) for m in self._haku.finditer(korjattu)]
+        if not osumat:
+            return None
+        return self.avainsanat[min(osumat)]
+
+    def yhdista(self, kysely_vektorit: np.ndarray, avainsanat: list) -> np.ndarray:
+        """
+        Painottaa strategian aktivoineiden kyselyiden vektorit strategian
+        vektorilla. Muille kyselyille haetaan siemenindeksistä lähimmät
+        superjakeet, joiden vektoreilla kyselyä painotetaan samalla tavalla.
+        """
+        yhdistetyt = np.array(kysely_vektorit, dtype=np.float32)
+        ilman_strategiaa = [r for r, a in enumerate(avainsanat) if a is None]
+        laajennukset = {r: self.vektorit[a] for r, a in enumerate(avainsanat) if a is not None}
+
+        if self.siemenhaku is not None and ilman_strategiaa and self.automaattiset_siemenet > 0:
+            siemenet = self.siemenhaku.hae(
+                yhdistetyt[ilman_strategiaa], self.automaattiset_siemenet
+            )
+            for rivi, siemenrivit in zip(ilman_strategiaa, siemenet):
+                if not siemenrivit:
+                    continue
+                logging.info(
+                    "Automaattinen siemenjae: "
+                    f"{', '.join(self.siemenhaku.viitteet[i] for i in siemenrivit)}"
+                )
+                laajennukset[rivi] = self.siemenhaku.vektorit[siemenrivit].mean(axis=0)
+
+        for rivi, vektori in laajennukset.items():
+            yhdistetyt[rivi] = (
+                KYSELYN_PAINO * yhdistetyt[rivi] + (1 - KYSELYN_PAINO) * vektori
+            )
+        return yhdistetyt
+
+    def laske_ehdokaspoolit(self, paaindeksi, maara: int):
+        """
+        Hakee kerran jokaiselle strategialle sen vektorin lähimmät jakeet,
+        jotka lisätään hakuhetkellä strategian kyselyjen ehdokkaisiin.
+        """
+        if maara <= 0:
+            return
+        _, indeksit = paaindeksi.hae(
+            np.stack([self.vektorit[a] for a in self.avainsanat]),
+            min(maara, paaindeksi.ntotal),
+        )
+        self.ehdokaspoolit = {
+            avainsana: [int(i) for i in rivi if i >= 0]
+            for avainsana, rivi in zip(self.avainsanat, indeksit)
+        }
+        logging.info(f"Strategioille laskettu {maara} jakeen ehdokaspoolit.")
@@ -0,0 +1,258 @@
+# suorituskyky.py (Versio 1.0 - Toistettavat suorituskykymittaukset ja regressiovertailu)
+import argparse
+import json
+import logging
+import sys
+import time
+from datetime import datetime
+import numpy as np
+
+from mittarit import VAIHEET
+from syote import SYOTE_TIEDOSTO, jarjestetyt_osiot, lue_syote_tiedosto
+
+# --- MÄÄRITYKSET ---
+TULOS_TIEDOSTO = "suorituskyky.json"
+PERUSTASO_TIEDOSTO = "suorituskyky_perustaso.json"
+TOISTOT = 20
+TOP_K_ARVOT = (1, 5, 15, 50, 100)
+OLETUS_TOP_K = 15
+# Regressio: p50/p95 hidastuu yli kynnyksen verran ja vähintään minimieron.
+REGRESSIO_KYNNYS = 0.20
+REGRESSIO_MIN_MS = 2.0
+MUISTI_KYNNYS = 0.10
+
+STRATEGIA_KYSELYT = (
+    "Miten jännite eri kutsumusten välillä voi rakentaa seurakuntaa?",
+    "Profeetta ja pappi: kaksi tapaa palvella Jumalaa",
+    "Kritiikki koetinkivenä: miten ottaa palaute vastaan?",
+)
+PERUSKYSELYT = (
+    "Rakkaus lähimmäistä kohtaan arjen valinnoissa",
+    "Anteeksianto ja sovinto riitaantuneiden välillä",
+    "Rukouksen voima vaikeina aikoina",
+)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] - %(message)s",
+    datefmt="%H:%M:%S",
+)
+
+
+def huippumuisti_mt() -> float | None:
+    """Prosessin suurin käytetty fyysinen muisti (peak RSS) megatavuina."""
+    try:
+        import resource
+        maksimi = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux ilmoittaa kilotavuina, macOS tavuina.
+        return maksimi / 2**20 if sys.platform == "darwin" else maksimi / 2**10
+    except ImportError:
+        pass
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class _Muistilaskurit(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        laskurit = _Muistilaskurit()
+        laskurit.cb = ctypes.sizeof(laskurit)
+        prosessi = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(
+            prosessi, ctypes.byref(laskurit), laskurit.cb
+        ):
+            return laskurit.PeakWorkingSetSize / 2**20
+    except (AttributeError, OSError):
+        pass
+    return None
+
+
+def tilastot(arvot: list[float]) -> dict:
+    """Latenssien yhteenveto millisekunteina."""
+    if not arvot:
+        return {}
+    a = np.asarray(arvot, dtype=np.float64)
+    return {
+        "n": len(a),
+        "p50": float(np.percentile(a, 50)),
+        "p95": float(np.percentile(a, 95)),
+        "p99": float(np.percentile(a, 99)),
+        "ka": float(a.mean()),
+        "min": float(a.min()),
+        "max": float(a.max()),
+    }
+
+
+def mittaa_skenaario(hakukone, nimi: str, haut: list, toistot: int = TOISTOT) -> dict:
+    """
+    Ajaa haut (lista (kyselyt, top_k) -pareja) toistot kertaa ja palauttaa
+    kokonaislatenssin ja vaiheiden ajat yhden haun tarkkuudella. Vaiheiden
+    ajat saadaan hakukoneen mittarikuuntelijalta.
+    """
+    latenssit = []
+    vaiheet = {vaihe: [] for vaihe in VAIHEET}
+    jaljet = []
+    hakukone.mittarit.lisaa_kuuntelija(jaljet.append)
+    try:
+        for _ in range(toistot):
+            for kyselyt, top_k in haut:
+                alku = time.perf_counter()
+                hakukone.etsi_batch(list(kyselyt), top_k)
+                latenssit.append((time.perf_counter() - alku) * 1000)
+    finally:
+        hakukone.mittarit.poista_kuuntelija(jaljet.append)
+    for jalki in jaljet:
+        ajat = jalki.vaiheiden_ajat()
+        for vaihe in VAIHEET:
+            vaiheet[vaihe].append(ajat.get(vaihe, 0.0))
+    tulos = {
+        "hakuja": len(latenssit),
+        "latenssi_ms": tilastot(latenssit),
+        "vaiheet_ms": {v: tilastot(a) for v, a in vaiheet.items() if any(a)},
+    }
+    logging.info(
+        f"{nimi}: p50 {tulos['latenssi_ms']['p50']:.1f} ms, "
+        f"p95 {tulos['latenssi_ms']['p95']:.1f} ms, p99 {tulos['latenssi_ms']['p99']:.1f} ms."
+    )
+    return tulos
+
+
+def aja_mittaukset(asetukset, toistot: int = TOISTOT,
+                   syote_tiedosto: str = SYOTE_TIEDOSTO) -> dict:
+    """
+    Ajaa kaikki skenaariot: kylmäkäynnistys, lämmin yksittäinen haku,
+    monen osion tutkielma, top_k 1-100 sekä strategia- ja peruskyselyt.
+    Välimuistien kannattaa olla pois käytöstä, jotta toistot mittaavat laskentaa.
+    """
+    from hakukone import Hakukone
+
+    hakulauseet, _ = lue_syote_tiedosto(syote_tiedosto)
+    osiot = [haku for _, haku in jarjestetyt_osiot(hakulauseet or {})]
+    skenaariot = {}
+
+    hakukone = Hakukone(asetukset)
+    alku = time.perf_counter()
+    hakukone.lataa()
+    lataus_ms = (time.perf_counter() - alku) * 1000
+    skenaariot["kylmakaynnistys"] = {"latenssi_ms": {"n": 1, "p50": lataus_ms,
+                                                     "p95": lataus_ms, "p99": lataus_ms}}
+    logging.info(f"kylmakaynnistys: {lataus_ms:.0f} ms.")
+
+    try:
+        # Ensimmäinen haku lataa mallin laskentagraafit; sitä ei lasketa mukaan.
+        hakukone.etsi(PERUSKYSELYT[0], OLETUS_TOP_K)
+        skenaariot["lammin_yksittainen"] = mittaa_skenaario(
+            hakukone, "lammin_yksittainen", [([PERUSKYSELYT[0]], OLETUS_TOP_K)], toistot
+        )
+        if osiot:
+            skenaariot["monen_osion_tutkielma"] = mittaa_skenaario(
+                hakukone, "monen_osion_tutkielma", [(osiot, OLETUS_TOP_K)],
+                max(1, toistot // 4),
+            )
+        for top_k in TOP_K_ARVOT:
+            skenaariot[f"top_k_{top_k}"] = mittaa_skenaario(
+                hakukone, f"top_k_{top_k}", [([PERUSKYSELYT[0]], top_k)], toistot
+            )
+        skenaariot["strategiakysely"] = mittaa_skenaario(
+            hakukone, "strategiakysely",
+            [([k], OLETUS_TOP_K) for k in STRATEGIA_KYSELYT], toistot,
+        )
+        skenaariot["peruskysely"] = mittaa_skenaario(
+            hakukone, "peruskysely", [([k], OLETUS_TOP_K) for k in PERUSKYSELYT], toistot,
+        )
+    finally:
+        hakukone.sulje()
+
+    return {
+        "aika": datetime.now().isoformat(timespec="seconds"),
+        "toistot": toistot,
+        "asetukset": {
+            "hakutila": asetukset.hakutila,
+            "kvantisoi_upotus": asetukset.kvantisoi_upotus,
+            "kvantisoi_rerank": asetukset.kvantisoi_rerank,
+            "kayta_valimuisteja": asetukset.kayta_valimuisteja,
+            "embedding_malli": asetukset.embedding_malli,
+            "cross_encoder_malli": asetukset.cross_encoder_malli,
+        },
+        "huippumuisti_mt": huippumuisti_mt(),
+        "skenaariot": skenaariot,
+    }
+
+
+def vertaa_perustasoon(tulos: dict, perustaso: dict,
+                       kynnys: float = REGRESSIO_KYNNYS,
+                       min_ms: float = REGRESSIO_MIN_MS,
+                       muisti_kynnys: float = MUISTI_KYNNYS) -> list[dict]:
+    """Palauttaa skenaariot ja mittarit, jotka ovat hidastuneet perustasosta."""
+    regressiot = []
+    for nimi, skenaario in tulos["skenaariot"].items():
+        vanha = perustaso.get("skenaariot", {}).get(nimi)
+        if vanha is None:
+            continue
+        for mittari in ("p50", "p95"):
+            uusi_ms = skenaario["latenssi_ms"].get(mittari)
+            vanha_ms = vanha["latenssi_ms"].get(mittari)
+            if uusi_ms is None or vanha_ms is None:
+                continue
+            if uusi_ms > vanha_ms * (1 + kynnys) and uusi_ms - vanha_ms > min_ms:
+                regressiot.append({
+                    "skenaario": nimi, "mittari": mittari,
+                    "perustaso": vanha_ms, "nyt": uusi_ms, "muutos": uusi_ms / vanha_ms - 1,
+                })
+    uusi_mt, vanha_mt = tulos.get("huippumuisti_mt"), perustaso.get("huippumuisti_mt")
+    if uusi_mt and vanha_mt and uusi_mt > vanha_mt * (1 + muisti_kynnys):
+        regressiot.append({
+            "skenaario": "prosessi", "mittari": "huippumuisti_mt",
+            "perustaso": vanha_mt, "nyt": uusi_mt, "muutos": uusi_mt / vanha_mt - 1,
+        })
+    for r in regressiot:
+        logging.warning(
+            f"REGRESSIO {r['skenaario']} {r['mittari']}: {r['perustaso']:.1f} -> "
+            f"{r['nyt']:.1f} ({r['muutos']:+.0%})."
+        )
+    if not regressiot:
+        logging.info("Ei regressioita perustasoon verrattuna.")
+    return regressiot
+
+
+if __name__ == "__main__":
+    from hakukone import Hakuasetukset
+
+    parser = argparse.ArgumentParser(
+        description="Mittaa hakuputken suorituskyvyn ja vertaa tallennettuun perustasoon."
+    )
+    parser.add_argument("--toistot", type=int, default=TOISTOT)
+    parser.add_argument("--syote", default=SYOTE_TIEDOSTO)
+    parser.add_argument("--raportti", default=TULOS_TIEDOSTO)
+    parser.add_argument("--perustaso", default=PERUSTASO_TIEDOSTO)
+    parser.add_argument("--tallenna-perustaso", action="store_true",
+                        help="Tallentaa tämän ajon uudeksi perustasoksi.")
+    parser.add_argument("--valimuistit", action="store_true",
+                        help="Pitää pisteiden ja tulosten välimuistit käytössä.")
+    args = parser.parse_args()
+
+    asetukset = Hakuasetukset.ymparistosta(kayta_valimuisteja=args.valimuistit)
+    tulos = aja_mittaukset(asetukset, args.toistot, args.syote)
+
+    try:
+        with open(args.perustaso, "r", encoding="utf-8") as f:
+            tulos["regressiot"] = vertaa_perustasoon(tulos, json.load(f))
+    except FileNotFoundError:
+        logging.info(f"Perustasoa '{args.perustaso}' ei löytynyt, vertailu ohitetaan.")
+        tulos["regressiot"] = None
+
+    with open(args.raportti, "w", encoding="utf-8") as f:
+        json.dump(tulos, f, ensure_ascii=False, indent=4)
+    logging.info(f"Mittaustulokset tallennettu: '{args.raportti}'")
+    if args.tallenna_perustaso:
+        with open(args.perustaso, "w", encoding="utf-8") as f:
+            json.dump(tulos, f, ensure_ascii=False, indent=4)
+        logging.info(f"Perustaso päivitetty: '{args.perustaso}'")
+    sys.exit(1 if tulos["regressiot"] else 0)
@@ -0,0 +1,69 @@
+# syote.py (Versio 1.0 - Tutkielman syötetiedoston jäsennys)
+import logging
+import re
+
+SYOTE_TIEDOSTO = "syote.txt"
+# Kasvatetaan, kun jäsennys muuttaa hakulauseita; hakulauseilla viritetyt
+# parametrit (hakuparametrit.json) on silloin viritettävä uudelleen.
+JASENNYS_VERSIO = 2
+
+
+def jasenna_syote(sisalto: str):
+    """
+    Jäsentää tutkielman rakenteen vankasti. Sama jäsennys palvelee
+    käyttöliittymää ja komentorivityökaluja, joten kaikki lähettävät
+    hakukoneelle samat hakulauseet (ja osuvat samoihin välimuisteihin).
+    Palauttaa (pääotsikko, hakulauseet, otsikot, sisällysluettelo).
+    """
+    sisalto = sisalto.replace('\r\n', '\n')
+
+    paaotsikko_match = re.search(r"^(.*?)\n", sisalto)
+    paaotsikko = paaotsikko_match.group(1).strip() if paaotsikko_match else ""
+
+    sisallysluettelo_match = re.search(
+        r"Sisällysluettelo:(.*?)(?=\n\d\.|\Z)", sisalto, re.DOTALL
+    )
+    sisallysluettelo = sisallysluettelo_match.group(1).strip() if sisallysluettelo_match else ""
+
+    hakulauseet = {}
+    otsikot = {}
+    osiot = re.split(r'\n(?=\d\.\s)', sisalto)
+
+    for osio_teksti in osiot:
+        osio_teksti = osio_teksti.strip()
+        if not osio_teksti:
+            continue
+
+        rivit = osio_teksti.split('\n', 1)
+        otsikko = rivit[0].strip()
+        kuvaus = rivit[1].strip() if len(rivit) > 1 else ""
+
+        osio_match = re.match(r"^([\d\.]+)", otsikko)
+        if osio_match:
+            osio_nro = osio_match.group(1).strip('.')
+            kuvaus = kuvaus.replace('\n', ' ')
+            hakulauseet[osio_nro] = f"{otsikko}: {kuvaus}"
+            otsikot[osio_nro] = otsikko
+
+    return paaotsikko, hakulauseet, otsikot, sisallysluettelo
+
+
+def lue_syote_tiedosto(tiedostopolku):
+    """Lukee ja jäsentää syötetiedoston. Palauttaa (hakulauseet, sisällysluettelo)."""
+    try:
+        with open(tiedostopolku, 'r', encoding='utf-8') as f:
+            sisalto = f.read()
+    except FileNotFoundError:
+        logging.error(f"Syötetiedostoa '{tiedostopolku}' ei löytynyt.")
+        return None, None
+
+    _, hakulauseet, _, sisallysluettelo = jasenna_syote(sisalto)
+    return hakulauseet, sisallysluettelo
+
+
+def jarjestetyt_osiot(hakulauseet: dict) -> list[tuple[str, str]]:
+    """Palauttaa (osion numero, hakulause) -parit numerojärjestyksessä."""
+    return sorted(
+        hakulauseet.items(),
+        key=lambda item: [int(p) for p in item[0].split('.')]
+    )
@@ -0,0 +1,165 @@
+# tulosvalimuisti.py (Versio 1.0 - Hakutulosten välimuisti)
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+# --- MÄÄRITYKSET ---
+# Muiden versioiden hakemistot poistetaan vasta, kun niitä ei ole käytetty
+# näin pitkään aikaan. Eri asetuksin ajetut prosessit (sovellus, mittaukset,
+# int8-ajo) jakavat saman hakemiston, eikä toisen käytössä olevaa poisteta.
+VANHENTUNEEN_SAILYTYS_S = 7 * 24 * 3600
+
+
+def _viimeisin_kaytto(hakemisto: str) -> float:
+    """Hakemiston ja sen tiedostojen uusin muokkausaika (haku päivittää tiedostojen ajan)."""
+    viimeisin = os.stat(hakemisto).st_mtime
+    with os.scandir(hakemisto) as tiedostot:
+        for tiedosto in tiedostot:
+            viimeisin = max(viimeisin, tiedosto.stat().st_mtime)
+    return viimeisin
+
+
+def siivoa_vanhat_versiot(hakemisto: str, versio: str,
+                          sailytys_s: float = VANHENTUNEEN_SAILYTYS_S):
+    """Poistaa muiden versioiden hakemistot, joita ei ole käytetty sailytys_s sekuntiin."""
+    raja = time.time() - sailytys_s
+    for nimi in os.listdir(hakemisto):
+        polku = os.path.join(hakemisto, nimi)
+        if nimi == versio or not os.path.isdir(polku):
+            continue
+        try:
+            if _viimeisin_kaytto(polku) > raja:
+                continue
+        except OSError:
+            continue
+        logging.info(f"Poistetaan vanhentunut tulosvälimuisti '{nimi}'.")
+        shutil.rmtree(polku, ignore_errors=True)
+
+
+def laske_versio(tiedostot: list[str], *osat) -> str:
+    """
+    Laskee hakuympäristön versiotunnisteen tiedostojen koosta ja
+    muokkausajasta sekä muista osista (esim. mallien nimet). Kun indeksi
+    rakennetaan uudelleen tai malli vaihtuu, tunniste muuttuu.
+    """
+    tiiviste = hashlib.blake2b(digest_size=8)
+    for polku in tiedostot:
+        try:
+            tila = os.stat(polku)
+            tiiviste.update(f"{polku}|{tila.st_size}|{tila.st_mtime_ns}".encode())
+        except OSError:
+            tiiviste.update(f"{polku}|puuttuu".encode())
+    for osa in osat:
+        tiiviste.update(json.dumps(osa, sort_keys=True, ensure_ascii=False).encode())
+    return tiiviste.hexdigest()
+
+
+class Tulosvalimuisti:
+    """
+    Kaksitasoinen (muisti + levy) LRU-välimuisti osiokohtaisille hakutuloksille.
+    Avain muodostetaan kyselytekstistä ja top_k:sta; levytaso on jaettu
+    versiokohtaiseen alihakemistoon. Muiden versioiden hakemistot poistetaan
+    avattaessa vasta, kun niitä ei ole käytetty säilytysaikaan.
+    """
+
+    def __init__(self, hakemisto: str, versio: str,
+                 muisti_max_tavut: int, levy_max_tavut: int,
+                 sailytys_s: float = VANHENTUNEEN_SAILYTYS_S):
+        self.versio = versio
+        self.muisti_max_tavut = muisti_max_tavut
+        self.levy_max_tavut = levy_max_tavut
+        self._lukko = threading.Lock()
+        self._muisti = OrderedDict()
+        self._muisti_tavut = 0
+
+        self._hakemisto = os.path.join(hakemisto, versio)
+        self._levy_tavut = 0
+        if levy_max_tavut > 0:
+            os.makedirs(self._hakemisto, exist_ok=True)
+            # Avaaminen lasketaan käytöksi, jotta muut prosessit eivät poista tätä.
+            os.utime(self._hakemisto)
+            siivoa_vanhat_versiot(hakemisto, versio, sailytys_s)
+            with os.scandir(self._hakemisto) as tiedostot:
+                self._levy_tavut = sum(t.stat().st_size for t in tiedostot)
+
+    @staticmethod
+    def avain(kysely: str, top_k: int) -> str:
+        """Muodostaa välimuistiavaimen kyselystä ja tulosmäärästä."""
+        return hashlib.blake2b(
+            f"{top_k}\x1f{kysely}".encode("utf-8"), digest_size=16
+        ).hexdigest()
+
+    def hae(self, kysely: str, top_k: int):
+        """Palauttaa tallennetun tuloslistan tai None."""
+        avain = self.avain(kysely, top_k)
+        with self._lukko:
+            if avain in self._muisti:
+                self._muisti.move_to_end(avain)
+                return json.loads(self._muisti[avain])
+        if self.levy_max_tavut <= 0:
+            return None
+
+        polku = os.path.join(self._hakemisto, f"{avain}.json")
+        try:
+            with open(polku, "r", encoding="utf-8") as f:
+                data = f.read()
+            os.utime(polku)
+        except OSError:
+            return None
+        with self._lukko:
+            self._lisaa_muistiin(avain, data)
+        return json.loads(data)
+
+    def tallenna(self, kysely: str, top_k: int, tulokset: list[dict]):
+        """Tallentaa osion tulokset molemmille tasoille."""
+        avain = self.avain(kysely, top_k)
+        data = json.dumps(tulokset, ensure_ascii=False, default=float)
+        with self._lukko:
+            self._lisaa_muistiin(avain, data)
+            if self.levy_max_tavut <= 0:
+                return
+            polku = os.path.join(self._hakemisto, f"{avain}.json")
+            try:
+                with open(polku, "w", encoding="utf-8") as f:
+                    f.write(data)
+                self._levy_tavut += os.path.getsize(polku)
+            except OSError as e:
+                logging.warning(f"Tulosvälimuistin kirjoitus epäonnistui: {e}")
+                return
+            if self._levy_tavut > self.levy_max_tavut:
+                self._karsi_levy()
+
+    def _lisaa_muistiin(self, avain: str, data: str):
+        """Lisää merkinnän muistitasolle ja karsii vanhimmat. Lukko hallussa."""
+        vanha = self._muisti.pop(avain, None)
+        if vanha is not None:
+            self._muisti_tavut -= len(vanha)
+        if len(data) > self.muisti_max_tavut:
+            return
+        self._muisti[avain] = data
+        self._muisti_tavut += len(data)
+        while self._muisti_tavut > self.muisti_max_tavut:
+            _, poistettu = self._muisti.popitem(last=False)
+            self._muisti_tavut -= len(poistettu)
+
+    def _karsi_levy(self):
+        """Poistaa vanhimmin käytetyt tiedostot levybudjettiin. Lukko hallussa."""
+        with os.scandir(self._hakemisto) as tiedostot:
+            merkinnat = sorted(
+                ((t.stat().st_mtime, t.stat().st_size, t.path) for t in tiedostot)
+            )
+        self._levy_tavut = sum(koko for _, koko, _ in merkinnat)
+        tavoite = int(self.levy_max_tavut * 0.9)
+        for _, koko, polku in merkinnat:
+            if self._levy_tavut <= tavoite:
+                break
+            try:
+                os.remove(polku)
+                self._levy_tavut -= koko
+            except OSError:
+                continue
@@ -0,0 +1,238 @@
+# vektori_indeksi.py (Versio 1.0 - Vaihdettavat FAISS-indeksityypit)
+import json
+import logging
+import math
+import time
+import faiss
+import numpy as np
+
+INDEKSITYYPIT = ("flat", "hnsw", "ivf", "ivfpq")
+METRIIKAT = ("l2", "ip")
+# Vektorien tallennusmuoto: täysi tarkkuus, puolitarkkuus tai 8-bittinen skalaarikvantisointi.
+KOODAUKSET = ("float32", "fp16", "sq8")
+_KOODAUS_KUVAUKSET = {"float32": "Flat", "fp16": "SQfp16", "sq8": "SQ8"}
+
+# Oletusvertailu: kaikki tyypit täydellä tarkkuudella sekä pakatut muunnelmat.
+VERTAILU_KOKOONPANOT = (
+    ("flat", "float32"), ("flat", "fp16"), ("flat", "sq8"),
+    ("hnsw", "float32"), ("hnsw", "sq8"),
+    ("ivf", "float32"), ("ivf", "sq8"),
+    ("ivfpq", "float32"),
+)
+
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 128
+IVF_NPROBE = 16
+PQ_BITIT = 8
+
+
+def tiedot_polku(indeksi_tiedosto: str) -> str:
+    """Palauttaa indeksin metatietotiedoston polun."""
+    return f"{indeksi_tiedosto}.json"
+
+
+def _ivf_listat(vektorimaara: int) -> int:
+    """Valitsee IVF-klustereiden määrän (n. 4·√n, vähintään 1)."""
+    return max(1, min(int(4 * math.sqrt(vektorimaara)), vektorimaara // 39 or 1))
+
+
+def _pq_osat(ulottuvuus: int) -> int:
+    """Valitsee suurimman ulottuvuuden jakavan PQ-osamäärän (enintään 64)."""
+    for osat in range(min(64, ulottuvuus), 0, -1):
+        if ulottuvuus % osat == 0:
+            return osat
+    return 1
+
+
+def rakenna_indeksi(vektorit: np.ndarray, tyyppi: str = "flat",
+                    metriikka: str = "l2", koodaus: str = "float32") -> tuple:
+    """
+    Rakentaa valitun tyyppisen FAISS-indeksin. Metriikalla 'ip' vektorit
+    normalisoidaan, jolloin sisätulo vastaa kosinisamankaltaisuutta.
+    Koodaus 'fp16' tai 'sq8' pakkaa tallennetut vektorit (ei koske IVF-PQ:ta).
+    Palauttaa (indeksi, tiedot), missä tiedot tallennetaan indeksin viereen.
+    """
+    if tyyppi not in INDEKSITYYPIT:
+        raise ValueError(f"Tuntematon indeksityyppi '{tyyppi}'.")
+    if metriikka not in METRIIKAT:
+        raise ValueError(f"Tuntematon metriikka '{metriikka}'.")
+    if koodaus not in KOODAUKSET:
+        raise ValueError(f"Tuntematon koodaus '{koodaus}'.")
+
+    vektorit = np.ascontiguousarray(vektorit, dtype=np.float32)
+    normalisoi = metriikka == "ip"
+    if normalisoi:
+        vektorit = vektorit.copy()
+        faiss.normalize_L2(vektorit)
+
+    ulottuvuus = vektorit.shape[1]
+    faiss_metriikka = (
+        faiss.METRIC_INNER_PRODUCT if normalisoi else faiss.METRIC_L2
+    )
+    if tyyppi == "ivfpq":
+        koodaus = "pq"
+    tiedot = {
+        "tyyppi": tyyppi, "metriikka": metriikka,
+        "normalisoi": normalisoi, "koodaus": koodaus,
+    }
+
+    if tyyppi == "flat":
+        kuvaus = _KOODAUS_KUVAUKSET[koodaus]
+    elif tyyppi == "hnsw":
+        kuvaus = f"HNSW{HNSW_M}"
+        if koodaus != "float32":
+            kuvaus += f",{_KOODAUS_KUVAUKSET[koodaus]}"
+        tiedot["efSearch"] = HNSW_EF_SEARCH
+    elif tyyppi == "ivf":
+        kuvaus = f"IVF{_ivf_listat(len(vektorit))},{_KOODAUS_KUVAUKSET[koodaus]}"
+        tiedot["nprobe"] = IVF_NPROBE
+    else:
+        kuvaus = f"IVF{_ivf_listat(len(vektorit))},PQ{_pq_osat(ulottuvuus)}x{PQ_BITIT}"
+        tiedot["nprobe"] = IVF_NPROBE
+    tiedot["kuvaus"] = kuvaus
+
+    indeksi = faiss.index_factory(ulottuvuus, kuvaus, faiss_metriikka)
+    if tyyppi == "hnsw":
+        indeksi.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    if not indeksi.is_trained:
+        indeksi.train(vektorit)
+    indeksi.add(vektorit)
+    aseta_hakuparametrit(indeksi, tiedot)
+    return indeksi, tiedot
+
+
+def aseta_hakuparametrit(indeksi, tiedot: dict):
+    """Asettaa indeksityypin hakuparametrit (nprobe, efSearch)."""
+    parametrit = faiss.ParameterSpace()
+    for nimi in ("nprobe", "efSearch"):
+        if nimi in tiedot:
+            parametrit.set_index_parameter(indeksi, nimi, tiedot[nimi])
+
+
+def tallenna_indeksi(indeksi, tiedot: dict, indeksi_tiedosto: str):
+    """Tallentaa indeksin ja sen metatiedot."""
+    faiss.write_index(indeksi, indeksi_tiedosto)
+    with open(tiedot_polku(indeksi_tiedosto), "w", encoding="utf-8") as f:
+        json.dump(tiedot, f, ensure_ascii=False, indent=4)
+
+
+def indeksin_koko(indeksi) -> int:
+    """Palauttaa indeksin sarjallistetun koon tavuina (≈ muistinkäyttö)."""
+    return int(faiss.serialize_index(indeksi).nbytes)
+
+
+def _mmap_liput(tyyppi: str) -> int:
+    """
+    FAISS:n lukuliput muistikartoitukseen. IVF-indekseissä kartoitetaan
+    käänteislistat (IO_FLAG_MMAP); Flat- ja HNSW-indeksien koodit osaa
+    kartoittaa vain uudempi FAISS (IO_FLAG_MMAP_IFC). Lippuja ei voi yhdistää.
+    """
+    if tyyppi in ("ivf", "ivfpq"):
+        return faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    return getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+class Hakuindeksi:
+    """
+    Ladattu FAISS-indeksi ja sen metatiedot. Hoitaa kyselyvektorien
+    normalisoinnin ja hakuparametrit indeksityypin mukaan. Muistikartoitettuna
+    (mmap=True) saman koneen prosessit jakavat indeksin käyttöjärjestelmän
+    sivuvälimuistin kautta sen sijaan, että jokainen lukisi oman kopionsa.
+    """
+
+    def __init__(self, indeksi_tiedosto: str, mmap: bool = False):
+        try:
+            with open(tiedot_polku(indeksi_tiedosto), "r", encoding="utf-8") as f:
+                self.tiedot = json.load(f)
+        except FileNotFoundError:
+            # Vanhat indeksit rakennettiin aina tarkkana L2-indeksinä.
+            self.tiedot = {"tyyppi": "flat", "metriikka": "l2", "normalisoi": False}
+
+        self.mmap = mmap
+        if mmap:
+            try:
+                self.indeksi = faiss.read_index(
+                    indeksi_tiedosto, _mmap_liput(self.tiedot["tyyppi"])
+                )
+            except RuntimeError as e:
+                logging.warning(
+                    f"Indeksiä ei voitu muistikartoittaa ({e}), luetaan muistiin."
+                )
+                self.mmap = False
+                self.indeksi = faiss.read_index(indeksi_tiedosto)
+        else:
+            self.indeksi = faiss.read_index(indeksi_tiedosto)
+        aseta_hakuparametrit(self.indeksi, self.tiedot)
+        logging.info(
+            f"Ladattu {self.tiedot['tyyppi']}-indeksi "
+            f"({self.tiedot['metriikka']}, {self.tiedot.get('koodaus', 'float32')}, "
+            f"{self.ntotal} vektoria{', muistikartoitettu' if self.mmap else ''})."
+        )
+
+    @property
+    def ntotal(self) -> int:
+        return self.indeksi.ntotal
+
+    def hae(self, kyselyvektorit, k: int) -> tuple:
+        """Palauttaa (etäisyydet, tunnisteet) jokaiselle kyselyvektorille."""
+        vektorit = np.ascontiguousarray(kyselyvektorit, dtype=np.float32)
+        if self.tiedot.get("normalisoi"):
+            vektorit = vektorit.copy()
+            faiss.normalize_L2(vektorit)
+        return self.indeksi.search(vektorit, k)
+
+
+def vertaile_indekseja(vektorit: np.ndarray, kyselyt: np.ndarray,
+                       kokoonpanot=VERTAILU_KOKOONPANOT, metriikka: str = "l2",
+                       k: int = 10) -> list[dict]:
+    """
+    Rakentaa jokaisen (tyyppi, koodaus) -kokoonpanon samoista vektoreista ja
+    mittaa recall@k:n tarkkaa float32-Flat-indeksiä vastaan, kyselykohtaisen
+    viiveen sekä indeksin koon ja sen säästön float32-Flat-indeksiin nähden.
+    """
+    kyselyt = np.ascontiguousarray(kyselyt, dtype=np.float32)
+    tarkka, tarkan_tiedot = rakenna_indeksi(vektorit, "flat", metriikka)
+    tarkan_koko = indeksin_koko(tarkka)
+    haku_kyselyt = kyselyt.copy()
+    if tarkan_tiedot["normalisoi"]:
+        faiss.normalize_L2(haku_kyselyt)
+    _, oikeat = tarkka.search(haku_kyselyt, k)
+
+    tulokset = []
+    for tyyppi, koodaus in kokoonpanot:
+        alku = time.perf_counter()
+        indeksi, tiedot = rakenna_indeksi(vektorit, tyyppi, metriikka, koodaus)
+        rakennus = time.perf_counter() - alku
+
+        viiveet = []
+        osumat = 0
+        for rivi in range(len(haku_kyselyt)):
+            alku = time.perf_counter()
+            _, loydetyt = indeksi.search(haku_kyselyt[rivi:rivi + 1], k)
+            viiveet.append(time.perf_counter() - alku)
+            osumat += len(set(loydetyt[0]) & set(oikeat[rivi]))
+
+        viiveet_ms = np.array(viiveet) * 1000
+        koko = indeksin_koko(indeksi)
+        tulos = {
+            "tyyppi": tyyppi,
+            "koodaus": tiedot["koodaus"],
+            "metriikka": metriikka,
+            f"recall@{k}": osumat / (k * len(haku_kyselyt)),
+            "viive_ms_ka": float(viiveet_ms.mean()),
+            "viive_ms_p95": float(np.percentile(viiveet_ms, 95)),
+            "rakennus_s": rakennus,
+            "koko_mt": koko / 2**20,
+            "saasto_mt": (tarkan_koko - koko) / 2**20,
+        }
+        logging.info(
+            f"{tyyppi:>6}/{tiedot['koodaus']:<7} ({metriikka}): "
+            f"recall@{k}={tulos[f'recall@{k}']:.3f}, "
+            f"viive ka {tulos['viive_ms_ka']:.3f} ms, "
+            f"p95 {tulos['viive_ms_p95']:.3f} ms, "
+            f"koko {tulos['koko_mt']:.1f} MT (säästö {tulos['saasto_mt']:.1f} MT), "
+            f"rakennus {rakennus:.1f} s"
+        )
+        tulokset.append(tulos)
+    return tulokset
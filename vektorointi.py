@@ -0,0 +1,168 @@
+# vektorointi.py (Versio 1.0 - Osissa etenevä, jatkettava vektorointi)
+import hashlib
+import logging
+import os
+import numpy as np
+
+OSA_ETULIITE = "osa_"
+
+
+def tekstin_tiiviste(malli: str, teksti: str) -> bytes:
+    """Laskee (malli, teksti) -parin 16-tavuisen tiivisteen."""
+    return hashlib.blake2b(
+        f"{malli}\x1f{teksti}".encode("utf-8"), digest_size=16
+    ).digest()
+
+
+class Upotusvalimuisti:
+    """
+    Levylle tallentuva upotusvälimuisti, joka koostuu osatiedostoista
+    (tiivisteet + vektorit). Jokainen valmis osa kirjoitetaan heti, joten
+    keskeytynyt rakennus jatkuu siitä, mihin jäätiin, ja muuttuneen
+    korpuksen jälkeen vektoroidaan vain ne tekstit, joiden tiiviste on uusi.
+    """
+
+    def __init__(self, hakemisto: str):
+        self.hakemisto = hakemisto
+        os.makedirs(hakemisto, exist_ok=True)
+        self._rivit = {}
+        self._osat = []
+        for nimi in sorted(os.listdir(hakemisto)):
+            if not (nimi.startswith(OSA_ETULIITE) and nimi.endswith(".npz")):
+                continue
+            try:
+                with np.load(os.path.join(hakemisto, nimi)) as data:
+                    tiivisteet, vektorit = data["tiivisteet"], data["vektorit"]
+                tavut = tiivisteet.tobytes()
+            except Exception as e:
+                logging.warning(f"Ohitetaan vioittunut välimuistiosa '{nimi}': {e}")
+                continue
+            osa_nro = len(self._osat)
+            self._osat.append(vektorit)
+            for rivi in range(len(tiivisteet)):
+                self._rivit[tavut[rivi * 16:(rivi + 1) * 16]] = (osa_nro, rivi)
+        self._seuraava_nro = self._suurin_osanumero() + 1
+        logging.info(
+            f"Upotusvälimuistissa {len(self._rivit)} vektoria "
+            f"{len(self._osat)} osassa ('{hakemisto}')."
+        )
+
+    def _suurin_osanumero(self) -> int:
+        numerot = [
+            int(nimi[len(OSA_ETULIITE):-4]) for nimi in os.listdir(self.hakemisto)
+            if nimi.startswith(OSA_ETULIITE) and nimi.endswith(".npz")
+        ]
+        return max(numerot, default=-1)
+
+    def __contains__(self, tiiviste: bytes) -> bool:
+        return tiiviste in self._rivit
+
+    def __len__(self) -> int:
+        return len(self._rivit)
+
+    def vektori(self, tiiviste: bytes) -> np.ndarray:
+        osa_nro, rivi = self._rivit[tiiviste]
+        return self._osat[osa_nro][rivi]
+
+    def lisaa_osa(self, tiivisteet: list[bytes], vektorit: np.ndarray):
+        """Kirjoittaa uuden osan atomisesti levylle ja lisää sen muistiin."""
+        vektorit = np.asarray(vektorit, dtype=np.float32)
+        polku = os.path.join(
+            self.hakemisto, f"{OSA_ETULIITE}{self._seuraava_nro:06d}.npz"
+        )
+        valiaikainen = f"{polku}.kesken"
+        with open(valiaikainen, "wb") as f:
+            np.savez(
+                f,
+                tiivisteet=np.frombuffer(b"".join(tiivisteet), dtype=np.uint8).reshape(-1, 16),
+                vektorit=vektorit,
+            )
+        os.replace(valiaikainen, polku)
+        self._seuraava_nro += 1
+
+        osa_nro = len(self._osat)
+        self._osat.append(vektorit)
+        for rivi, tiiviste in enumerate(tiivisteet):
+            self._rivit[tiiviste] = (osa_nro, rivi)
+
+    def tiivista(self, kaytossa: list[bytes], osakoko: int):
+        """
+        Kirjoittaa välimuistin uudelleen vain käytössä olevilla vektoreilla,
+        kun vanhentuneita rivejä on enemmän kuin käytössä olevia.
+        """
+        kaytossa = list(dict.fromkeys(t for t in kaytossa if t in self._rivit))
+        if len(self._rivit) - len(kaytossa) <= len(kaytossa):
+            return
+        logging.info(
+            f"Tiivistetään upotusvälimuisti: {len(self._rivit) - len(kaytossa)} "
+            "vanhentunutta vektoria poistetaan."
+        )
+        vektorit = np.stack([self.vektori(t) for t in kaytossa]) if kaytossa else None
+        vanhat = [
+            nimi for nimi in os.listdir(self.hakemisto)
+            if nimi.startswith(OSA_ETULIITE) and nimi.endswith(".npz")
+        ]
+        self._rivit, self._osat = {}, []
+        for alku in range(0, len(kaytossa), osakoko):
+            self.lisaa_osa(kaytossa[alku:alku + osakoko], vektorit[alku:alku + osakoko])
+        for nimi in vanhat:
+            os.remove(os.path.join(self.hakemisto, nimi))
+
+
+def vektoroi_osissa(model, malli: str, tekstit: list[str], valimuisti_hakemisto: str,
+                    osakoko: int = 4096, prosessit: int = 1,
+                    erakoko: int = 32) -> np.ndarray:
+    """
+    Vektoroi tekstit osissa ja tallentaa jokaisen valmiin osan välimuistiin.
+    Välimuistista jo löytyvät tekstit ohitetaan, ja puuttuvat vektoroidaan
+    pituusjärjestyksessä. Kun prosessit > 1, osat vektoroidaan
+    sentence-transformersin moniprosessipoolilla kaikilla ytimillä.
+    Palauttaa vektorit tekstien järjestyksessä.
+    """
+    valimuisti = Upotusvalimuisti(valimuisti_hakemisto)
+    tiivisteet = [tekstin_tiiviste(malli, teksti) for teksti in tekstit]
+
+    puuttuvat = {}
+    for tiiviste, teksti in zip(tiivisteet, tekstit):
+        if tiiviste not in valimuisti and tiiviste not in puuttuvat:
+            puuttuvat[tiiviste] = teksti
+    logging.info(
+        f"{len(tekstit) - len(puuttuvat)}/{len(tekstit)} tekstiä löytyi "
+        f"välimuistista, vektoroidaan {len(puuttuvat)}."
+    )
+
+    if puuttuvat:
+        pooli = None
+        if prosessit > 1:
+            pooli = model.start_multi_process_pool(["cpu"] * prosessit)
+            logging.info(f"Käynnistetty {prosessit} vektorointiprosessia.")
+        try:
+            # Pisimmästä lyhimpään: saman osan ja erän tekstit ovat lähes yhtä
+            # pitkiä, joten täytettä on vähän myös moniprosessipoolin paloissa.
+            # Välimuisti on tiivisteavaimin, joten järjestys ei vaikuta tulokseen.
+            puuttuvat_tiivisteet = sorted(
+                puuttuvat, key=lambda t: len(puuttuvat[t]), reverse=True
+            )
+            for alku in range(0, len(puuttuvat_tiivisteet), osakoko):
+                osa = puuttuvat_tiivisteet[alku:alku + osakoko]
+                osan_tekstit = [puuttuvat[t] for t in osa]
+                if pooli is not None:
+                    vektorit = model.encode_multi_process(
+                        osan_tekstit, pooli, batch_size=erakoko
+                    )
+                else:
+                    vektorit = model.encode(
+                        osan_tekstit, batch_size=erakoko, show_progress_bar=False
+                    )
+                valimuisti.lisaa_osa(osa, vektorit)
+                logging.info(
+                    f"Vektoroitu ja tallennettu {alku + len(osa)}"
+                    f"/{len(puuttuvat_tiivisteet)} tekstiä."
+                )
+        finally:
+            if pooli is not None:
+                model.stop_multi_process_pool(pooli)
+
+    vektorit = np.stack([valimuisti.vektori(t) for t in tiivisteet])
+    valimuisti.tiivista(tiivisteet, osakoko)
+    return vektorit